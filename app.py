@@ -1,6 +1,20 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-import pymupdf
+
+# Utiliser les services (et la configuration) du backend
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
 import services
+import degradation
+import logging_setup
+
+logging_setup.configure_logging()
 
 # Configuration de la page
 st.set_page_config(
@@ -179,6 +193,60 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Nombre de résultats (extraction, analyse, recherche) conservés en mémoire
+PIPELINE_CACHE_SIZE = 128
+# Durée de réutilisation des résultats par étape (secondes): les offres vieillissent plus vite que l'analyse
+PIPELINE_CACHE_TTL = {"analyse": 86400, "recherche": 600}
+
+@st.cache_resource
+def get_executor():
+    """Pool de threads partagé pour l'analyse et la recherche en arrière-plan."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="pipeline")
+
+@st.cache_resource
+def get_pipeline_cache():
+    """Cache partagé entre sessions: (étape, clé) -> entrée {future, expires_at, reusable}."""
+    return OrderedDict(), threading.Lock()
+
+def run_tracked(entry, fn, *args):
+    """Exécute fn(*args); le résultat n'est réutilisable que s'il est complet (ni repli, ni liste vide)."""
+    with degradation.track() as fallbacks:
+        result = fn(*args)
+    entry["reusable"] = bool(result) and not fallbacks
+    return result
+
+def submit_cached(stage, key, fn, *args):
+    """
+    Lance fn(*args) en arrière-plan, ou réutilise le calcul déjà lancé pour la même clé.
+    Un calcul en échec, dégradé (profil basique, France Travail indisponible),
+    vide ou expiré est relancé au prochain appel.
+    """
+    cache, lock = get_pipeline_cache()
+    cache_key = (stage, key)
+    with lock:
+        entry = cache.get(cache_key)
+        if entry is None or (entry["future"].done() and not (entry["reusable"] and time.monotonic() < entry["expires_at"])):
+            entry = {"expires_at": time.monotonic() + PIPELINE_CACHE_TTL[stage], "reusable": False}
+            entry["future"] = get_executor().submit(run_tracked, entry, fn, *args)
+            cache[cache_key] = entry
+        cache.move_to_end(cache_key)
+        while len(cache) > PIPELINE_CACHE_SIZE:
+            cache.popitem(last=False)
+    return entry["future"]
+
+@st.cache_data(show_spinner=False, max_entries=PIPELINE_CACHE_SIZE)
+def extract_cv_text(file_hash, _content):
+    """Extraction du texte du PDF, mise en cache par empreinte du fichier."""
+    return services.extract_text_from_pdf(_content)
+
+def profile_key(profil):
+    """Clé de cache de la recherche: seuls les champs utilisés par le matching comptent."""
+    return json.dumps({
+        'metier': profil.get('metier_recherche'),
+        'competences': sorted(profil.get('competences_cles', [])),
+        'niveau': profil.get('niveau_experience'),
+    }, sort_keys=True)
+
 def render_job_card(job):
     """Affiche une carte d'offre stylisée."""
     company = job.get('entreprise', {}).get('nom', 'Entreprise confidentielle')
@@ -227,18 +295,26 @@ with col2:
     if uploaded_file:
         st.success("✅ CV chargé avec succès!")
         
-        # Extraire le texte du PDF
-        doc = pymupdf.open(stream=uploaded_file.read(), filetype="pdf")
-        text_cv = "".join([page.get_text() for page in doc])
+        # Extraire le texte du PDF (une seule fois par fichier, même après un rerun)
+        content = uploaded_file.getvalue()
+        file_hash = hashlib.sha256(content).hexdigest()
+        text_cv = extract_cv_text(file_hash, content)
+        
+        # L'analyse démarre en arrière-plan dès l'upload
+        analyse = submit_cached("analyse", file_hash, services.analyse_cv_with_groq, text_cv)
         
         st.markdown("### 🔍 Étape 2 : Lance la recherche")
         
         if st.button("🎯 Trouver mes offres idéales", use_container_width=True):
+            st.session_state["recherche_cv"] = file_hash
+        
+        # Les résultats restent affichés lors des interactions suivantes
+        if st.session_state.get("recherche_cv") == file_hash:
             
             # Analyse du CV
             with st.spinner("🤖 Analyse de ton CV en cours..."):
                 try:
-                    profil = services.analyse_cv_with_groq(text_cv)
+                    profil = analyse.result()
                 except Exception as e:
                     st.error(f"❌ Erreur lors de l'analyse: {str(e)}")
                     profil = None
@@ -247,6 +323,9 @@ with col2:
                 metier = profil.get('metier_recherche', 'Emploi')
                 competences = profil.get('competences_cles', [])
                 
+                # La recherche part avant l'affichage du profil
+                recherche = submit_cached("recherche", profile_key(profil), services.fetch_jobs_with_matching, profil)
+                
                 # Afficher le profil détecté
                 st.markdown("---")
                 st.markdown("### 🎯 Profil détecté")
@@ -260,7 +339,11 @@ with col2:
                 
                 # Recherche des offres
                 with st.spinner("🔎 Recherche des meilleures offres..."):
-                    offres = services.fetch_real_jobs(None, metier)
+                    try:
+                        offres = recherche.result()
+                    except Exception as e:
+                        st.error(f"❌ Erreur lors de la recherche: {str(e)}")
+                        offres = []
                 
                 if offres:
                     st.markdown("---")
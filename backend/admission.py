@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import math
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+import config
+from deadline import Deadline, UNLIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionController:
+    """
+    Contrôle d'admission par worker: nombre borné de requêtes en cours,
+    file d'attente bornée et délai maximal d'attente dans la file.
+
+    Au-delà, la requête est rejetée immédiatement en 503 avec un Retry-After
+    plutôt que de s'empiler jusqu'au timeout de gunicorn/Vercel.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._avg_service_time = 1.0  # Moyenne glissante (EWMA) en secondes
+
+    def retry_after(self) -> int:
+        """Estimation du délai avant qu'une place se libère (secondes)."""
+        estimate = self._avg_service_time * (self.waiting + 1) / self.max_in_flight
+        return max(1, min(60, math.ceil(estimate)))
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        logger.warning("Admission %s: requête rejetée (%s)", self.name, reason)
+        raise HTTPException(
+            status_code=503,
+            detail="Serveur surchargé, réessayez dans quelques instants",
+            headers={"Retry-After": str(self.retry_after())}
+        )
+
+    @asynccontextmanager
+    async def admit(self, deadline: Deadline = UNLIMITED):
+        """Réserve une place ou lève HTTPException 503 (attente bornée par le budget de la requête)."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject("file pleine")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=deadline.timeout(self.queue_timeout))
+        except asyncio.TimeoutError:
+            self._reject("délai d'attente dépassé")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            self._avg_service_time = 0.8 * self._avg_service_time + 0.2 * (time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "avg_service_time": round(self._avg_service_time, 3),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    Admission des routes à gros corps (upload de CV) avant sa lecture: une
+    requête rejetée reçoit son 503 sans avoir envoyé ni mis en tampon son
+    fichier. Le budget de la requête est créé ici, attente d'admission
+    comprise, et transmis au handler dans request.state.deadline.
+
+    Args:
+        routes: (méthode, chemin) -> (contrôleur d'admission, budget en secondes)
+    """
+
+    def __init__(self, app, routes: dict):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        controller, budget = route
+        deadline = Deadline(budget)
+        scope.setdefault("state", {})["deadline"] = deadline
+        async with AsyncExitStack() as stack:
+            try:
+                await stack.enter_async_context(controller.admit(deadline))
+            except HTTPException as e:
+                response = JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+                await response(scope, receive, send)
+                return
+            await self.app(scope, receive, send)
+
+
+# Limites séparées: l'analyse (coûteuse) ne peut pas affamer la recherche simple
+ANALYZE = AdmissionController(
+    "analyze",
+    max_in_flight=config.ANALYZE_MAX_IN_FLIGHT,
+    max_queue=config.ANALYZE_MAX_QUEUE,
+    queue_timeout=config.ANALYZE_QUEUE_TIMEOUT,
+)
+SEARCH = AdmissionController(
+    "search",
+    max_in_flight=config.SEARCH_MAX_IN_FLIGHT,
+    max_queue=config.SEARCH_MAX_QUEUE,
+    queue_timeout=config.SEARCH_QUEUE_TIMEOUT,
+)
@@ -0,0 +1,288 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def profile_terms(profile: dict) -> set:
+    """
+    Chaînes d'entrée d'un profil dans l'index: exactement celles que
+    calculate_matching_score cherche dans l'offre (mots du métier de plus de
+    2 lettres, compétences entières), en minuscules.
+    """
+    terms = {word for word in profile.get("metier_recherche", "").lower().split() if len(word) > 2}
+    terms.update(competence.lower() for competence in profile.get("competences_cles", []))
+    return terms
+
+
+def offer_text(offer: dict) -> str:
+    """Texte où calculate_matching_score cherche les mots du profil (titre et description)."""
+    return f"{offer.get('intitule', '')} {offer.get('description', '')}".lower()
+
+
+class AlertStore:
+    """
+    Profils sauvegardés et alertes générées, dans SQLite: partagés entre les
+    workers gunicorn, une alerte (profil, offre) n'est enregistrée qu'une fois.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS saved_profiles (
+                profile_id TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                active INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_saved_profiles_updated ON saved_profiles (updated_at)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS profile_alerts (
+                profile_id TEXT NOT NULL,
+                offer_id TEXT NOT NULL,
+                score INTEGER NOT NULL,
+                offer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (profile_id, offer_id)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_alerts_created ON profile_alerts (profile_id, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def save_profile(self, profile: dict) -> str:
+        profile_id = uuid.uuid4().hex
+        self._connect().execute(
+            "INSERT INTO saved_profiles (profile_id, profile, active, updated_at) VALUES (?, ?, 1, ?)",
+            (profile_id, json.dumps(profile, ensure_ascii=False), time.time())
+        )
+        return profile_id
+
+    def get_profile(self, profile_id: str):
+        row = self._connect().execute(
+            "SELECT profile FROM saved_profiles WHERE profile_id = ? AND active = 1", (profile_id,)
+        ).fetchone()
+        return json.loads(row["profile"]) if row else None
+
+    def deactivate_profile(self, profile_id: str) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE saved_profiles SET active = 0, updated_at = ? WHERE profile_id = ? AND active = 1",
+            (time.time(), profile_id)
+        )
+        return cursor.rowcount > 0
+
+    def changed_profiles(self, since: float) -> list:
+        """(profile_id, profil ou None si désactivé, updated_at) modifiés depuis `since`."""
+        rows = self._connect().execute(
+            "SELECT profile_id, profile, active, updated_at FROM saved_profiles WHERE updated_at >= ? ORDER BY updated_at",
+            (since,)
+        ).fetchall()
+        return [(row["profile_id"], json.loads(row["profile"]) if row["active"] else None, row["updated_at"]) for row in rows]
+
+    def add_alerts(self, alerts: list) -> int:
+        """Enregistre des (profile_id, offre, score); les doublons sont ignorés. Retourne le nombre de nouvelles alertes."""
+        now = time.time()
+        conn = self._connect()
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO profile_alerts (profile_id, offer_id, score, offer, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(profile_id, offer.get("id", ""), score, json.dumps(offer, ensure_ascii=False), now) for profile_id, offer, score in alerts]
+        )
+        return conn.total_changes - before
+
+    def list_alerts(self, profile_id: str, since: float = 0, limit: int = 50) -> list:
+        rows = self._connect().execute(
+            """
+            SELECT offer, score, created_at FROM profile_alerts
+            WHERE profile_id = ? AND created_at > ? ORDER BY created_at DESC, score DESC LIMIT ?
+            """,
+            (profile_id, since, limit)
+        ).fetchall()
+        return [{"offer": json.loads(row["offer"]), "score": row["score"], "created_at": row["created_at"]} for row in rows]
+
+
+class ProfilePercolator:
+    """
+    Recherche inversée: au lieu de chercher des offres pour un profil, on
+    cherche les profils sauvegardés que vise une offre.
+
+    Chaque profil est compilé dans un index chaîne -> profils (profile_terms).
+    Une offre ne consulte que les profils dont une chaîne apparaît dans son
+    texte, avec la règle d'inclusion du score ('web' trouve 'webmaster',
+    'java' trouve 'javascript'): seules les chaînes dont le trigramme de tête
+    figure dans l'offre sont vérifiées. Un profil écarté n'obtient donc aucun
+    point de métier ni de compétence, au plus les 20 points du niveau, sous
+    ALERT_MIN_SCORE.
+    """
+
+    def __init__(self, store: AlertStore, score, complete=None):
+        self.store = store
+        self.score = score  # calculate_matching_score(job, metier, competences, niveau)
+        self.complete = complete or (lambda offer: offer)  # Offre de scoring -> offre normalisée
+        self._profiles = {}  # profile_id -> (profil, mots indexés)
+        self._index = defaultdict(set)  # chaîne -> profils
+        self._by_trigram = defaultdict(set)  # trigramme de tête -> chaînes indexées
+        self._short = set()  # chaînes de moins de 3 caractères, vérifiées pour chaque offre
+        self._lock = threading.Lock()
+        self._synced_until = 0.0
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def _add(self, profile_id: str, profile: dict):
+        self._remove(profile_id)
+        terms = profile_terms(profile)
+        self._profiles[profile_id] = (profile, terms)
+        for term in terms:
+            if not self._index[term]:
+                if len(term) < 3:
+                    self._short.add(term)
+                else:
+                    self._by_trigram[term[:3]].add(term)
+            self._index[term].add(profile_id)
+
+    def _remove(self, profile_id: str):
+        entry = self._profiles.pop(profile_id, None)
+        if entry is None:
+            return
+        for term in entry[1]:
+            ids = self._index.get(term)
+            if ids is not None:
+                ids.discard(profile_id)
+                if not ids:
+                    del self._index[term]
+                    self._unindex(term)
+
+    def _unindex(self, term: str):
+        if len(term) < 3:
+            self._short.discard(term)
+            return
+        terms = self._by_trigram.get(term[:3])
+        if terms is not None:
+            terms.discard(term)
+            if not terms:
+                del self._by_trigram[term[:3]]
+
+    def refresh(self):
+        """Applique les profils ajoutés ou supprimés depuis la dernière synchronisation (tous workers confondus)."""
+        # Marge: une écriture concurrente peut porter un horodatage légèrement antérieur
+        changes = self.store.changed_profiles(self._synced_until - 5)
+        with self._lock:
+            for profile_id, profile, updated_at in changes:
+                if profile is None:
+                    self._remove(profile_id)
+                else:
+                    self._add(profile_id, profile)
+                self._synced_until = max(self._synced_until, updated_at)
+
+    def candidates(self, offer: dict) -> set:
+        """Profils dont au moins une chaîne indexée figure dans le texte de l'offre."""
+        text = offer_text(offer)
+        trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+        with self._lock:
+            found = set()
+            for trigram in trigrams & self._by_trigram.keys():
+                for term in self._by_trigram[trigram]:
+                    if term in text:
+                        found |= self._index[term]
+            for term in self._short:
+                if term in text:
+                    found |= self._index[term]
+            return found
+
+    def match(self, offer: dict, min_score: int = None) -> list:
+        """(profile_id, score) des profils visés par l'offre, score >= min_score."""
+        min_score = min_score if min_score is not None else config.ALERT_MIN_SCORE
+        matches = []
+        for profile_id in self.candidates(offer):
+            entry = self._profiles.get(profile_id)
+            if entry is None:
+                continue
+            profile = entry[0]
+            score = self.score(
+                offer, profile.get("metier_recherche", ""), profile.get("competences_cles", []),
+                profile.get("niveau_experience", "junior")
+            )
+            if score >= min_score:
+                matches.append((profile_id, score))
+        return matches
+
+    def percolate(self, offers: list) -> int:
+        """Confronte des offres aux profils sauvegardés et enregistre les alertes. Retourne le nombre de nouvelles alertes."""
+        self.refresh()
+        alerts = []
+        for offer in offers:
+            matches = self.match(offer)
+            if matches:
+                offer = self.complete(offer)
+                alerts.extend((profile_id, offer, score) for profile_id, score in matches)
+        created = self.store.add_alerts(alerts) if alerts else 0
+        logger.info("Percolation: %d offres, %d profils indexés, %d nouvelles alertes", len(offers), len(self), created)
+        return created
+
+
+class AlertDispatcher:
+    """
+    File en arrière-plan vers le percolateur: les recherches ne paient pas le
+    coût du matching inverse. Les offres déjà vues récemment sont ignorées.
+    """
+
+    def __init__(self, percolator: ProfilePercolator, max_queued: int = None, seen_size: int = 20000):
+        self.percolator = percolator
+        self._queue = queue.Queue(maxsize=max_queued if max_queued is not None else config.ALERTS_MAX_QUEUED)
+        self._seen = OrderedDict()
+        self._seen_size = seen_size
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alerts", daemon=True)
+                self._thread.start()
+
+    def submit(self, offers: list):
+        """Transmet des offres fraîchement reçues (appel non bloquant; abandon si la file est pleine)."""
+        if not config.ALERTS_ENABLED or not offers:
+            return
+        self._start()
+        try:
+            self._queue.put_nowait(offers)
+        except queue.Full:
+            logger.warning("File des alertes pleine: %d offres non percolées", len(offers))
+
+    def _run(self):
+        while True:
+            offers = self._queue.get()
+            fresh = []
+            for offer in offers:
+                offer_id = offer.get("id")
+                if offer_id in self._seen:
+                    continue
+                self._seen[offer_id] = True
+                fresh.append(offer)
+            while len(self._seen) > self._seen_size:
+                self._seen.popitem(last=False)
+            if not fresh:
+                continue
+            try:
+                self.percolator.percolate(fresh)
+            except Exception as e:
+                logger.error("Percolation des alertes en échec: %s", e)
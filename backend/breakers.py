@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+import config
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """Disjoncteur ouvert: l'appel amont n'est pas tenté."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur d'une dépendance amont (par worker).
+
+    Fermé, il observe les window derniers appels: erreurs (exception,
+    5xx, 429) et appels plus lents que slow_call_seconds comptent comme
+    des échecs. Au-delà de max_error_rate (sur au moins min_calls appels),
+    il s'ouvre: les appelants échouent aussitôt (CircuitOpen) et se
+    replient. Après open_seconds, il passe en semi-ouvert et laisse passer
+    une sonde à la fois; half_open_probes sondes réussies le referment,
+    un échec le rouvre.
+    """
+
+    def __init__(self, name: str, window: int = None, min_calls: int = None, max_error_rate: float = None,
+                 slow_call_seconds: float = None, open_seconds: float = None, half_open_probes: int = None):
+        self.name = name
+        self.min_calls = min_calls or config.BREAKER_MIN_CALLS
+        self.max_error_rate = max_error_rate or config.BREAKER_MAX_ERROR_RATE
+        self.slow_call_seconds = slow_call_seconds or config.BREAKER_SLOW_CALL_SECONDS
+        self.open_seconds = open_seconds or config.BREAKER_OPEN_SECONDS
+        self.half_open_probes = half_open_probes or config.BREAKER_HALF_OPEN_PROBES
+        self._samples = deque(maxlen=window or config.BREAKER_WINDOW)  # (latence, échec)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.opened_at = None
+        self.opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._probe_successes = 0
+
+    def _open(self, reason: str):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.opened += 1
+        self._probing = False
+        logger.warning("Disjoncteur %s ouvert (%s): appels suspendus %.0fs", self.name, reason, self.open_seconds)
+
+    def _close(self):
+        self.state = CLOSED
+        self.opened_at = None
+        self._samples.clear()
+        logger.info("Disjoncteur %s refermé", self.name)
+
+    def allow(self) -> bool:
+        """L'appel peut-il partir ? En semi-ouvert, une seule sonde à la fois."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probe_successes = 0
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def fail_fast(self):
+        """Lève CircuitOpen si le disjoncteur est ouvert, sans réserver de sonde (avant toute file d'attente)."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                raise CircuitOpen(f"Disjoncteur {self.name} ouvert")
+
+    def record(self, ok: bool, latency: float):
+        """Résultat d'un appel autorisé par allow()."""
+        failed = not ok or latency >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open("sonde en échec")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._close()
+                return
+            if self.state != CLOSED:
+                return
+            self._samples.append((latency, failed))
+            if len(self._samples) >= self.min_calls:
+                error_rate = sum(1 for _, f in self._samples if f) / len(self._samples)
+                if error_rate >= self.max_error_rate:
+                    self._open(f"{error_rate:.0%} d'échecs ou d'appels lents")
+
+    def release(self):
+        """Appel autorisé mais jamais parti (cloison pleine): rend la place de sonde sans verdict."""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probing = False
+
+    def call(self, fn, *args, succeeded=None, ignore: tuple = ()):
+        """
+        Exécute fn(*args) à travers le disjoncteur.
+
+        Args:
+            succeeded: succeeded(résultat) -> False si la réponse est un échec (statut HTTP)
+            ignore: Exceptions locales qui ne disent rien de l'amont (propagées sans verdict)
+
+        Raises:
+            CircuitOpen si le disjoncteur refuse l'appel
+        """
+        if not self.allow():
+            raise CircuitOpen(f"Disjoncteur {self.name} ouvert")
+        start = time.monotonic()
+        try:
+            result = fn(*args)
+        except ignore:
+            self.release()
+            raise
+        except Exception:
+            self.record(False, time.monotonic() - start)
+            raise
+        self.record(succeeded is None or succeeded(result), time.monotonic() - start)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            failures = sum(1 for _, f in self._samples if f)
+            latencies = sorted(latency for latency, _ in self._samples)
+            return {
+                "state": self.state,
+                "error_rate": round(failures / len(self._samples), 3) if self._samples else 0.0,
+                "p95_latency": round(latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)], 3) if latencies else None,
+                "samples": len(self._samples),
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "retry_in": round(max(0.0, self.opened_at + self.open_seconds - time.monotonic()), 1) if self.state == OPEN else None,
+            }
+
+
+FT_SEARCH = CircuitBreaker("ft_search")
+FT_AUTH = CircuitBreaker("ft_auth")
+
+ALL = (FT_SEARCH, FT_AUTH)
+
+
+def snapshot() -> dict:
+    return {breaker.name: breaker.snapshot() for breaker in ALL}
@@ -0,0 +1,145 @@
+import contextvars
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import config
+from deadline import Deadline, UNLIMITED
+
+logger = logging.getLogger(__name__)
+
+
+class BulkheadFull(RuntimeError):
+    """File d'une cloison pleine: l'appel est refusé sans attendre."""
+
+
+class Bulkhead:
+    """
+    Cloison: pool de threads et file d'attente bornés, propres à une classe
+    de dépendance (extraction PDF, LLM, recherche et auth France Travail).
+
+    Une dépendance lente ne remplit que sa cloison: au-delà de max_workers
+    appels en cours et max_queue en attente, les suivants sont refusés
+    (BulkheadFull) et l'appelant se replie, au lieu d'immobiliser les
+    threads partagés par les autres routes.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"bulkhead-{name}")
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self._wait_total = 0.0
+        self._run_total = 0.0
+
+    def _run(self, submitted_at: float, fn, *args):
+        started = time.monotonic()
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._wait_total += started - submitted_at
+        ok = False
+        try:
+            result = fn(*args)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.active -= 1
+                self._run_total += time.monotonic() - started
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def submit(self, fn, *args):
+        """
+        Met fn(*args) dans la cloison, avec le contexte de l'appelant (request_id).
+
+        Returns:
+            concurrent.futures.Future
+
+        Raises:
+            BulkheadFull si tous les threads sont occupés et la file pleine
+        """
+        with self._lock:
+            if self.active + self.queued >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                logger.warning("Cloison %s saturée (%d en cours, %d en attente): appel refusé", self.name, self.active, self.queued)
+                raise BulkheadFull(f"Cloison {self.name} saturée")
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        try:
+            future = self._executor.submit(contextvars.copy_context().run, self._run, time.monotonic(), fn, *args)
+        except Exception:
+            self._dequeue()
+            raise
+        # Un appel annulé avant de démarrer (future.cancel()) libère sa place dans la file
+        future.add_done_callback(lambda f: f.cancelled() and self._dequeue())
+        return future
+
+    def _dequeue(self):
+        with self._lock:
+            self.queued -= 1
+
+    def call(self, fn, *args, deadline: Deadline = UNLIMITED):
+        """
+        Exécute fn(*args) dans la cloison et attend son résultat (appelants synchrones).
+
+        Args:
+            fn: Appel bloquant vers la dépendance
+            deadline: Budget de la requête; attente en file comprise
+
+        Raises:
+            BulkheadFull si la cloison est saturée
+            TimeoutError si le budget s'épuise avant la réponse (un appel encore en file ne part pas)
+        """
+        future = self.submit(fn, *args)
+        remaining = deadline.remaining()
+        try:
+            return future.result(timeout=None if math.isinf(remaining) else remaining)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            future.cancel()
+            raise TimeoutError(f"Cloison {self.name}: budget épuisé ({deadline.budget}s)")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            started = self.completed + self.failed + self.active
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": self.queued,
+                "peak_queued": self.peak_queued,
+                "saturation": round((self.active + self.queued) / (self.max_workers + self.max_queue), 2),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self._wait_total / started * 1000, 1) if started else None,
+                "avg_run_ms": round(self._run_total / finished * 1000, 1) if finished else None,
+            }
+
+
+PDF = Bulkhead("pdf", config.BULKHEAD_PDF_THREADS, config.BULKHEAD_PDF_QUEUE)
+LLM = Bulkhead("llm", config.BULKHEAD_LLM_THREADS, config.BULKHEAD_LLM_QUEUE)
+FT_SEARCH = Bulkhead("ft_search", config.BULKHEAD_FT_SEARCH_THREADS, config.BULKHEAD_FT_SEARCH_QUEUE)
+FT_AUTH = Bulkhead("ft_auth", config.BULKHEAD_FT_AUTH_THREADS, config.BULKHEAD_FT_AUTH_QUEUE)
+
+ALL = (PDF, LLM, FT_SEARCH, FT_AUTH)
+
+
+def snapshot() -> dict:
+    return {bulkhead.name: bulkhead.snapshot() for bulkhead in ALL}
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+
+logger = logging.getLogger(__name__)
+
+# Valeur sentinelle: distingue "absent du cache" d'une valeur None/[] mise en cache
+MISSING = object()
+
+
+def make_key(*parts) -> str:
+    """Clé de cache stable à partir de valeurs JSON-sérialisables."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LRUCache:
+    """Cache LRU en mémoire avec expiration, sûr vis-à-vis des threads."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteStore:
+    """
+    Cache L2 partagé entre processus: une base SQLite en mode WAL dans un
+    répertoire commun (CACHE_DIR). Sous Vercel, /tmp survit entre deux
+    invocations d'une même instance chaude.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._connect().execute("CREATE INDEX IF NOT EXISTS idx_cache_expiry ON cache_entries (namespace, expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        row = self._connect().execute(
+            "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (namespace, key, time.time())
+        ).fetchone()
+        return row if row else None
+
+    def set(self, namespace: str, key: str, value: str, expires_at: float):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, expires_at)
+        )
+
+    def delete(self, namespace: str, key: str):
+        self._connect().execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def evict(self, namespace: str, max_entries: int):
+        """Supprime les entrées expirées puis les plus proches de l'expiration au-delà de max_entries."""
+        conn = self._connect()
+        conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?", (namespace, time.time()))
+        conn.execute(
+            """
+            DELETE FROM cache_entries WHERE namespace = ? AND key IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+            """,
+            (namespace, namespace, max_entries)
+        )
+
+
+class TwoTierCache:
+    """
+    Cache à deux niveaux par namespace: LRU en mémoire (L1) devant un stockage
+    SQLite partagé par tous les workers de la machine (L2).
+
+    Les valeurs sont stockées sérialisées en JSON dans les deux niveaux: chaque
+    lecture retourne une copie que l'appelant peut modifier sans effet de bord.
+    Une erreur du L2 est journalisée et le cache continue en L1 seul.
+    """
+
+    def __init__(self, namespaces: dict, path: str = None):
+        self.namespaces = namespaces
+        self._l1 = {name: LRUCache(opts["l1_size"]) for name, opts in namespaces.items()}
+        self._l2 = None
+        self._writes = {name: 0 for name in namespaces}
+        self.stats = {name: {"l1_hits": 0, "l2_hits": 0, "misses": 0} for name in namespaces}
+        if path:
+            try:
+                self._l2 = SQLiteStore(path)
+            except Exception as e:
+                logger.warning("Cache L2 indisponible (%s): %s", path, e)
+
+    def get(self, namespace: str, key: str):
+        """Retourne la valeur en cache ou MISSING."""
+        stats = self.stats[namespace]
+        raw = self._l1[namespace].get(key)
+        if raw is not MISSING:
+            stats["l1_hits"] += 1
+            return json.loads(raw)
+
+        if self._l2 is not None and self.namespaces[namespace]["l2_size"] > 0:
+            try:
+                row = self._l2.get(namespace, key)
+            except Exception as e:
+                logger.warning("Lecture cache L2 impossible: %s", e)
+                row = None
+            if row:
+                raw, expires_at = row
+                self._l1[namespace].set(key, raw, expires_at)
+                stats["l2_hits"] += 1
+                return json.loads(raw)
+
+        stats["misses"] += 1
+        return MISSING
+
+    def set(self, namespace: str, key: str, value, ttl: float = None):
+        """Met une valeur JSON-sérialisable en cache (TTL du namespace par défaut)."""
+        opts = self.namespaces[namespace]
+        ttl = opts["ttl"] if ttl is None else min(ttl, opts["ttl"])
+        if ttl <= 0:
+            return
+        raw = json.dumps(value, ensure_ascii=False)
+        expires_at = time.time() + ttl
+        self._l1[namespace].set(key, raw, expires_at)
+
+        if self._l2 is not None and opts["l2_size"] > 0:
+            try:
+                self._l2.set(namespace, key, raw, expires_at)
+                self._writes[namespace] += 1
+                # Éviction périodique plutôt qu'à chaque écriture
+                if self._writes[namespace] % 50 == 0:
+                    self._l2.evict(namespace, opts["l2_size"])
+            except Exception as e:
+                logger.warning("Écriture cache L2 impossible: %s", e)
+
+    def delete(self, namespace: str, key: str):
+        self._l1[namespace].delete(key)
+        if self._l2 is not None:
+            try:
+                self._l2.delete(namespace, key)
+            except Exception as e:
+                logger.warning("Suppression cache L2 impossible: %s", e)
+
+    def snapshot(self) -> dict:
+        return {
+            name: {**self.stats[name], "l1_entries": len(self._l1[name])}
+            for name in self.namespaces
+        }
+
+
+cache = TwoTierCache(
+    config.CACHE_NAMESPACES,
+    path=os.path.join(config.CACHE_DIR, "easyjobfind_cache.sqlite3") if config.CACHE_DIR else None
+)
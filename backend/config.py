@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from groq import Groq
 
@@ -18,6 +19,168 @@ if not GROQ_API_KEY:
 # Initialize Groq client (conditionnel pour éviter le crash au build)
 client_groq = Groq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
 
-# URLS API France Travail
-AUTH_URL = "https://entreprise.pole-emploi.fr/connexion/oauth2/access_token?realm=%2Fpartenaire"
-SEARCH_URL = "https://api.francetravail.io/partenaire/offresdemploi"
+# URLS API France Travail (surchargeables pour les tests de charge avec des bouchons locaux)
+AUTH_URL = os.getenv("FT_AUTH_URL", "https://entreprise.pole-emploi.fr/connexion/oauth2/access_token?realm=%2Fpartenaire")
+SEARCH_URL = os.getenv("FT_SEARCH_URL", "https://api.francetravail.io/partenaire/offresdemploi")
+
+# Pool de connexions HTTP partagé vers France Travail (par processus)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+
+# Préchauffage des workers au démarrage (lifespan), suivi par /ready
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "20"))  # Au-delà, le worker est déclaré prêt
+WARMUP_STEP_TIMEOUT = float(os.getenv("WARMUP_STEP_TIMEOUT", "5"))
+
+# Limites d'upload et d'extraction des CV
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))  # 10 Mo
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "20"))
+CV_PROMPT_MAX_CHARS = int(os.getenv("CV_PROMPT_MAX_CHARS", "5000"))  # Texte envoyé au LLM
+
+# Routage des modèles LLM (du plus rapide au plus précis)
+GROQ_MODELS = [m.strip() for m in os.getenv("GROQ_MODELS", "llama-3.1-8b-instant,llama-3.3-70b-versatile").split(",") if m.strip()]
+GROQ_PRIMARY_MODEL = os.getenv("GROQ_PRIMARY_MODEL", "llama-3.3-70b-versatile")
+LLM_SMALL_INPUT_TOKENS = int(os.getenv("LLM_SMALL_INPUT_TOKENS", "400"))  # En dessous: modèle rapide
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))  # Secondes, tant que les stats manquent
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.5"))
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "50"))
+LLM_MIN_SAMPLES = int(os.getenv("LLM_MIN_SAMPLES", "5"))
+
+# Contrôle d'admission (par worker)
+ANALYZE_MAX_IN_FLIGHT = int(os.getenv("ANALYZE_MAX_IN_FLIGHT", "4"))
+ANALYZE_MAX_QUEUE = int(os.getenv("ANALYZE_MAX_QUEUE", "8"))
+ANALYZE_QUEUE_TIMEOUT = float(os.getenv("ANALYZE_QUEUE_TIMEOUT", "10"))  # Secondes
+SEARCH_MAX_IN_FLIGHT = int(os.getenv("SEARCH_MAX_IN_FLIGHT", "16"))
+SEARCH_MAX_QUEUE = int(os.getenv("SEARCH_MAX_QUEUE", "32"))
+SEARCH_QUEUE_TIMEOUT = float(os.getenv("SEARCH_QUEUE_TIMEOUT", "5"))
+
+# Budget de temps par requête (échéance propagée à chaque étape, attente d'admission comprise)
+ANALYZE_SLA_SECONDS = float(os.getenv("ANALYZE_SLA_SECONDS", "50"))
+SEARCH_SLA_SECONDS = float(os.getenv("SEARCH_SLA_SECONDS", "20"))
+FT_AUTH_TIMEOUT = float(os.getenv("FT_AUTH_TIMEOUT", "10"))  # Plafonds par appel, réduits au budget restant
+FT_SEARCH_TIMEOUT = float(os.getenv("FT_SEARCH_TIMEOUT", "15"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "40"))
+DEADLINE_MIN_LLM_SECONDS = float(os.getenv("DEADLINE_MIN_LLM_SECONDS", "8"))  # En dessous: extraction basique
+DEADLINE_SEARCH_RESERVE_SECONDS = float(os.getenv("DEADLINE_SEARCH_RESERVE_SECONDS", "5"))  # Gardé pour la recherche
+DEADLINE_MIN_SEARCH_SECONDS = float(os.getenv("DEADLINE_MIN_SEARCH_SECONDS", "2"))  # En dessous: pas de stratégie de repli
+DEADLINE_MIN_UPSTREAM_SECONDS = float(os.getenv("DEADLINE_MIN_UPSTREAM_SECONDS", "0.5"))  # En dessous: cache seul
+
+# File d'analyses asynchrones (POST /analyze/jobs)
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")  # sqlite (partagé entre workers) ou memory
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(tempfile.gettempdir(), "easyjobfind_jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # Threads par processus
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))  # Secondes
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "300"))  # Reprise d'un job bloqué
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))  # Conservation des résultats
+JOB_OVERLOAD_RETRIES = int(os.getenv("JOB_OVERLOAD_RETRIES", "3"))  # Nouvelles tentatives d'un job refusé par une cloison pleine
+
+# Réponses allégées et compression
+COMPACT_DESCRIPTION_CHARS = int(os.getenv("COMPACT_DESCRIPTION_CHARS", "120"))
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Cache à deux niveaux (L1 en mémoire, L2 SQLite partagé entre workers)
+CACHE_DIR = os.getenv("CACHE_DIR", tempfile.gettempdir())  # Vide: L1 seul
+
+def _cache_namespace(name: str, ttl: int, l1_size: int, l2_size: int) -> dict:
+    """Options d'un namespace, surchargeables via CACHE_<NAME>_TTL / _L1_SIZE / _L2_SIZE."""
+    prefix = f"CACHE_{name.upper()}_"
+    return {
+        "ttl": float(os.getenv(prefix + "TTL", str(ttl))),
+        "l1_size": int(os.getenv(prefix + "L1_SIZE", str(l1_size))),
+        "l2_size": int(os.getenv(prefix + "L2_SIZE", str(l2_size))),
+    }
+
+CACHE_NAMESPACES = {
+    "ft_token": _cache_namespace("ft_token", ttl=1440, l1_size=1, l2_size=1),
+    "ft_search": _cache_namespace("ft_search", ttl=600, l1_size=256, l2_size=5000),
+    "cv_analysis": _cache_namespace("cv_analysis", ttl=86400, l1_size=128, l2_size=10000),
+    "search_strategy": _cache_namespace("search_strategy", ttl=86400, l1_size=512, l2_size=20000),
+    # Derniers résultats France Travail valides, servis (marqués périmés) quand l'API est indisponible
+    "ft_stale": _cache_namespace("ft_stale", ttl=604800, l1_size=64, l2_size=5000),
+}
+NEGATIVE_CACHE_TTL = float(os.getenv("NEGATIVE_CACHE_TTL", "300"))  # Recherches sans résultat
+
+# Corpus d'offres local en colonnes (offer_store.py build), partagé entre workers par mmap
+OFFER_STORE_PATH = os.getenv("OFFER_STORE_PATH")
+
+# Index reconstruits à chaud (référentiel ROME, autocomplétion, corpus local): vérification des sources
+INDEX_REFRESH_INTERVAL = float(os.getenv("INDEX_REFRESH_INTERVAL", "60"))  # 0: rafraîchissement manuel seul
+
+# Index de facettes des résultats de /jobs/{keyword} (par worker)
+FACET_INDEX_CACHE_SIZE = int(os.getenv("FACET_INDEX_CACHE_SIZE", "64"))
+
+# Autocomplétion (/suggest): suggestions gardées par nœud du trie, profondeur maximale
+SUGGEST_TOP_K = int(os.getenv("SUGGEST_TOP_K", "10"))
+SUGGEST_MAX_PREFIX = int(os.getenv("SUGGEST_MAX_PREFIX", "24"))
+SUGGEST_MIN_OBSERVED = int(os.getenv("SUGGEST_MIN_OBSERVED", "3"))  # Occurrences avant d'indexer un libellé observé
+SUGGEST_MAX_OBSERVED = int(os.getenv("SUGGEST_MAX_OBSERVED", "20000"))  # Libellés observés comptés (et indexés) par génération
+
+# Alertes sur profils sauvegardés (percolation des nouvelles offres)
+ALERTS_ENABLED = os.getenv("ALERTS_ENABLED", "true").lower() in ("1", "true", "yes")
+ALERTS_DB_PATH = os.getenv("ALERTS_DB_PATH", os.path.join(tempfile.gettempdir(), "easyjobfind_alerts.sqlite3"))
+ALERT_MIN_SCORE = int(os.getenv("ALERT_MIN_SCORE", "50"))  # Sur 100, doit rester > 20 (points du niveau seul)
+ALERTS_MAX_QUEUED = int(os.getenv("ALERTS_MAX_QUEUED", "100"))  # Lots d'offres en attente de percolation
+
+# Diagnostic et profilage (endpoints /debug/* désactivés sans DEBUG_TOKEN)
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))  # Part des requêtes profilées
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "50"))
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", "2"))
+MEMORY_PROFILING = os.getenv("MEMORY_PROFILING", "false").lower() in ("1", "true", "yes")  # tracemalloc par étape
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))  # Profondeur des tracebacks d'allocation
+
+# Traces par requête (spans OTLP/JSON), exportées si échantillonnées ou plus lentes que TRACE_SLOW_SECONDS
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "10"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", os.path.join(tempfile.gettempdir(), "easyjobfind_traces.jsonl"))  # Vide: mémoire seule
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))  # Rotation du fichier d'export
+TRACE_MAX_STORED = int(os.getenv("TRACE_MAX_STORED", "200"))  # Dernières traces gardées en mémoire par worker
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "easyjobfind-api")
+
+# Logs
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json ou text
+LOG_VERBOSE_SAMPLE_RATE = float(os.getenv("LOG_VERBOSE_SAMPLE_RATE", "0.05"))  # Part des logs détaillés conservés
+
+# Sources d'offres agrégées (france_travail, mock, feeds) et échéances par source
+OFFER_SOURCES = [name.strip() for name in os.getenv("OFFER_SOURCES", "france_travail,feeds").split(",") if name.strip()]
+OFFER_FEEDS_DIR = os.getenv("OFFER_FEEDS_DIR")  # Dépôts JSON/CSV des partenaires
+SOURCE_DEADLINES = {
+    "france_travail": float(os.getenv("SOURCE_DEADLINE_FRANCE_TRAVAIL", "12")),
+    "mock": float(os.getenv("SOURCE_DEADLINE_MOCK", "0.5")),
+    "feeds": float(os.getenv("SOURCE_DEADLINE_FEEDS", "2")),
+}
+SOURCE_DEFAULT_DEADLINE = float(os.getenv("SOURCE_DEFAULT_DEADLINE", "5"))
+SOURCE_THREADS = int(os.getenv("SOURCE_THREADS", "16"))
+
+# Disjoncteurs France Travail (recherche, auth), par worker: ouverts au-delà du taux d'échec
+# (erreurs et appels plus lents que BREAKER_SLOW_CALL_SECONDS) sur les BREAKER_WINDOW derniers appels
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_MAX_ERROR_RATE = float(os.getenv("BREAKER_MAX_ERROR_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))  # Avant la première sonde
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "2"))  # Sondes réussies pour refermer
+
+# Cloisons par dépendance (par worker): threads et file d'attente bornés, au-delà l'appel est refusé.
+# Les appels France Travail attendent leur cloison depuis un thread du pool des sources:
+# threads + file des deux cloisons FT restent sous SOURCE_THREADS pour laisser la place aux autres sources
+BULKHEAD_PDF_THREADS = int(os.getenv("BULKHEAD_PDF_THREADS", "2"))
+BULKHEAD_PDF_QUEUE = int(os.getenv("BULKHEAD_PDF_QUEUE", "6"))
+BULKHEAD_LLM_THREADS = int(os.getenv("BULKHEAD_LLM_THREADS", "8"))  # Hedging compris: jusqu'à 2 appels par analyse
+BULKHEAD_LLM_QUEUE = int(os.getenv("BULKHEAD_LLM_QUEUE", "4"))
+BULKHEAD_FT_SEARCH_THREADS = int(os.getenv("BULKHEAD_FT_SEARCH_THREADS", "6"))
+BULKHEAD_FT_SEARCH_QUEUE = int(os.getenv("BULKHEAD_FT_SEARCH_QUEUE", "4"))
+BULKHEAD_FT_AUTH_THREADS = int(os.getenv("BULKHEAD_FT_AUTH_THREADS", "1"))
+BULKHEAD_FT_AUTH_QUEUE = int(os.getenv("BULKHEAD_FT_AUTH_QUEUE", "3"))
+
+# Référentiel ROME embarqué (métier détecté -> codes ROME pour la recherche France Travail)
+ROME_REFERENTIAL_PATH = os.getenv("ROME_REFERENTIAL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rome.json"))
+ROME_MIN_SCORE = float(os.getenv("ROME_MIN_SCORE", "0.6"))  # Entre 0 et 1
+ROME_MAX_CODES = int(os.getenv("ROME_MAX_CODES", "2"))
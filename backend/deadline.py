@@ -0,0 +1,37 @@
+import math
+import time
+
+
+class Deadline:
+    """
+    Budget de temps d'une requête, créé à son arrivée et transmis à chaque étape.
+
+    Chaque étape dimensionne son timeout sur le temps restant (timeout()) et
+    choisit une option moins coûteuse quand il ne suffit plus (has()).
+    """
+
+    def __init__(self, budget: float = None):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget if budget is not None else math.inf
+
+    def remaining(self) -> float:
+        """Temps restant en secondes (jamais négatif, infini sans budget)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, cap: float) -> float:
+        """Timeout d'une étape: son plafond habituel, réduit au temps restant."""
+        return min(cap, self.remaining())
+
+    def has(self, seconds: float) -> bool:
+        """Reste-t-il au moins `seconds` secondes ?"""
+        return self.remaining() >= seconds
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.2f}s)"
+
+
+# Pas de budget: appels hors requête (workers de jobs, Streamlit, scripts)
+UNLIMITED = Deadline(None)
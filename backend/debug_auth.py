@@ -0,0 +1,23 @@
+import hmac
+from typing import Optional
+from fastapi import Header, HTTPException
+import config
+
+
+def is_valid_token(token: Optional[str]) -> bool:
+    """Vérifie un jeton de debug (comparaison à temps constant)."""
+    if not config.DEBUG_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), config.DEBUG_TOKEN.encode())
+
+
+async def require_debug_token(x_debug_token: Optional[str] = Header(None)):
+    """
+    Dépendance FastAPI des endpoints de diagnostic.
+
+    Sans DEBUG_TOKEN configuré, ces endpoints n'existent pas (404).
+    """
+    if not config.DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_valid_token(x_debug_token):
+        raise HTTPException(status_code=401, detail="Jeton de debug invalide")
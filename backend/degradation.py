@@ -0,0 +1,35 @@
+import contextvars
+from contextlib import contextmanager
+
+# Replis survenus pendant le bloc suivi, partagés avec les threads et les sources (contexte copié)
+_reasons_var = contextvars.ContextVar("degradation", default=None)
+
+
+@contextmanager
+def track():
+    """
+    Collecte les replis survenus dans le bloc: source en échec ou hors délai,
+    résultats périmés, extraction basique au lieu de l'analyse IA.
+
+    Un résultat obtenu en mode dégradé ne doit pas être mémorisé comme s'il
+    était définitif. Les replis d'un bloc imbriqué remontent au bloc englobant.
+
+    Returns:
+        Ensemble des raisons, rempli au fil du bloc
+    """
+    outer = _reasons_var.get()
+    reasons = set()
+    token = _reasons_var.set(reasons)
+    try:
+        yield reasons
+    finally:
+        _reasons_var.reset(token)
+        if outer is not None:
+            outer.update(reasons)
+
+
+def mark(reason: str):
+    """Signale un repli au bloc suivi en cours (sans effet hors de track())."""
+    reasons = _reasons_var.get()
+    if reasons is not None:
+        reasons.add(reason)
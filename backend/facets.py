@@ -0,0 +1,265 @@
+import logging
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+import config
+
+logger = logging.getLogger(__name__)
+
+# Types de contrat normalisés (codes France Travail -> type)
+CONTRACT_CODES = {
+    "CDI": "cdi",
+    "CDD": "cdd",
+    "MIS": "interim",
+    "SAI": "saisonnier",
+    "LIB": "independant",
+}
+CONTRACT_TYPES = ("cdi", "cdd", "interim", "saisonnier", "alternance", "stage", "independant", "autre")
+
+# Tranches de salaire annuel brut (borne basse incluse, en euros)
+SALARY_BUCKETS = (
+    ("0-25k", 0),
+    ("25-35k", 25000),
+    ("35-45k", 35000),
+    ("45-60k", 45000),
+    ("60k+", 60000),
+)
+NO_SALARY = "non_precise"
+
+# Conversion en salaire annuel: 12 mois, 1607 heures (durée légale annuelle)
+PERIOD_FACTORS = {"an": 1, "mois": 12, "heure": 1607}
+
+LEVELS = ("junior", "intermediaire", "senior", "tous")
+
+# Facettes exposées par /jobs/{keyword} (nom du paramètre -> champ de l'offre)
+FACET_FIELDS = ("contrat", "salaire", "departement", "niveau")
+
+_NUMBER = re.compile(r"(\d+(?:[.,]\d+)?)\s*(k)?", re.IGNORECASE)
+_DURATION = re.compile(r"sur\s+\d+(?:[.,]\d+)?\s*(?:mois|heures?)|\d+\s*(?:ème|eme|e)\b", re.IGNORECASE)  # 'sur 12 mois', 'sur 151.67 heures', '13ème mois'
+_THOUSANDS = re.compile(r"(?<=\d)[\s  ](?=\d{3}\b)")
+_PERIODS = (
+    ("heure", re.compile(r"horaire|heure|/\s*h\b", re.IGNORECASE)),
+    ("mois", re.compile(r"mensuel|mois", re.IGNORECASE)),
+    ("an", re.compile(r"annuel|/\s*an\b|par an|\dk", re.IGNORECASE)),
+)
+_DEPARTMENT_PREFIX = re.compile(r"^\s*(\d{2,3}|2[AB])\s*-")
+_DEPARTMENT_PARENS = re.compile(r"\((\d{2,3}|2[AB])\)")
+
+
+def parse_salary(text: str) -> tuple:
+    """
+    Salaire libre -> (min, max, période), période parmi 'heure', 'mois', 'an'.
+
+    Formats France Travail ('Mensuel de 2000.00 Euros à 2500.00 Euros sur
+    12 mois') et du catalogue ('1800-2000€/mois', '35-45k€', '11.65€/h').
+    Sans période explicite, elle est déduite de l'ordre de grandeur. Les
+    durées ('sur 12 mois', 'sur 151.67 heures') ne sont pas des montants.
+
+    >>> parse_salary("Horaire de 11.88 Euros sur 151.67 heures")
+    (11.88, 11.88, 'heure')
+    >>> parse_salary("Mensuel de 2000.00 Euros à 2500.00 Euros sur 12 mois")
+    (2000.0, 2500.0, 'mois')
+    >>> parse_salary("Annuel de 35000.00 Euros à 45000.00 Euros sur 12 mois")
+    (35000.0, 45000.0, 'an')
+    >>> parse_salary("35-45k€")
+    (35000.0, 45000.0, 'an')
+
+    Returns:
+        (min, max, période), ou (None, None, None) si aucun montant n'est lisible
+    """
+    if not text:
+        return None, None, None
+    cleaned = _THOUSANDS.sub("", _DURATION.sub("", text))
+    found = _NUMBER.findall(cleaned)
+    # '35-45k€': le 'k' final vaut pour les deux bornes
+    in_thousands = any(thousands for _, thousands in found)
+    values = []
+    for number, _ in found:
+        value = float(number.replace(",", "."))
+        values.append(value * 1000 if in_thousands and value < 1000 else value)
+    if not values:
+        return None, None, None
+
+    low, high = min(values[:2]), max(values[:2])
+    period = next((name for name, pattern in _PERIODS if pattern.search(cleaned)), None)
+    if period is None:
+        period = "heure" if high < 100 else "mois" if high < 10000 else "an"
+    return low, high, period
+
+
+def annual_salary(amount, period: str):
+    if amount is None or period not in PERIOD_FACTORS:
+        return None
+    return amount * PERIOD_FACTORS[period]
+
+
+def salary_bucket(annual_min) -> str:
+    if annual_min is None:
+        return NO_SALARY
+    bucket = SALARY_BUCKETS[0][0]
+    for name, floor in SALARY_BUCKETS:
+        if annual_min >= floor:
+            bucket = name
+    return bucket
+
+
+def contract_type(code: str = None, label: str = None, nature: str = None) -> str:
+    """Type de contrat normalisé (CONTRACT_TYPES) d'après le code, le libellé et la nature du contrat."""
+    text = f"{label or ''} {nature or ''}".lower()
+    if "apprenti" in text or "alternance" in text or "professionnalisation" in text:
+        return "alternance"
+    if "stage" in text:
+        return "stage"
+    if code and code.upper() in CONTRACT_CODES:
+        return CONTRACT_CODES[code.upper()]
+    for word, kind in (("cdi", "cdi"), ("indétermin", "cdi"), ("cdd", "cdd"), ("déterminé", "cdd"),
+                       ("intérim", "interim"), ("interim", "interim"), ("saisonnier", "saisonnier"),
+                       ("freelance", "independant"), ("libéral", "independant"), ("indépendant", "independant")):
+        if word in text:
+            return kind
+    return "autre"
+
+
+def department(label: str = None, postal_code: str = None):
+    """Département d'un lieu ('75 - Paris 15e', 'Lyon (69)', code postal), ou None."""
+    for pattern in (_DEPARTMENT_PREFIX, _DEPARTMENT_PARENS):
+        match = pattern.search(label or "")
+        if match:
+            return match.group(1)
+    if postal_code and len(postal_code) == 5:
+        return postal_code[:3] if postal_code.startswith("97") else postal_code[:2]
+    return None
+
+
+def structured_fields(offer: dict) -> dict:
+    """
+    Champs structurés d'une offre: ceux calculés à l'ingestion s'ils sont
+    présents, sinon déduits des champs texte (catalogue, flux CSV).
+    """
+    if "contrat_type" in offer:
+        return {key: offer.get(key) for key in ("salaire_min", "salaire_max", "salaire_periode", "contrat_type", "departement")}
+    low, high, period = parse_salary(offer.get("salaire"))
+    return {
+        "salaire_min": low,
+        "salaire_max": high,
+        "salaire_periode": period,
+        "contrat_type": contract_type(label=offer.get("contrat")),
+        "departement": department((offer.get("lieuTravail") or {}).get("libelle")),
+    }
+
+
+class FacetIndex:
+    """
+    Index de facettes d'une liste d'offres, calculé une fois par résultat de recherche.
+
+    Chaque valeur de facette a son bitset (entier Python, bit i = offre i):
+    filtrer revient à des ET/OU de bitsets et compter à un bit_count().
+    Les compteurs d'une facette ignorent son propre filtre (facettes
+    disjonctives): cocher 'cdi' n'efface pas le compteur de 'cdd'.
+    Le salaire annuel maximal est gardé en colonne pour le tri.
+    """
+
+    def __init__(self, offers: list):
+        self.size = len(offers)
+        self.all = (1 << self.size) - 1
+        self.bitsets = {field: {} for field in FACET_FIELDS}
+        self.salary = array("d")  # Salaire annuel maximal (NaN si inconnu)
+
+        for position, offer in enumerate(offers):
+            fields = structured_fields(offer)
+            period = fields["salaire_periode"]
+            values = {
+                "contrat": fields["contrat_type"],
+                "salaire": salary_bucket(annual_salary(fields["salaire_min"], period)),
+                "departement": fields["departement"] or "inconnu",
+                "niveau": offer.get("niveau", "tous"),
+            }
+            bit = 1 << position
+            for field, value in values.items():
+                bitset = self.bitsets[field]
+                bitset[value] = bitset.get(value, 0) | bit
+            annual = annual_salary(fields["salaire_max"], period)
+            self.salary.append(annual if annual is not None else math.nan)
+
+    def _field_mask(self, field: str, values) -> int:
+        mask = 0
+        for value in values:
+            mask |= self.bitsets[field].get(value, 0)
+        return mask
+
+    def mask(self, filters: dict, skip: str = None) -> int:
+        """Bitset des offres retenues par les filtres {facette: valeurs} (hors facette `skip`)."""
+        result = self.all
+        for field, values in filters.items():
+            if field != skip and values:
+                result &= self._field_mask(field, values)
+        return result
+
+    def counts(self, filters: dict) -> dict:
+        """Nombre d'offres par valeur de chaque facette, compte tenu des filtres des autres facettes."""
+        result = {}
+        for field in FACET_FIELDS:
+            base = self.mask(filters, skip=field)
+            counts = {value: (bits & base).bit_count() for value, bits in self.bitsets[field].items()}
+            result[field] = {value: count for value, count in sorted(counts.items(), key=lambda item: -item[1]) if count}
+        return result
+
+    def select(self, filters: dict, sort: str = None) -> list:
+        """Positions des offres retenues, dans l'ordre d'origine ou par salaire décroissant."""
+        mask = self.mask(filters)
+        positions = [i for i in range(self.size) if mask >> i & 1]
+        if sort == "salaire":
+            positions.sort(key=lambda i: -self.salary[i] if not math.isnan(self.salary[i]) else math.inf)
+        return positions
+
+
+def parse_filters(**raw) -> dict:
+    """
+    Paramètres de filtre ('cdi,cdd') -> {facette: ensemble de valeurs}.
+
+    Raises:
+        ValueError si une valeur de contrat, de tranche de salaire ou de niveau est inconnue
+    """
+    allowed = {
+        "contrat": set(CONTRACT_TYPES),
+        "salaire": {name for name, _ in SALARY_BUCKETS} | {NO_SALARY},
+        "niveau": set(LEVELS),
+    }
+    filters = {}
+    for field, value in raw.items():
+        if not value:
+            continue
+        values = {v.strip() for v in value.split(",") if v.strip()}
+        unknown = values - allowed[field] if field in allowed else set()
+        if unknown:
+            raise ValueError(f"{field}: valeurs inconnues {', '.join(sorted(unknown))} (disponibles: {', '.join(sorted(allowed[field]))})")
+        filters[field] = values
+    return filters
+
+
+_indexes = OrderedDict()  # mot-clé -> (ids des offres, index)
+_lock = threading.Lock()
+
+
+def index_for(keyword: str, offers: list) -> FacetIndex:
+    """
+    Index de facettes d'un résultat de recherche, réutilisé tant que la
+    recherche (servie par le cache) retourne les mêmes offres: filtrer ou
+    changer de facette ne refait ni appel amont ni calcul d'index.
+    """
+    ids = tuple(offer.get("id") for offer in offers)
+    key = keyword.strip().lower()
+    with _lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[0] == ids:
+            _indexes.move_to_end(key)
+            return entry[1]
+    index = FacetIndex(offers)
+    with _lock:
+        _indexes[key] = (ids, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > config.FACET_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,216 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path: str):
+    """(mtime, taille, inode) d'un fichier, None s'il est absent: change quand le fichier est remplacé."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def directory_signature(path: str):
+    """Signatures des fichiers d'un répertoire (flux partenaires)."""
+    if not path or not os.path.isdir(path):
+        return None
+    return tuple(sorted((name, file_signature(os.path.join(path, name))) for name in os.listdir(path)))
+
+
+class Generation:
+    """Une version construite et validée d'un index, tenue par les requêtes qui l'utilisent."""
+
+    def __init__(self, number: int, value, signature, build_seconds: float):
+        self.number = number
+        self.value = value
+        self.signature = signature
+        self.build_seconds = build_seconds
+        self.built_at = time.time()
+        self.refs = 0
+        self.retired = False
+
+    def describe(self) -> dict:
+        return {
+            "generation": self.number,
+            "built_at": self.built_at,
+            "build_ms": round(self.build_seconds * 1000, 1),
+            "refs": self.refs,
+            "size": len(self.value) if hasattr(self.value, "__len__") else None,
+        }
+
+
+class ManagedIndex:
+    """
+    Index reconstruit sans interrompre le trafic.
+
+    Une nouvelle génération est construite hors verrou (thread de
+    surveillance, rafraîchissement manuel, ou fichier produit par un autre
+    processus puis rouvert), validée, puis publiée par un simple échange de
+    référence. Les requêtes en cours gardent la génération qu'elles ont
+    acquise; l'ancienne est libérée (close) quand la dernière la rend.
+    Une construction ou une validation en échec laisse la génération
+    courante en service.
+    """
+
+    def __init__(self, name: str, build, validate=None, close=None, signature=None):
+        self.name = name
+        self._build = build  # build(valeur précédente ou None) -> nouvelle valeur
+        self._validate = validate  # validate(valeur) -> True si publiable
+        self._close = close
+        self._signature = signature
+        self._current = None
+        self._retired = []  # Générations remplacées, encore tenues par des requêtes
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._generations = 0
+        self._failed_signature = None
+        self.attempted = False
+        self.last_error = None
+        self.last_check = None
+
+    def peek(self):
+        """Valeur courante sans déclencher de construction (None si l'index n'est pas encore construit)."""
+        generation = self._current
+        return generation.value if generation is not None else None
+
+    def current(self):
+        """Valeur courante, construite au premier appel; None si aucune génération n'a pu être construite."""
+        if self._current is None and not self.attempted:
+            self.refresh(initial=True)
+        return self.peek()
+
+    @contextmanager
+    def acquire(self):
+        """Tient la génération courante jusqu'à la sortie du bloc (elle ne peut pas être libérée entre-temps)."""
+        if self._current is None and not self.attempted:
+            self.refresh(initial=True)
+        with self._lock:
+            generation = self._current
+            if generation is not None:
+                generation.refs += 1
+        try:
+            yield generation.value if generation is not None else None
+        finally:
+            if generation is not None:
+                with self._lock:
+                    generation.refs -= 1
+                    release = generation.retired and generation.refs == 0
+                if release:
+                    self._release(generation)
+
+    def refresh(self, force: bool = True, initial: bool = False) -> bool:
+        """
+        Construit, valide et publie une nouvelle génération.
+
+        Args:
+            force: Sans force, ne reconstruit que si la signature de la source a changé
+            initial: Première construction (premier usage): ignorée si une autre l'a déjà faite
+
+        Returns:
+            True si une nouvelle génération a été publiée
+        """
+        with self._build_lock:
+            if initial and (self._current is not None or self.attempted):
+                return False
+            self.last_check = time.time()
+            signature = self._signature() if self._signature else None
+            current = self._current
+            # Sans force: rien à faire si la source n'a pas changé depuis la dernière génération ou le dernier échec
+            if not force and signature in ((current.signature if current is not None else None), self._failed_signature):
+                return False
+
+            start = time.monotonic()
+            try:
+                value = self._build(current.value if current is not None else None)
+                if self._validate is not None and not self._validate(value):
+                    if self._close is not None:
+                        self._close(value)
+                    raise ValueError("validation refusée")
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                self._failed_signature = signature
+                logger.error("Index %s: génération %d non publiée (%s)", self.name, self._generations + 1, self.last_error)
+                return False
+            finally:
+                self.attempted = True
+
+            self._generations += 1
+            generation = Generation(self._generations, value, signature, time.monotonic() - start)
+            with self._lock:
+                old = self._current
+                self._current = generation
+                release_old = old is not None and old.refs == 0
+                if old is not None:
+                    old.retired = True
+                    if not release_old:
+                        self._retired.append(old)
+            self.last_error = None
+            logger.info("Index %s: génération %d publiée en %.0f ms", self.name, generation.number, generation.build_seconds * 1000)
+
+        if release_old:
+            self._release(old)
+        return True
+
+    def _release(self, generation: Generation):
+        with self._lock:
+            if generation in self._retired:
+                self._retired.remove(generation)
+        if self._close is not None:
+            try:
+                self._close(generation.value)
+            except Exception as e:
+                logger.warning("Index %s: libération de la génération %d en échec: %s", self.name, generation.number, e)
+        generation.value = None
+        logger.info("Index %s: génération %d libérée", self.name, generation.number)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            current = self._current.describe() if self._current is not None else None
+            retired = [generation.describe() for generation in self._retired]
+        return {"current": current, "retired": retired, "last_error": self.last_error, "last_check": self.last_check}
+
+
+registry = {}
+
+
+def register(name: str, build, validate=None, close=None, signature=None) -> ManagedIndex:
+    index = ManagedIndex(name, build, validate, close, signature)
+    registry[name] = index
+    return index
+
+
+def refresh_changed():
+    """Reconstruit les index déjà utilisés dont la source a changé."""
+    for index in list(registry.values()):
+        if index.attempted:
+            index.refresh(force=False)
+
+
+_watcher_started = False
+_watcher_lock = threading.Lock()
+
+
+def _watch():
+    while True:
+        time.sleep(config.INDEX_REFRESH_INTERVAL)
+        try:
+            refresh_changed()
+        except Exception as e:
+            logger.error("Surveillance des index en échec: %s", e)
+
+
+def start_watcher():
+    """Lance la surveillance des sources d'index (toutes les INDEX_REFRESH_INTERVAL secondes). Idempotent."""
+    global _watcher_started
+    with _watcher_lock:
+        if _watcher_started or config.INDEX_REFRESH_INTERVAL <= 0:
+            return
+        _watcher_started = True
+    threading.Thread(target=_watch, name="indexes", daemon=True).start()
@@ -0,0 +1,291 @@
+import json
+import logging
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+import config
+from logging_setup import request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'un job d'analyse
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobStore(ABC):
+    """
+    Interface d'un backend de file de jobs.
+
+    Un backend doit être sûr vis-à-vis des threads ; claim() doit garantir
+    qu'un job n'est attribué qu'à un seul worker.
+    """
+
+    @abstractmethod
+    def create(self, payload: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def claim(self):
+        """Retourne (job_id, payload) du prochain job en attente, ou None."""
+
+    @abstractmethod
+    def complete(self, job_id: str, result: dict):
+        ...
+
+    @abstractmethod
+    def fail(self, job_id: str, error: str):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str):
+        """Retourne le job (dict sans payload) ou None s'il n'existe pas."""
+
+    @abstractmethod
+    def count_queued(self) -> int:
+        ...
+
+    @abstractmethod
+    def purge(self, older_than: float):
+        """Supprime les jobs terminés depuis plus de older_than secondes."""
+
+
+class MemoryJobStore(JobStore):
+    """File en mémoire, limitée au processus courant (développement, worker unique)."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def create(self, payload: bytes) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id, "status": QUEUED, "payload": payload,
+                "result": None, "error": None, "created_at": now, "updated_at": now,
+            }
+            self._queue.append(job_id)
+        return job_id
+
+    def claim(self):
+        with self._lock:
+            if not self._queue:
+                return None
+            job_id = self._queue.popleft()
+            job = self._jobs[job_id]
+            job["status"] = RUNNING
+            job["updated_at"] = time.time()
+            payload, job["payload"] = job["payload"], None
+            return job_id, payload
+
+    def _finish(self, job_id: str, status: str, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, result=result, error=error, updated_at=time.time())
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, DONE, result=result)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, FAILED, error=error)
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {k: v for k, v in job.items() if k != "payload"} if job else None
+
+    def count_queued(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
+    def purge(self, older_than: float):
+        limit = time.time() - older_than
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job["status"] in (DONE, FAILED) and job["updated_at"] < limit]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """
+    File persistée dans SQLite, partagée entre les workers gunicorn d'une même machine:
+    un job posté sur un worker peut être traité et consulté depuis n'importe quel autre.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS analysis_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload BLOB,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_analysis_jobs_status ON analysis_jobs (status, created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def create(self, payload: bytes) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO analysis_jobs (job_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, payload, now, now)
+        )
+        return job_id
+
+    def claim(self):
+        now = time.time()
+        stale_before = now - config.JOB_STALE_SECONDS
+        conn = self._connect()
+        # Un job "running" resté bloqué (worker tué) est repris après JOB_STALE_SECONDS
+        row = conn.execute(
+            """
+            UPDATE analysis_jobs SET status = ?, updated_at = ?
+            WHERE job_id = (
+                SELECT job_id FROM analysis_jobs
+                WHERE status = ? OR (status = ? AND updated_at < ?)
+                ORDER BY created_at LIMIT 1
+            )
+            RETURNING job_id, payload
+            """,
+            (RUNNING, now, QUEUED, RUNNING, stale_before)
+        ).fetchone()
+        return (row["job_id"], row["payload"]) if row else None
+
+    def complete(self, job_id: str, result: dict):
+        self._connect().execute(
+            "UPDATE analysis_jobs SET status = ?, result = ?, payload = NULL, updated_at = ? WHERE job_id = ?",
+            (DONE, json.dumps(result), time.time(), job_id)
+        )
+
+    def fail(self, job_id: str, error: str):
+        self._connect().execute(
+            "UPDATE analysis_jobs SET status = ?, error = ?, payload = NULL, updated_at = ? WHERE job_id = ?",
+            (FAILED, error, time.time(), job_id)
+        )
+
+    def get(self, job_id: str):
+        row = self._connect().execute(
+            "SELECT job_id, status, result, error, created_at, updated_at FROM analysis_jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def count_queued(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM analysis_jobs WHERE status = ?", (QUEUED,)
+        ).fetchone()[0]
+
+    def purge(self, older_than: float):
+        self._connect().execute(
+            "DELETE FROM analysis_jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - older_than)
+        )
+
+
+def create_store(backend: str = None) -> JobStore:
+    """Instancie le backend configuré (JOB_QUEUE_BACKEND: sqlite ou memory)."""
+    backend = backend or config.JOB_QUEUE_BACKEND
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        return SQLiteJobStore(config.JOB_DB_PATH)
+    raise ValueError(f"Backend de file inconnu: {backend}")
+
+
+class JobQueue:
+    """
+    Pool de workers en arrière-plan qui exécutent handler(payload) pour chaque job.
+
+    Les threads démarrent au premier usage, ce qui évite de les lancer dans un
+    processus qui ne sert jamais de job (build, import).
+    """
+
+    def __init__(self, store: JobStore, handler, workers: int = None, max_queued: int = None):
+        self.store = store
+        self.handler = handler
+        self.workers = workers if workers is not None else config.JOB_WORKERS
+        self.max_queued = max_queued if max_queued is not None else config.JOB_MAX_QUEUED
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"analysis-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info("File d'analyse démarrée: %d workers (%s)", self.workers, type(self.store).__name__)
+
+    def is_full(self) -> bool:
+        return self.store.count_queued() >= self.max_queued
+
+    def submit(self, payload: bytes) -> str:
+        self.start()
+        job_id = self.store.create(payload)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id: str):
+        self.start()
+        return self.store.get(job_id)
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            if time.monotonic() - last_purge > 60:
+                last_purge = time.monotonic()
+                try:
+                    self.store.purge(config.JOB_RESULT_TTL)
+                except Exception as e:
+                    logger.warning("Purge des jobs impossible: %s", e)
+
+            try:
+                claimed = self.store.claim()
+            except Exception as e:
+                logger.error("Erreur lecture file de jobs: %s", e)
+                claimed = None
+
+            if not claimed:
+                # Attente d'un nouveau job (ou polling pour les jobs postés par d'autres processus)
+                self._wakeup.wait(timeout=config.JOB_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = claimed
+            request_id_var.set(job_id)
+            logger.info("Job %s démarré", job_id)
+            try:
+                self.store.complete(job_id, self.handler(payload))
+                logger.info("Job %s terminé", job_id)
+            except Exception as e:
+                logger.error("Job %s en échec: %s", job_id, e)
+                self.store.fail(job_id, str(e))
@@ -0,0 +1,227 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import bulkheads
+import config
+
+logger = logging.getLogger(__name__)
+
+# Champs attendus dans la réponse JSON de l'analyse de CV
+PROFILE_SCHEMA = {
+    "metier_recherche": str,
+    "competences_cles": list,
+}
+OPTIONAL_LIST_FIELDS = ("langages", "outils", "points_forts", "domaines", "formations")
+
+
+class InvalidLLMResponse(Exception):
+    """Réponse du LLM non conforme au schéma attendu."""
+
+
+def validate_profile(result) -> dict:
+    """
+    Vérifie qu'une réponse du LLM respecte le schéma du profil.
+
+    Raises:
+        InvalidLLMResponse si un champ obligatoire manque ou a un mauvais type
+    """
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except json.JSONDecodeError as e:
+            raise InvalidLLMResponse(f"JSON invalide: {e}")
+
+    if not isinstance(result, dict):
+        raise InvalidLLMResponse("La réponse n'est pas un objet JSON")
+
+    for field, expected_type in PROFILE_SCHEMA.items():
+        if not isinstance(result.get(field), expected_type):
+            raise InvalidLLMResponse(f"Champ '{field}' manquant ou invalide")
+
+    if not result["metier_recherche"].strip():
+        raise InvalidLLMResponse("Champ 'metier_recherche' vide")
+
+    for field in OPTIONAL_LIST_FIELDS:
+        if field in result and not isinstance(result[field], list):
+            raise InvalidLLMResponse(f"Champ '{field}' doit être une liste")
+
+    if "niveau_experience" in result and not isinstance(result["niveau_experience"], str):
+        raise InvalidLLMResponse("Champ 'niveau_experience' doit être une chaîne")
+
+    return result
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation grossière du nombre de tokens (~4 caractères par token)."""
+    return len(text) // 4 + 1
+
+
+class ModelStats:
+    """Fenêtre glissante des latences et erreurs d'un modèle."""
+
+    def __init__(self, window: int):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self._samples.append((latency, ok))
+
+    def percentile(self, pct: float):
+        """Latence au percentile demandé (succès uniquement), None si pas assez de mesures."""
+        with self._lock:
+            latencies = sorted(lat for lat, ok in self._samples if ok)
+        if len(latencies) < config.LLM_MIN_SAMPLES:
+            return None
+        index = min(int(pct * len(latencies)), len(latencies) - 1)
+        return latencies[index]
+
+    def __len__(self):
+        return len(self._samples)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def snapshot(self) -> dict:
+        return {
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "error_rate": round(self.error_rate(), 3),
+            "samples": len(self._samples),
+        }
+
+
+class ModelRouter:
+    """
+    Choisit le modèle LLM selon la taille de l'entrée et l'état récent de chaque modèle,
+    et lance une requête de couverture (hedge) vers un modèle plus rapide quand
+    la première dépasse le percentile de latence configuré.
+
+    Les modèles sont ordonnés du plus rapide au plus précis.
+    """
+
+    def __init__(self, models: list, primary: str, executor=None, max_workers: int = 8):
+        self.models = models
+        self.primary = primary if primary in models else models[-1]
+        self.stats = {m: ModelStats(config.LLM_STATS_WINDOW) for m in models}
+        # Cloison LLM en production: un Groq lent ne remplit que ses propres threads
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+
+    def _is_healthy(self, model: str) -> bool:
+        stats = self.stats[model]
+        return len(stats) < config.LLM_MIN_SAMPLES or stats.error_rate() < config.LLM_MAX_ERROR_RATE
+
+    def fastest_model(self, exclude: str = None):
+        """Modèle sain le plus rapide (p50 mesuré, sinon ordre de configuration)."""
+        candidates = [m for m in self.models if m != exclude and self._is_healthy(m)]
+        if not candidates:
+            return None
+
+        def speed(model):
+            p50 = self.stats[model].percentile(0.5)
+            return (p50 if p50 is not None else float("inf"), self.models.index(model))
+
+        return min(candidates, key=speed)
+
+    def choose_model(self, input_tokens: int) -> str:
+        """Sélectionne le modèle principal pour une entrée de input_tokens tokens."""
+        # Les CV courts n'ont pas besoin du plus gros modèle
+        if input_tokens <= config.LLM_SMALL_INPUT_TOKENS:
+            fast = self.fastest_model()
+            if fast:
+                return fast
+
+        if self._is_healthy(self.primary):
+            return self.primary
+
+        logger.warning("Modèle %s dégradé (erreurs: %.0f%%), bascule", self.primary, self.stats[self.primary].error_rate() * 100)
+        return self.fastest_model(exclude=self.primary) or self.primary
+
+    def _timed_call(self, call, model: str):
+        start = time.monotonic()
+        try:
+            result = validate_profile(call(model))
+        except Exception:
+            self.stats[model].record(time.monotonic() - start, ok=False)
+            raise
+        self.stats[model].record(time.monotonic() - start, ok=True)
+        return result
+
+    def _submit(self, call, model: str):
+        # Chaque requête garde le contexte de l'appelant (identifiant de requête des logs)
+        return self._executor.submit(contextvars.copy_context().run, self._timed_call, call, model)
+
+    def hedge_delay(self, model: str) -> float:
+        observed = self.stats[model].percentile(config.LLM_HEDGE_PERCENTILE)
+        return observed if observed is not None else config.LLM_HEDGE_DEFAULT_DELAY
+
+    def run(self, call, input_tokens: int, timeout: float = None) -> tuple:
+        """
+        Exécute call(model) avec routage et hedging.
+
+        Args:
+            call: Fonction prenant un nom de modèle et retournant la réponse JSON (dict ou str)
+            input_tokens: Taille estimée de l'entrée
+            timeout: Attente totale maximale en secondes (hedge compris), None pour illimitée
+
+        Returns:
+            (profil validé, modèle ayant répondu)
+
+        Raises:
+            La dernière erreur rencontrée si aucune réponse valide n'a été obtenue,
+            TimeoutError si le délai total est écoulé
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        model = self.choose_model(input_tokens)
+        pending = {self._submit(call, model): model}
+        hedged = False
+        last_error = None
+
+        while pending:
+            wait_for = None if hedged else self.hedge_delay(model)
+            if expires_at is not None:
+                remaining = expires_at - time.monotonic()
+                if remaining <= 0:
+                    # Les appels en cours se terminent en arrière-plan, leur résultat est ignoré;
+                    # ceux encore en file ne partent pas
+                    for future in pending:
+                        future.cancel()
+                    raise TimeoutError(f"Aucune réponse LLM en {timeout:.1f}s")
+                wait_for = remaining if wait_for is None else min(wait_for, remaining)
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                answered = pending.pop(future)
+                try:
+                    return future.result(), answered
+                except Exception as e:
+                    logger.warning("Réponse rejetée du modèle %s: %s", answered, e)
+                    last_error = e
+
+            # Hedge si le modèle principal dépasse son percentile de latence ou a échoué
+            if not hedged and (not done or not pending):
+                hedged = True
+                hedge_model = self.fastest_model(exclude=model)
+                if hedge_model:
+                    logger.info("Hedge LLM: requête parallèle vers %s (modèle principal: %s)", hedge_model, model)
+                    try:
+                        pending[self._submit(call, hedge_model)] = hedge_model
+                    except bulkheads.BulkheadFull as e:
+                        # Pas de couverture quand la cloison est pleine: on attend le premier appel
+                        logger.warning("Hedge LLM abandonné: %s", e)
+                        last_error = last_error or e
+
+        raise last_error
+
+    def snapshot(self) -> dict:
+        return {m: self.stats[m].snapshot() for m in self.models}
+
+
+router = ModelRouter(config.GROQ_MODELS, config.GROQ_PRIMARY_MODEL, executor=bulkheads.LLM)
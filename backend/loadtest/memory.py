@@ -0,0 +1,149 @@
+"""
+Rejeu de requêtes enregistrées avec mesure mémoire par endpoint (tracemalloc),
+comparée aux budgets de memory_budgets.json. Hors ligne: les bouchons France
+Travail / Groq remplacent les API. Code de sortie 1 si un budget est dépassé.
+
+    cd backend
+    python -m loadtest.memory --repeat 20
+
+Pic: allocation maximale pendant une requête (étapes comprises).
+Retenu: octets encore alloués après la requête et un gc.collect(), en moyenne
+sur les rejeux (hors premier passage, qui remplit caches et imports).
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from loadtest.run import make_cv_pdf
+from loadtest.stubs import Behaviour, add_behaviour_arguments, start_stub_server, stub_environment
+
+LOADTEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_recorded_requests(path: str) -> list:
+    """Une requête JSON par ligne: {"method", "path", "cv_pages"?} (cv_pages: upload d'un CV généré)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() and not line.startswith("#")]
+
+
+def replay(client, recorded: list, repeat: int, cv_files: dict) -> dict:
+    """Rejoue les requêtes et mesure la mémoire retenue par endpoint; retourne {endpoint: [octets retenus]}."""
+    import memprof
+
+    retained = {}
+    for iteration in range(repeat + 1):
+        if iteration == 1:
+            # Premier passage: imports paresseux, caches, pools de connexions
+            memprof.stats.reset()
+            retained.clear()
+        for request in recorded:
+            gc.collect()
+            before, _ = tracemalloc.get_traced_memory()
+            files = None
+            if request.get("cv_pages"):
+                files = {"file": ("cv.pdf", cv_files[request["cv_pages"]], "application/pdf")}
+            response = client.request(request["method"], request["path"], files=files)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{request['method']} {request['path']}: HTTP {response.status_code}")
+            del response
+            gc.collect()
+            after, _ = tracemalloc.get_traced_memory()
+            endpoint = request.get("endpoint") or f"{request['method']} {request['path']}"
+            retained.setdefault(endpoint, []).append(after - before)
+    return retained
+
+
+def check_budgets(endpoints: dict, retained: dict, budgets: dict) -> list:
+    """Lignes du rapport (endpoint, pic, retenu, budgets, verdict)."""
+    rows = []
+    for endpoint, budget in budgets.items():
+        measured = endpoints.get(endpoint)
+        if measured is None:
+            rows.append((endpoint, None, None, budget, "non mesuré"))
+            continue
+        samples = retained.get(endpoint, [0])
+        retained_kb = sum(samples) / len(samples) / 1024
+        over = []
+        if measured["peak_max_kb"] > budget["peak_kb"]:
+            over.append("pic")
+        if retained_kb > budget["retained_kb"]:
+            over.append("retenu")
+        rows.append((endpoint, measured["peak_max_kb"], retained_kb, budget, "DÉPASSÉ: " + ", ".join(over) if over else "ok"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Budgets mémoire par endpoint (rejeu hors ligne)")
+    parser.add_argument("--requests", default=os.path.join(LOADTEST_DIR, "recorded_requests.jsonl"))
+    parser.add_argument("--budgets", default=os.path.join(LOADTEST_DIR, "memory_budgets.json"))
+    parser.add_argument("--repeat", type=int, default=10, help="Rejeux mesurés de la séquence")
+    parser.add_argument("--stub-port", type=int, default=8901)
+    parser.add_argument("--top", type=int, default=10, help="Sites d'allocation affichés")
+    parser.add_argument("--no-cache", action="store_true", help="Désactive les caches de recherche et d'analyse")
+    parser.add_argument("--json", help="Écrit le rapport JSON dans ce fichier")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    # L'environnement doit être prêt avant le premier import de config (lu à l'import)
+    workdir = tempfile.mkdtemp(prefix="easyjobfind-memory-")
+    os.environ.update({
+        **stub_environment(args.stub_port),
+        "MEMORY_PROFILING": "true",
+        "CACHE_DIR": workdir,
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "ALERTS_DB_PATH": os.path.join(workdir, "alerts.sqlite3"),
+        "TRACE_EXPORT_PATH": os.path.join(workdir, "traces.jsonl"),
+        "TRACE_SAMPLE_RATE": "0",  # Traces gardées en mémoire: mesures de mémoire retenue non reproductibles
+        "WARMUP_ENABLED": "false",
+    })
+    if args.no_cache:
+        os.environ.update({"CACHE_FT_SEARCH_TTL": "0", "CACHE_CV_ANALYSIS_TTL": "0"})
+    stub_server = start_stub_server(
+        args.stub_port, Behaviour.parse(args.ft_auth), Behaviour.parse(args.ft_search), Behaviour.parse(args.groq)
+    )
+
+    from fastapi.testclient import TestClient
+    import main as api
+    import memprof
+
+    recorded = load_recorded_requests(args.requests)
+    with open(args.budgets, encoding="utf-8") as f:
+        budgets = json.load(f)
+    cv_files = {r["cv_pages"]: make_cv_pdf(r["cv_pages"]) for r in recorded if r.get("cv_pages")}
+
+    try:
+        with TestClient(api.app) as client:
+            retained = replay(client, recorded, args.repeat, cv_files)
+    finally:
+        stub_server.shutdown()
+
+    endpoints = memprof.stats.snapshot()
+    rows = check_budgets(endpoints, retained, budgets)
+
+    print(f"{'endpoint':<28}{'pic (Ko)':>12}{'budget':>10}{'retenu (Ko)':>14}{'budget':>10}  verdict")
+    for endpoint, peak, kept, budget, verdict in rows:
+        peak_txt = f"{peak:.0f}" if peak is not None else "-"
+        kept_txt = f"{kept:.1f}" if kept is not None else "-"
+        print(f"{endpoint:<28}{peak_txt:>12}{budget['peak_kb']:>10}{kept_txt:>14}{budget['retained_kb']:>10}  {verdict}")
+    for endpoint, measured in endpoints.items():
+        stages = ", ".join(f"{name} {s['peak_max_kb']:.0f} Ko" for name, s in measured["stages"].items())
+        print(f"  {endpoint}: {stages or 'aucune étape'}")
+
+    top = memprof.top_allocations(args.top)
+    print("\nPrincipaux sites d'allocation:")
+    for stat in top.get("top", []):
+        print(f"  {stat['size_kb']:>9.1f} Ko  {stat['site']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"endpoints": endpoints, "budgets": budgets, "rows": rows, "top": top}, f, indent=2, default=str)
+
+    sys.exit(1 if any(row[4] != "ok" for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Test de charge de bout en bout, entièrement hors ligne: démarre les bouchons
+France Travail / Groq, lance la vraie API sous `gunicorn -w N`, envoie une
+charge scriptée et affiche débit, p50/p95/p99 et taux d'erreur par endpoint.
+
+    cd backend
+    python -m loadtest.run --workers 4 --concurrency 16 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import fitz  # PyMuPDF
+import requests
+
+from loadtest.stubs import Behaviour, add_behaviour_arguments, start_stub_server, stub_environment
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEYWORDS = ["développeur", "python", "vendeur", "data", "serveur", "cuisinier", "logistique", "designer", "comptable", "infirmier"]
+
+
+def make_cv_pdf(pages: int = 2) -> bytes:
+    """Génère un CV PDF synthétique."""
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(
+            fitz.Rect(50, 50, 550, 800),
+            f"Curriculum vitae - page {page_num + 1}\n"
+            + "Développeur Python / React, 3 ans d'expérience. FastAPI, Docker, PostgreSQL, AWS, Git. " * 20,
+            fontsize=9
+        )
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(pct * len(sorted_values)), len(sorted_values) - 1)]
+
+
+class LoadGenerator:
+    """
+    Charge en boucle fermée: `concurrency` utilisateurs virtuels enchaînent
+    des requêtes tirées selon les poids du scénario.
+    """
+
+    def __init__(self, base_url: str, scenario: dict, concurrency: int, duration: float, cv_pdf: bytes):
+        self.base_url = base_url
+        self.scenario = scenario
+        self.concurrency = concurrency
+        self.duration = duration
+        self.cv_pdf = cv_pdf
+        self.results = defaultdict(list)  # endpoint -> [(status, latence)]
+        self._lock = threading.Lock()
+
+    def _request(self, session: requests.Session, endpoint: str):
+        if endpoint == "analyze":
+            return session.post(f"{self.base_url}/analyze", files={"file": ("cv.pdf", self.cv_pdf, "application/pdf")}, timeout=90)
+        if endpoint == "jobs":
+            return session.get(f"{self.base_url}/jobs/{random.choice(KEYWORDS)}", timeout=60)
+        return session.get(f"{self.base_url}/health", timeout=10)
+
+    def _user(self, stop_at: float):
+        session = requests.Session()
+        endpoints = list(self.scenario)
+        weights = [self.scenario[e] for e in endpoints]
+        while time.monotonic() < stop_at:
+            endpoint = random.choices(endpoints, weights)[0]
+            start = time.monotonic()
+            try:
+                status = self._request(session, endpoint).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            with self._lock:
+                self.results[endpoint].append((status, time.monotonic() - start))
+
+    def run(self) -> dict:
+        stop_at = time.monotonic() + self.duration
+        threads = [threading.Thread(target=self._user, args=(stop_at,), daemon=True) for _ in range(self.concurrency)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(time.monotonic() - started)
+
+    def report(self, elapsed: float) -> dict:
+        report = {}
+        for endpoint, samples in sorted(self.results.items()):
+            latencies = sorted(latency for _, latency in samples)
+            statuses = defaultdict(int)
+            for status, _ in samples:
+                statuses[str(status)] += 1
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            report[endpoint] = {
+                "requests": len(samples),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+                "statuses": dict(statuses),
+            }
+        return report
+
+
+def start_api(port: int, workers: int, env: dict) -> subprocess.Popen:
+    command = [
+        sys.executable, "-m", "gunicorn", "main:app",
+        "-w", str(workers),
+        "-k", "uvicorn.workers.UvicornWorker",
+        "--bind", f"127.0.0.1:{port}",
+        "--timeout", "60",
+    ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env, start_new_session=True)
+
+
+def wait_until_healthy(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"L'API ne répond pas sur {base_url}")
+
+
+def print_report(report: dict):
+    header = f"{'endpoint':<10} {'req':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erreurs':>8}  statuts"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in report.items():
+        print(
+            f"{endpoint:<10} {row['requests']:>7} {row['throughput_rps']:>8} {row['p50_ms']:>9} "
+            f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['error_rate']:>8.2%}  {row['statuses']}"
+        )
+
+
+def parse_scenario(spec: str) -> dict:
+    """"analyze=1,jobs=4,health=1" -> {"analyze": 1.0, "jobs": 4.0, "health": 1.0}"""
+    scenario = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        scenario[name.strip()] = float(weight or 1)
+    return scenario
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge EasyJobFind (hors ligne)")
+    parser.add_argument("--workers", type=int, default=4, help="Workers gunicorn")
+    parser.add_argument("--concurrency", type=int, default=16, help="Utilisateurs virtuels")
+    parser.add_argument("--duration", type=float, default=30, help="Durée en secondes")
+    parser.add_argument("--scenario", default="analyze=1,jobs=4,health=1", help="Poids des endpoints")
+    parser.add_argument("--api-port", type=int, default=8800)
+    parser.add_argument("--stub-port", type=int, default=8900)
+    parser.add_argument("--no-cache", action="store_true", help="Désactive les caches de recherche et d'analyse")
+    parser.add_argument("--json", help="Écrit le rapport JSON dans ce fichier")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    stub_server = start_stub_server(
+        args.stub_port, Behaviour.parse(args.ft_auth), Behaviour.parse(args.ft_search), Behaviour.parse(args.groq)
+    )
+
+    workdir = tempfile.mkdtemp(prefix="easyjobfind-loadtest-")
+    env = {
+        **os.environ,
+        **stub_environment(args.stub_port),
+        "CACHE_DIR": workdir,
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.sqlite3"),
+        "ALERTS_DB_PATH": os.path.join(workdir, "alerts.sqlite3"),
+        "TRACE_EXPORT_PATH": os.path.join(workdir, "traces.jsonl"),
+    }
+    if args.no_cache:
+        env.update({"CACHE_FT_SEARCH_TTL": "0", "CACHE_CV_ANALYSIS_TTL": "0"})
+
+    api = start_api(args.api_port, args.workers, env)
+    base_url = f"http://127.0.0.1:{args.api_port}"
+    try:
+        wait_until_healthy(base_url)
+        print(f"API prête ({args.workers} workers), charge: {args.concurrency} utilisateurs pendant {args.duration:.0f}s")
+        report = LoadGenerator(base_url, parse_scenario(args.scenario), args.concurrency, args.duration, make_cv_pdf()).run()
+    finally:
+        os.killpg(api.pid, signal.SIGTERM)
+        api.wait(timeout=30)
+        stub_server.shutdown()
+
+    print_report(report)
+    print(f"Traces des requêtes lentes ou échantillonnées (OTLP/JSON): {env['TRACE_EXPORT_PATH']}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
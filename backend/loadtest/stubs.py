@@ -0,0 +1,251 @@
+"""
+Bouchons locaux de France Travail (OAuth + /v2/offres/search) et de Groq
+(chat completions), avec latence, taux d'erreur et réponses partielles
+configurables. Aucun appel réseau sortant.
+
+Lancement seul:
+    python -m loadtest.stubs --port 8900 --ft-search "median=150,sigma=0.6,errors=0.02"
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+AUTH_PATH = "/connexion/oauth2/access_token"
+SEARCH_PATH = "/partenaire/offresdemploi/v2/offres/search"
+GROQ_PATH = "/openai/v1/chat/completions"
+GROQ_MODELS_PATH = "/openai/v1/models"
+
+
+class Behaviour:
+    """
+    Comportement d'un bouchon: latence log-normale (médiane en ms, sigma),
+    taux d'erreurs 500, de réponses partielles 206 et de réponses vides 204.
+    """
+
+    def __init__(self, median: float = 50, sigma: float = 0.5, errors: float = 0.0,
+                 partial: float = 0.0, empty: float = 0.0):
+        self.median = median
+        self.sigma = sigma
+        self.errors = errors
+        self.partial = partial
+        self.empty = empty
+
+    @classmethod
+    def parse(cls, spec: str) -> "Behaviour":
+        """Construit un comportement depuis "median=150,sigma=0.6,errors=0.02,partial=0.1"."""
+        options = {}
+        for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+            name, _, value = item.partition("=")
+            options[name.strip()] = float(value)
+        return cls(**options)
+
+    def sleep(self):
+        delay_ms = self.median * math.exp(random.gauss(0, self.sigma)) if self.sigma else self.median
+        time.sleep(delay_ms / 1000)
+
+    def outcome(self) -> str:
+        roll = random.random()
+        if roll < self.errors:
+            return "error"
+        if roll < self.errors + self.empty:
+            return "empty"
+        if roll < self.errors + self.empty + self.partial:
+            return "partial"
+        return "ok"
+
+
+def to_france_travail_format(job: dict) -> dict:
+    """Convertit une offre du catalogue local au format brut de l'API France Travail."""
+    return {
+        "id": f"{job['id']}_{uuid.uuid4().hex[:6]}",
+        "intitule": job["intitule"],
+        "description": job["description"] * 3,
+        "entreprise": job["entreprise"],
+        "lieuTravail": {"libelle": job["lieuTravail"]["libelle"]},
+        "salaire": {"libelle": job.get("salaire")},
+        "typeContrat": job.get("contrat", "CDI")[:3].upper(),
+        "typeContratLibelle": job.get("contrat"),
+        "experienceLibelle": {"junior": "Débutant accepté", "intermediaire": "2 ans", "senior": "5 ans"}.get(job.get("niveau"), ""),
+        "competences": [{"libelle": tag} for tag in job.get("tags", [])],
+    }
+
+
+class StubState:
+    def __init__(self, auth: Behaviour, search: Behaviour, groq: Behaviour):
+        self.auth = auth
+        self.search = search
+        self.groq = groq
+        # Import tardif: l'appelant peut configurer l'environnement (stub_environment) avant config
+        import services
+        self.catalogue = services.get_all_mock_jobs()
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+def make_handler(state: StubState):
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload=None, headers: dict = None):
+            body = json.dumps(payload).encode() if payload is not None else b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self._read_body()
+            if path == AUTH_PATH:
+                self._auth()
+            elif path == GROQ_PATH:
+                self._groq(body)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == SEARCH_PATH:
+                self._search(parse_qs(url.query))
+            elif url.path == GROQ_MODELS_PATH:
+                self._send_json(200, {"object": "list", "data": [{"id": "stub-model", "object": "model", "owned_by": "stub", "created": 0}]})
+            elif url.path == "/stats":
+                self._send_json(200, state.counters)
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _auth(self):
+            state.auth.sleep()
+            outcome = state.auth.outcome()
+            state.count(f"auth_{outcome}")
+            if outcome == "error":
+                self._send_json(500, {"error": "server_error"})
+                return
+            self._send_json(200, {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 1499})
+
+        def _search(self, params: dict):
+            state.search.sleep()
+            outcome = state.search.outcome()
+            state.count(f"search_{outcome}")
+            if outcome == "error":
+                self._send_json(500, {"message": "Erreur technique"})
+                return
+
+            keyword = (params.get("motsCles") or [""])[0].lower()
+            first, _, last = (params.get("range") or ["0-19"])[0].partition("-")
+            wanted = int(last) - int(first) + 1
+            matches = [
+                job for job in state.catalogue
+                if keyword in f"{job['intitule']} {job['description']} {' '.join(job.get('tags', []))}".lower()
+            ]
+            if outcome == "empty" or not matches:
+                self._send_json(204)
+                return
+
+            resultats = [to_france_travail_format(random.choice(matches)) for _ in range(wanted)]
+            if outcome == "partial":
+                resultats = resultats[:max(1, wanted // 3)]
+            status = 206 if outcome == "partial" else 200
+            self._send_json(status, {"resultats": resultats}, {"Content-Range": f"offres {first}-{len(resultats) - 1}/{len(resultats)}"})
+
+        def _groq(self, body: bytes):
+            state.groq.sleep()
+            outcome = state.groq.outcome()
+            state.count(f"groq_{outcome}")
+            if outcome == "error":
+                self._send_json(500, {"error": {"message": "stub error", "type": "internal_server_error"}})
+                return
+
+            request = json.loads(body or b"{}")
+            job = random.choice(state.catalogue)
+            profile = {
+                "metier_recherche": job["intitule"],
+                "competences_cles": job.get("tags", [])[:5],
+                "langages": [],
+                "outils": [],
+                "points_forts": ["Rigueur", "Autonomie", "Esprit d'équipe"],
+                "niveau_experience": job.get("niveau", "junior"),
+                "domaines": [],
+                "formations": [],
+            }
+            # Réponse tronquée: JSON invalide, rejeté par la validation du routeur
+            content = json.dumps(profile, ensure_ascii=False)
+            if outcome == "partial":
+                content = content[:len(content) // 2]
+            self._send_json(200, {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 1000, "completion_tokens": 150, "total_tokens": 1150},
+            })
+
+    return StubHandler
+
+
+def start_stub_server(port: int, auth: Behaviour, search: Behaviour, groq: Behaviour):
+    """Démarre le serveur de bouchons dans un thread; retourne le serveur (server.shutdown() pour l'arrêter)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(StubState(auth, search, groq)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server
+
+
+def stub_environment(port: int) -> dict:
+    """Variables d'environnement pointant l'API vers les bouchons."""
+    base = f"http://127.0.0.1:{port}"
+    return {
+        "FT_AUTH_URL": f"{base}{AUTH_PATH}?realm=%2Fpartenaire",
+        "FT_SEARCH_URL": f"{base}/partenaire/offresdemploi",
+        "GROQ_BASE_URL": base,
+        "GROQ_API_KEY": "stub-groq-key",
+        "FT_CLIENT_ID": "stub-client-id",
+        "FT_CLIENT_SECRET": "stub-client-secret",
+    }
+
+
+def add_behaviour_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--ft-auth", default="median=30,sigma=0.3", help="Comportement de l'OAuth France Travail")
+    parser.add_argument("--ft-search", default="median=250,sigma=0.6,errors=0.02,partial=0.1,empty=0.05",
+                        help="Comportement de /v2/offres/search")
+    parser.add_argument("--groq", default="median=1500,sigma=0.5,errors=0.02,partial=0.02",
+                        help="Comportement des chat completions Groq")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bouchons France Travail / Groq")
+    parser.add_argument("--port", type=int, default=8900)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, Behaviour.parse(args.ft_auth), Behaviour.parse(args.ft_search), Behaviour.parse(args.groq))
+    print(f"Bouchons sur http://127.0.0.1:{args.port}")
+    for name, value in stub_environment(args.port).items():
+        print(f"  export {name}='{value}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
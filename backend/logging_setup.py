@@ -0,0 +1,161 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+import uuid
+import config
+
+# Identifiant de la requête en cours, propagé aux threads via contextvars
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+# À passer en extra= des logs verbeux (par offre, listes complètes) pour les échantillonner
+VERBOSE = {"sampled": True}
+
+# Attributs standards d'un LogRecord, exclus des champs structurés
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id", "sampled"}
+
+_listener = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Ajoute l'identifiant de requête au record (dans le thread appelant)."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Ne garde qu'une fraction (LOG_VERBOSE_SAMPLE_RATE) des logs marqués VERBOSE."""
+
+    def filter(self, record):
+        if getattr(record, "sampled", False) and record.levelno < logging.WARNING:
+            return random.random() < config.LOG_VERBOSE_SAMPLE_RATE
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Une ligne JSON par record, avec les champs passés en extra=."""
+
+    def format(self, record):
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - [%(request_id)s] %(name)s - %(message)s")
+
+
+_PRIMITIVES = (str, int, float, bool, type(None))
+
+
+def _freeze(value):
+    """Copie figée d'un argument de log: les conteneurs sont copiés, les autres valeurs gardées telles quelles."""
+    if isinstance(value, _PRIMITIVES):
+        return value
+    if isinstance(value, dict):
+        return {key: _freeze(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_freeze(item) for item in value]
+    if isinstance(value, tuple) and not hasattr(value, "_fields"):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, set):
+        return set(value)
+    return value
+
+
+class _PreparedQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler qui conserve args et extra: le message n'est mis en forme que
+    dans le thread d'écriture, jamais dans la boucle d'événements. Args et
+    extra sont figés à l'émission: une liste modifiée ensuite par l'appelant
+    n'altère pas le log.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            # Les tracebacks ne sont pas sérialisables tels quels
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if isinstance(record.args, dict):
+            record.args = _freeze(record.args)
+        elif record.args:
+            record.args = tuple(_freeze(arg) for arg in record.args)
+        for key, value in list(record.__dict__.items()):
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                record.__dict__[key] = _freeze(value)
+        return record
+
+
+def configure_logging():
+    """
+    Installe le pipeline de logs: QueueHandler sur le logger racine, écriture
+    sur stdout par un thread dédié (QueueListener). Idempotent.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _PreparedQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    queue_handler.addFilter(SamplingFilter())
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter() if config.LOG_FORMAT == "json" else TextFormatter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """
+    Attribue à chaque requête un identifiant (repris de X-Request-ID s'il est fourni),
+    visible dans tous les logs émis pendant son traitement et renvoyé en en-tête.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming[:64] if incoming else uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message["headers"]) + [(b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
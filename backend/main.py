@@ -1,33 +1,92 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Depends, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
-import fitz  # PyMuPDF
+import config
 import services
+import uploads
+import admission
+import bulkheads
+import breakers
+import jobs
+import responses
+import profiling
+import debug_auth
+import logging_setup
+import warmup
+import memprof
+import tracing
+import facets
+import indexes
+from deadline import Deadline
+import asyncio
 import logging
+import time
 
-# Configuration logging
-logging.basicConfig(level=logging.INFO)
+# Configuration logging: file d'attente + thread d'écriture, JSON structuré
+logging_setup.configure_logging()
 logger = logging.getLogger(__name__)
 
+# tracemalloc démarré au plus tôt si MEMORY_PROFILING est actif
+memprof.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Préchauffage en arrière-plan: /health répond tout de suite, /ready une fois le worker chaud
+    warmup.start()
+    # Index reconstruits à chaud quand leur source change (ROME, flux, corpus local)
+    indexes.start_watcher()
+    yield
+
 app = FastAPI(
     title="EasyJobFind API",
     description="API pour l'analyse de CV et la recherche d'emploi",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS pour le frontend (dev + production)
 import os
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:3000").split(",")
 
+# Admission de /analyze avant la lecture du corps: un client rejeté (503) n'envoie pas son PDF.
+# Ajouté avant CORSMiddleware, il s'exécute à l'intérieur: le 503 porte les en-têtes CORS
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    routes={("POST", "/analyze"): (admission.ANALYZE, config.ANALYZE_SLA_SECONDS)},
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # En production, remplacer par votre domaine Vercel
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Stale"],
 )
 
+# Traces par requête (spans OTLP/JSON); ajouté avant RequestIdMiddleware, il s'exécute
+# à l'intérieur de celui-ci et reprend son identifiant de requête
+app.add_middleware(tracing.TracingMiddleware)
+
+# Identifiant de requête (X-Request-ID) propagé dans tous les logs
+app.add_middleware(logging_setup.RequestIdMiddleware)
+
+# Rejet anticipé (413) des uploads trop volumineux
+app.add_middleware(uploads.UploadSizeLimitMiddleware)
+
+# Compression brotli/gzip des réponses au-delà de COMPRESSION_MIN_BYTES
+app.add_middleware(responses.CompressionMiddleware)
+
+# Profilage par requête (en-tête X-Profile authentifié ou PROFILE_SAMPLE_RATE)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# Allocation mémoire par endpoint et par étape (MEMORY_PROFILING)
+app.add_middleware(memprof.MemoryProfilingMiddleware)
+
 # Modèles Pydantic
 class ProfileResponse(BaseModel):
     metier_recherche: str
@@ -44,10 +103,37 @@ class JobOffer(BaseModel):
     url: str
     salaire: Optional[str] = None
     contrat: Optional[str] = None
+    matching_score: Optional[int] = None
+    salaire_min: Optional[float] = None
+    salaire_max: Optional[float] = None
+    salaire_periode: Optional[str] = None
+    contrat_type: Optional[str] = None
+    departement: Optional[str] = None
+    stale: Optional[bool] = None  # True: derniers résultats connus, France Travail indisponible
 
 class AnalyzeResponse(BaseModel):
     profile: ProfileResponse
     jobs: List[JobOffer]
+    stale: bool = False
+
+class AnalyzeJobStatus(BaseModel):
+    job_id: str
+    status: str
+    result: Optional[AnalyzeResponse] = None
+    error: Optional[str] = None
+
+class AlertProfile(BaseModel):
+    metier_recherche: str
+    competences_cles: List[str] = []
+    niveau_experience: Optional[str] = "junior"
+
+class AlertProfileCreated(BaseModel):
+    profile_id: str
+
+class Alert(BaseModel):
+    offer: JobOffer
+    score: int
+    created_at: float
 
 @app.get("/")
 async def root():
@@ -57,6 +143,17 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Prêt à recevoir du trafic: 200 une fois le préchauffage terminé, 503 avant
+    """
+    warmup.start()  # Plateformes sans événements lifespan: le premier appel à /ready le déclenche
+    snapshot = warmup.state.snapshot()
+    if not snapshot["ready"]:
+        return JSONResponse({"status": "warming_up", **snapshot}, status_code=503, headers={"Retry-After": "1"})
+    return {"status": "ready", **snapshot}
+
 @app.get("/debug")
 async def debug_check():
     """Vérifie que les dépendances et variables d'environnement sont OK"""
@@ -74,90 +171,348 @@ async def debug_check():
     except Exception as e:
         checks["pymupdf_available"] = False
         checks["pymupdf_error"] = str(e)
+    import llm_router
+    checks["llm_models"] = llm_router.router.snapshot()
+    checks["admission"] = {c.name: c.snapshot() for c in (admission.ANALYZE, admission.SEARCH)}
+    checks["bulkheads"] = bulkheads.snapshot()
+    checks["breakers"] = breakers.snapshot()
+    checks["traces"] = tracing.exporter.snapshot()
+    from cache import cache
+    checks["cache"] = cache.snapshot()
     return checks
 
-@app.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_cv(file: UploadFile = File(...)):
+@app.get("/debug/profile", dependencies=[Depends(debug_auth.require_debug_token)])
+async def profile_worker(seconds: int = Query(10, ge=1), format: str = Query("collapsed", pattern="^(collapsed|json)$")):
     """
-    Analyse un CV (PDF) et retourne le profil détecté + les offres correspondantes
+    Profile tout le worker pendant N secondes (format collapsed pour flamegraph)
+    """
+    seconds = min(seconds, config.PROFILE_MAX_SECONDS)
+    # Même plafond que les profils de requêtes: les échantillonneurs ne s'empilent pas
+    with profiling.slot() as acquired:
+        if not acquired:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Déjà {config.PROFILE_MAX_CONCURRENT} profilage(s) en cours sur ce worker",
+                headers={"Retry-After": str(config.PROFILE_MAX_SECONDS)}
+            )
+        sampler = profiling.StackSampler().start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+    
+    if format == "json":
+        return sampler.summary()
+    return PlainTextResponse(sampler.collapsed())
+
+@app.get("/debug/profiles", dependencies=[Depends(debug_auth.require_debug_token)])
+async def list_profiles():
+    """
+    Liste les profils de requêtes capturés par ce worker
+    """
+    return profiling.profiles.list()
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(debug_auth.require_debug_token)])
+async def download_profile(profile_id: str, format: str = Query("collapsed", pattern="^(collapsed|json)$")):
+    """
+    Télécharge un profil de requête (collapsed pour flamegraph, ou résumé JSON)
+    """
+    entry = profiling.profiles.get(profile_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Profil introuvable sur ce worker")
+    
+    if format == "json":
+        return {**entry["meta"], **entry["sampler"].summary()}
+    return PlainTextResponse(
+        entry["sampler"].collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
+@app.get("/debug/memory", dependencies=[Depends(debug_auth.require_debug_token)])
+async def memory_report(top: int = Query(20, ge=1, le=200), group: str = Query("lineno", pattern="^(lineno|filename|traceback)$")):
+    """
+    Mémoire du worker: pic et allocation par endpoint et par étape, principaux sites d'allocation
+    """
+    report = await run_in_threadpool(memprof.top_allocations, top, group)
+    return {**report, "endpoints": memprof.stats.snapshot()}
+
+@app.delete("/debug/memory", dependencies=[Depends(debug_auth.require_debug_token)])
+async def reset_memory_stats():
+    """
+    Remet à zéro les statistiques mémoire par endpoint
+    """
+    memprof.stats.reset()
+    return {"status": "reset"}
+
+@app.get("/debug/traces/{request_id}", dependencies=[Depends(debug_auth.require_debug_token)])
+async def get_trace(request_id: str, format: str = Query("otlp", pattern="^(otlp|waterfall)$")):
+    """
+    Trace d'une requête (X-Request-ID) exportée: OTLP/JSON, ou cascade des spans en ms
+    """
+    otlp = await run_in_threadpool(tracing.exporter.find, request_id)
+    if otlp is None:
+        raise HTTPException(status_code=404, detail="Trace introuvable (requête non échantillonnée ou export tourné)")
+    if format == "waterfall":
+        return {"request_id": request_id, "spans": tracing.waterfall(otlp)}
+    return otlp
+
+@app.get("/debug/indexes", dependencies=[Depends(debug_auth.require_debug_token)])
+async def index_report():
+    """
+    Générations des index du worker: numéro, date et durée de construction, requêtes en cours, anciennes générations encore tenues
+    """
+    return {name: index.snapshot() for name, index in indexes.registry.items()}
+
+@app.post("/debug/indexes/{name}/refresh", dependencies=[Depends(debug_auth.require_debug_token)])
+async def refresh_index(name: str):
+    """
+    Reconstruit un index sur ce worker et publie la nouvelle génération si elle est valide
+    """
+    index = indexes.registry.get(name)
+    if index is None:
+        raise HTTPException(status_code=404, detail="Index inconnu")
+    published = await run_in_threadpool(index.refresh)
+    return {"published": published, **index.snapshot()}
+
+def to_job_offer(j: dict) -> JobOffer:
+    """Convertit une offre normalisée en modèle de réponse."""
+    return JobOffer(
+        id=j['id'],
+        intitule=j['intitule'],
+        entreprise=j['entreprise'],
+        lieuTravail=j['lieuTravail'],
+        description=j['description'],
+        url=j['url'],
+        salaire=j.get('salaire'),
+        contrat=j.get('contrat'),
+        matching_score=j.get('matching_score'),
+        salaire_min=j.get('salaire_min'),
+        salaire_max=j.get('salaire_max'),
+        salaire_periode=j.get('salaire_periode'),
+        contrat_type=j.get('contrat_type'),
+        departement=j.get('departement'),
+        stale=j.get('stale')
+    )
+
+def lean_jobs(jobs_data: list, fields: Optional[str], compact: bool):
+    """
+    Projection des offres si fields= ou compact sont demandés, sinon None.
+    """
+    selected = responses.parse_fields(fields)
+    if selected is None and not compact:
+        return None
+    return [responses.project_offer(j, selected, compact) for j in jobs_data]
+
+def has_stale(jobs_data: list) -> bool:
+    """Au moins une offre provient des résultats périmés (France Travail indisponible)."""
+    return any(j.get('stale') for j in jobs_data)
+
+def build_analyze_response(profile_data: dict, jobs_data: list) -> AnalyzeResponse:
+    """Construit la réponse d'analyse à partir du profil et des offres."""
+    profile = ProfileResponse(
+        metier_recherche=profile_data.get('metier_recherche', 'Inconnu'),
+        competences_cles=profile_data.get('competences_cles', []),
+        points_forts=profile_data.get('points_forts', []),
+        niveau_experience=profile_data.get('niveau_experience', 'junior')
+    )
+    
+    jobs = [to_job_offer(j) for j in jobs_data]
+    
+    logger.info("Analyse terminée: %d offres trouvées pour '%s'", len(jobs), profile_data.get('metier_recherche', 'inconnu'))
+    
+    return AnalyzeResponse(profile=profile, jobs=jobs, stale=has_stale(jobs_data))
+
+def run_analysis_job(content: bytes) -> dict:
     """
-    # Vérifier le type de fichier
+    Exécuté par les workers de la file: pipeline complet, résultat sérialisable.
+    Une cloison pleine (délestage) est retentée avant de faire échouer le job.
+    """
+    for attempt in range(config.JOB_OVERLOAD_RETRIES + 1):
+        try:
+            profile_data, jobs_data = services.run_analysis_pipeline(content)
+            return build_analyze_response(profile_data, jobs_data).model_dump()
+        except (bulkheads.BulkheadFull, TimeoutError) as e:
+            if attempt == config.JOB_OVERLOAD_RETRIES:
+                raise RuntimeError(f"Service surchargé, analyse non effectuée: {e}")
+            logger.warning("Job refusé par une cloison (%s): nouvelle tentative dans %ds", e, 2 * (attempt + 1))
+            time.sleep(2 * (attempt + 1))
+
+# File d'analyses asynchrones (backend configurable via JOB_QUEUE_BACKEND)
+job_queue = jobs.JobQueue(jobs.create_store(), handler=run_analysis_job)
+
+async def read_pdf_upload(file: UploadFile) -> bytes:
+    """Vérifie le type du fichier et lit son contenu (taille bornée)."""
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Le fichier doit être un PDF")
+    return await uploads.read_upload_limited(file)
+
+@app.post("/analyze", response_model=AnalyzeResponse)
+async def analyze_cv(
+    request: Request,
+    file: UploadFile = File(...),
+    fields: Optional[str] = Query(None, description="Champs des offres à retourner, séparés par des virgules"),
+    compact: bool = Query(False, description="Offres aplaties avec description courte")
+):
+    """
+    Analyse un CV (PDF) et retourne le profil détecté + les offres correspondantes
+    """
+    # Place d'analyse réservée (503 si surcharge) par AdmissionMiddleware avant la lecture de l'upload;
+    # budget total de la requête, attente d'admission comprise, chaque étape y puise
+    deadline = request.state.deadline
+    responses.parse_fields(fields)  # Valider avant tout travail coûteux
+    with memprof.stage("upload_read"), tracing.span("upload_read") as read_span:
+        content = await read_pdf_upload(file)
+        read_span.set("bytes", len(content))
     
+    # Le travail bloquant part dans le pool de threads
     try:
-        # Lire le contenu du PDF
-        content = await file.read()
-        doc = fitz.open(stream=content, filetype="pdf")
-        text_cv = "".join([page.get_text() for page in doc])
-        doc.close()
-        
-        if not text_cv.strip():
-            raise HTTPException(status_code=400, detail="Le PDF ne contient pas de texte extractible")
-        
-        logger.info(f"CV reçu: {file.filename}, {len(text_cv)} caractères")
-        
-        # Analyser le CV avec Groq
-        profile_data = services.analyse_cv_with_groq(text_cv)
-        
-        if not profile_data:
-            raise HTTPException(status_code=500, detail="Erreur lors de l'analyse du CV")
+        logger.info("CV reçu: %s", file.filename)
+        profile_data, jobs_data = await run_in_threadpool(services.run_analysis_pipeline, content, deadline)
+        result = build_analyze_response(profile_data, jobs_data)
         
-        # Rechercher les offres avec le nouveau matching intelligent
-        jobs_data = services.fetch_jobs_with_matching(profile_data)
-        
-        # Construire la réponse
-        profile = ProfileResponse(
-            metier_recherche=profile_data.get('metier_recherche', 'Inconnu'),
-            competences_cles=profile_data.get('competences_cles', []),
-            points_forts=profile_data.get('points_forts', []),
-            niveau_experience=profile_data.get('niveau_experience', 'junior')
-        )
-        
-        jobs = [
-            JobOffer(
-                id=j['id'],
-                intitule=j['intitule'],
-                entreprise=j['entreprise'],
-                lieuTravail=j['lieuTravail'],
-                description=j['description'],
-                url=j['url'],
-                salaire=j.get('salaire'),
-                contrat=j.get('contrat')
-            )
-            for j in jobs_data
-        ]
-        
-        logger.info(f"Analyse terminée: {len(jobs)} offres trouvées pour '{profile_data.get('metier_recherche', 'inconnu')}'")
-        
-        return AnalyzeResponse(profile=profile, jobs=jobs)
-        
-    except HTTPException:
-        raise
+        lean = lean_jobs(jobs_data, fields, compact)
+        if lean is not None:
+            return JSONResponse({"profile": result.profile.model_dump(), "jobs": lean, "stale": result.stale})
+        return result
+    
+    except services.PdfWithoutText as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except bulkheads.BulkheadFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except TimeoutError as e:
+        # Budget épuisé dans la file d'une cloison: délestage, pas une erreur serveur
+        logger.warning("Analyse abandonnée: %s", e)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
-        logger.error(f"Erreur analyse: {str(e)}")
+        logger.error("Erreur analyse: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=f"Erreur serveur: {str(e)}")
 
-@app.get("/jobs/{keyword}", response_model=List[JobOffer])
-async def search_jobs(keyword: str):
-    """
-    Recherche des offres d'emploi par mot-clé
-    """
-    jobs_data = services.fetch_real_jobs(None, keyword)
-    
-    return [
-        JobOffer(
-            id=j['id'],
-            intitule=j['intitule'],
-            entreprise=j['entreprise'],
-            lieuTravail=j['lieuTravail'],
-            description=j['description'],
-            url=j['url'],
-            salaire=j.get('salaire'),
-            contrat=j.get('contrat')
+@app.post("/analyze/jobs", response_model=AnalyzeJobStatus, status_code=202)
+async def submit_analysis_job(file: UploadFile = File(...)):
+    """
+    Met l'analyse d'un CV en file et retourne immédiatement l'identifiant du job
+    """
+    content = await read_pdf_upload(file)
+    
+    if await run_in_threadpool(job_queue.is_full):
+        raise HTTPException(
+            status_code=503,
+            detail="File d'analyse pleine, réessayez dans quelques instants",
+            headers={"Retry-After": "10"}
         )
-        for j in jobs_data
-    ]
+    
+    job_id = await run_in_threadpool(job_queue.submit, content)
+    logger.info("Job d'analyse %s créé pour %s", job_id, file.filename)
+    
+    return AnalyzeJobStatus(job_id=job_id, status=jobs.QUEUED)
+
+@app.get("/analyze/jobs/{job_id}", response_model=AnalyzeJobStatus)
+async def get_analysis_job(job_id: str):
+    """
+    Retourne l'état d'un job d'analyse et son résultat lorsqu'il est terminé
+    """
+    job = await run_in_threadpool(job_queue.get, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job introuvable")
+    
+    return AnalyzeJobStatus(
+        job_id=job['job_id'],
+        status=job['status'],
+        result=job.get('result'),
+        error=job.get('error')
+    )
+
+@app.get("/suggest")
+def suggest_titles(
+    q: str = Query(..., min_length=1, max_length=100, description="Début de saisie"),
+    limit: int = Query(10, ge=1, le=config.SUGGEST_TOP_K),
+    type: Optional[str] = Query(None, pattern="^(metier|competence)$", description="Ne suggérer que des métiers ou des compétences")
+):
+    """
+    Suggestions d'intitulés de métier et de compétences (à appeler à chaque frappe)
+    """
+    return services.get_suggest_index().suggest(q, limit, type)
+
+@app.post("/alerts/profiles", response_model=AlertProfileCreated, status_code=201)
+async def save_alert_profile(profile: AlertProfile):
+    """
+    Sauvegarde un profil: chaque nouvelle offre reçue lui est confrontée
+    et celles qui atteignent ALERT_MIN_SCORE deviennent des alertes
+    """
+    profile_id = await run_in_threadpool(services.alert_store.save_profile, profile.model_dump())
+    logger.info("Profil d'alerte %s sauvegardé (%s)", profile_id, profile.metier_recherche)
+    return AlertProfileCreated(profile_id=profile_id)
+
+@app.delete("/alerts/profiles/{profile_id}", status_code=204)
+async def delete_alert_profile(profile_id: str):
+    """
+    Désactive un profil sauvegardé: il ne reçoit plus de nouvelles alertes
+    """
+    if not await run_in_threadpool(services.alert_store.deactivate_profile, profile_id):
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+
+@app.get("/alerts/profiles/{profile_id}/alerts", response_model=List[Alert])
+async def list_profile_alerts(
+    profile_id: str,
+    since: float = Query(0, description="Horodatage (epoch) à partir duquel lister les alertes"),
+    limit: int = Query(50, ge=1, le=200)
+):
+    """
+    Alertes d'un profil sauvegardé, les plus récentes d'abord
+    """
+    if await run_in_threadpool(services.alert_store.get_profile, profile_id) is None:
+        raise HTTPException(status_code=404, detail="Profil introuvable")
+    
+    return await run_in_threadpool(services.alert_store.list_alerts, profile_id, since, limit)
+
+@app.get("/jobs/{keyword}", response_model=List[JobOffer])
+async def search_jobs(
+    keyword: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Champs à retourner, séparés par des virgules"),
+    compact: bool = Query(False, description="Offres aplaties avec description courte"),
+    facets_counts: bool = Query(False, alias="facets", description="Retourne {total, jobs, facets} avec les compteurs par facette"),
+    contrat: Optional[str] = Query(None, description="Types de contrat (cdi, cdd, interim...), séparés par des virgules"),
+    salaire: Optional[str] = Query(None, description="Tranches de salaire annuel (0-25k, 25-35k, 35-45k, 45-60k, 60k+, non_precise)"),
+    departement: Optional[str] = Query(None, description="Départements (75, 69...), séparés par des virgules"),
+    niveau: Optional[str] = Query(None, description="Niveaux (junior, intermediaire, senior, tous)"),
+    sort: Optional[str] = Query(None, pattern="^salaire$", description="'salaire': salaire décroissant")
+):
+    """
+    Recherche des offres d'emploi par mot-clé, avec filtres et facettes optionnels
+    """
+    deadline = Deadline(config.SEARCH_SLA_SECONDS)
+    responses.parse_fields(fields)
+    try:
+        filters = facets.parse_filters(contrat=contrat, salaire=salaire, departement=departement, niveau=niveau)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async with admission.SEARCH.admit(deadline):
+        with memprof.stage("search"):
+            jobs_data = await run_in_threadpool(services.fetch_real_jobs, None, keyword, None, deadline)
+    
+    # Filtres et compteurs sur l'index de facettes du résultat (mis en cache): aucun appel amont en plus
+    counts = None
+    if filters or facets_counts or sort:
+        index = facets.index_for(keyword, jobs_data)
+        if facets_counts:
+            counts = index.counts(filters)
+        jobs_data = [jobs_data[i] for i in index.select(filters, sort)]
+    
+    # Résultats périmés (France Travail indisponible) signalés par l'en-tête X-Stale
+    headers = {"X-Stale": "true"} if has_stale(jobs_data) else None
+    lean = lean_jobs(jobs_data, fields, compact)
+    if counts is not None:
+        offers = lean if lean is not None else [to_job_offer(j).model_dump() for j in jobs_data]
+        return JSONResponse({"total": len(jobs_data), "jobs": offers, "facets": counts, "stale": headers is not None}, headers=headers)
+    if lean is not None:
+        return JSONResponse(lean, headers=headers)
+    if headers is not None:
+        response.headers.update(headers)
+    
+    return [to_job_offer(j) for j in jobs_data]
 
 if __name__ == "__main__":
     import uvicorn
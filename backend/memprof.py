@@ -0,0 +1,197 @@
+import contextvars
+import linecache
+import logging
+import resource
+import threading
+import tracemalloc
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Étapes mesurées pendant la requête en cours (liste partagée avec les threads du pool)
+_stages_var = contextvars.ContextVar("memory_stages", default=None)
+# Mesures ouvertes (requête, étapes englobantes): le pic qu'elles ont atteint avant chaque remise à zéro
+_open_var = contextvars.ContextVar("memory_open", default=())
+
+_baseline = None
+
+
+def enabled() -> bool:
+    return tracemalloc.is_tracing()
+
+
+def start():
+    """Active tracemalloc si MEMORY_PROFILING est vrai, et mémorise l'instantané de référence."""
+    global _baseline
+    if not config.MEMORY_PROFILING or tracemalloc.is_tracing():
+        return
+    tracemalloc.start(config.MEMORY_TRACE_FRAMES)
+    _baseline = tracemalloc.take_snapshot()
+    logger.warning("Profilage mémoire actif (tracemalloc, %d frames): surcoût CPU et mémoire", config.MEMORY_TRACE_FRAMES)
+
+
+def rss_kb() -> dict:
+    """RSS maximal du processus (toujours disponible, même sans tracemalloc)."""
+    return {"max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mesure l'allocation d'une étape du pipeline: octets encore alloués à la
+    sortie et pic atteint pendant l'étape. Sans effet si le profilage est inactif.
+
+    Les étapes peuvent s'imbriquer (scoring dans job_search): le pic courant
+    est reporté sur les mesures englobantes avant d'être remis à zéro, et le
+    pic de l'étape leur est reporté à sa sortie.
+
+    Les compteurs de tracemalloc sont globaux au processus: les mesures ne sont
+    fiables qu'avec une requête à la fois (rejeu, worker de diagnostic).
+    """
+    stages = _stages_var.get()
+    if stages is None or not tracemalloc.is_tracing():
+        yield
+        return
+
+    try:
+        with _measure() as measure:
+            yield
+    finally:
+        stages.append({"stage": name, "allocated": measure["allocated"], "peak": measure["peak"], "peak_absolute": measure["peak_absolute"]})
+
+
+@contextmanager
+def _measure():
+    """Allocation nette et pic d'un bloc, sans perdre le pic des mesures englobantes (voir stage())."""
+    parents = _open_var.get()
+    before, running = tracemalloc.get_traced_memory()
+    for parent in parents:
+        parent["peak_absolute"] = max(parent["peak_absolute"], running)
+    current = {"peak_absolute": 0}
+    token = _open_var.set(parents + (current,))
+    tracemalloc.reset_peak()
+    try:
+        yield current
+    finally:
+        _open_var.reset(token)
+        after, peak = tracemalloc.get_traced_memory()
+        peak = max(peak, current["peak_absolute"])
+        for parent in parents:
+            parent["peak_absolute"] = max(parent["peak_absolute"], peak)
+        current.update(allocated=after - before, peak=peak - before, peak_absolute=peak)
+
+
+class EndpointMemoryStats:
+    """Pic et allocation nette par endpoint et par étape, cumulés sur les requêtes mesurées."""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, peak: int, allocated: int, stages: list):
+        with self._lock:
+            entry = self._endpoints.setdefault(endpoint, {"requests": 0, "peak_max": 0, "peak_total": 0, "allocated_total": 0, "stages": {}})
+            entry["requests"] += 1
+            entry["peak_max"] = max(entry["peak_max"], peak)
+            entry["peak_total"] += peak
+            entry["allocated_total"] += allocated
+            for measure in stages:
+                stage_entry = entry["stages"].setdefault(measure["stage"], {"calls": 0, "peak_max": 0, "allocated_total": 0})
+                stage_entry["calls"] += 1
+                stage_entry["peak_max"] = max(stage_entry["peak_max"], measure["peak"])
+                stage_entry["allocated_total"] += measure["allocated"]
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            result = {}
+            for endpoint, entry in self._endpoints.items():
+                count = entry["requests"]
+                result[endpoint] = {
+                    "requests": count,
+                    "peak_max_kb": round(entry["peak_max"] / 1024, 1),
+                    "peak_avg_kb": round(entry["peak_total"] / count / 1024, 1),
+                    "allocated_avg_kb": round(entry["allocated_total"] / count / 1024, 1),
+                    "stages": {
+                        name: {
+                            "peak_max_kb": round(s["peak_max"] / 1024, 1),
+                            "allocated_avg_kb": round(s["allocated_total"] / s["calls"] / 1024, 1),
+                        }
+                        for name, s in entry["stages"].items()
+                    },
+                }
+            return result
+
+
+stats = EndpointMemoryStats()
+
+
+def _format_stat(stat) -> dict:
+    frame = stat.traceback[0]
+    return {
+        "site": f"{frame.filename}:{frame.lineno}",
+        "code": linecache.getline(frame.filename, frame.lineno).strip(),
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+
+
+def top_allocations(limit: int = 20, group_by: str = "lineno") -> dict:
+    """Sites d'allocation les plus lourds, et plus forte croissance depuis le démarrage."""
+    if not tracemalloc.is_tracing():
+        return {"enabled": False, **rss_kb()}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    result = {
+        "enabled": True,
+        **rss_kb(),
+        "traced_kb": round(current / 1024, 1),
+        "traced_peak_kb": round(peak / 1024, 1),
+        "top": [_format_stat(stat) for stat in snapshot.statistics(group_by)[:limit]],
+    }
+    if _baseline is not None:
+        growth = [diff for diff in snapshot.compare_to(_baseline, group_by) if diff.size_diff > 0][:limit]
+        result["growth_since_start"] = [
+            {**_format_stat(diff), "size_diff_kb": round(diff.size_diff / 1024, 1)} for diff in growth
+        ]
+    return result
+
+
+def _endpoint_name(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope["path"]
+    return f"{scope['method']} {path}"
+
+
+class MemoryProfilingMiddleware:
+    """
+    Mesure chaque requête quand le profilage mémoire est actif: pic
+    d'allocation (étapes comprises) et octets encore alloués à la fin,
+    cumulés par endpoint dans `stats`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug") or not tracemalloc.is_tracing():
+            await self.app(scope, receive, send)
+            return
+
+        stages = []
+        token = _stages_var.set(stages)
+        try:
+            # Mesure englobante: les étapes lui reportent leur pic
+            with _measure() as measure:
+                await self.app(scope, receive, send)
+        finally:
+            _stages_var.reset(token)
+            stats.record(_endpoint_name(scope), measure["peak"], measure["allocated"], stages)
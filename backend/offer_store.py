@@ -0,0 +1,354 @@
+"""
+Corpus d'offres en colonnes, sur disque, ouvert par mmap.
+
+Un seul fichier, lu en place par tous les workers: le noyau partage les
+mêmes pages physiques entre processus, l'ouverture ne lit que l'en-tête,
+et la mémoire résidente des workers ne grandit pas avec le corpus.
+
+    cd backend
+    python offer_store.py build offres.json flux/ -o /data/offres.store
+
+Format: en-tête (magic, longueur, JSON des sections) puis des sections
+alignées sur 8 octets:
+- colonnes fixes (array): niveau, type de contrat et période (octets),
+  salaire min/max (double, NaN si inconnu);
+- tables de chaînes: offsets (uint32, n+1) + données UTF-8 séparées par NUL;
+  title_lc, desc_lc et text_lc sont les textes en minuscules lus par le matching;
+- postings: vocabulaire (table de chaînes triée) et liste d'offres par mot (uint32).
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from array import array
+from collections import defaultdict
+from contextlib import nullcontext
+import config
+import facets
+import indexes
+import rome
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"EJFOFS01"
+
+LEVELS = ("tous", "junior", "intermediaire", "senior")
+CONTRACTS = (None,) + facets.CONTRACT_TYPES
+PERIODS = (None, "heure", "mois", "an")
+
+# Colonnes texte: affichage puis textes en minuscules du matching
+DISPLAY_COLUMNS = ("id", "intitule", "description", "entreprise", "lieu", "url", "salaire", "contrat", "tags", "departement")
+MATCH_COLUMNS = ("title_lc", "desc_lc", "text_lc")
+
+
+def _text(value) -> str:
+    return (value or "").replace("\0", " ")
+
+
+def _pad(buffer: bytearray):
+    buffer.extend(b"\0" * (-len(buffer) % 8))
+
+
+def _string_table(values: list) -> tuple:
+    """(offsets uint32, données): l'enregistrement i occupe data[offsets[i]:offsets[i+1] - 1]."""
+    offsets = array("I", [0])
+    data = bytearray()
+    for value in values:
+        data += _text(value).encode("utf-8") + b"\0"
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+def _code(values: tuple, value) -> int:
+    return values.index(value) if value in values else 0
+
+
+def write_store(offers: list, path: str) -> dict:
+    """
+    Écrit un corpus d'offres normalisées au format colonnes (remplacement atomique du fichier).
+
+    Returns:
+        En-tête écrit (nombre d'offres, sections)
+    """
+    rows = []
+    for offer in offers:
+        structured = facets.structured_fields(offer)
+        title = _text(offer.get("intitule"))
+        description = _text(offer.get("description"))
+        rows.append({
+            "id": offer.get("id"),
+            "intitule": title,
+            "description": description,
+            "entreprise": (offer.get("entreprise") or {}).get("nom"),
+            "lieu": (offer.get("lieuTravail") or {}).get("libelle"),
+            "url": offer.get("url"),
+            "salaire": offer.get("salaire"),
+            "contrat": offer.get("contrat"),
+            "tags": "|".join(_text(tag).replace("|", " ") for tag in offer.get("tags", [])),
+            "departement": structured["departement"],
+            # Mêmes textes que calculate_matching_score
+            "title_lc": title.lower(),
+            "desc_lc": description.lower(),
+            "text_lc": f"{title.lower()} {description.lower()}",
+            "niveau": _code(LEVELS, offer.get("niveau", "tous")),
+            "contrat_type": _code(CONTRACTS, structured["contrat_type"]),
+            "salaire_periode": _code(PERIODS, structured["salaire_periode"]),
+            "salaire_min": structured["salaire_min"],
+            "salaire_max": structured["salaire_max"],
+            "terms": set(rome.tokenize(f"{title} {' '.join(offer.get('tags', []))}")),
+        })
+
+    sections = []
+    for name in ("niveau", "contrat_type", "salaire_periode"):
+        sections.append((name, array("B", (row[name] for row in rows))))
+    for name in ("salaire_min", "salaire_max"):
+        sections.append((name, array("d", (math.nan if row[name] is None else row[name] for row in rows))))
+    for name in DISPLAY_COLUMNS + MATCH_COLUMNS:
+        offsets, data = _string_table([row[name] for row in rows])
+        sections.append((f"{name}.offsets", offsets))
+        sections.append((f"{name}.data", data))
+
+    postings = defaultdict(list)
+    for position, row in enumerate(rows):
+        for term in row["terms"]:
+            postings[term].append(position)
+    vocabulary = sorted(postings)
+    offsets, data = _string_table(vocabulary)
+    sections.append(("terms.offsets", offsets))
+    sections.append(("terms.data", data))
+    posting_offsets = array("I", [0])
+    posting_data = array("I")
+    for term in vocabulary:
+        posting_data.extend(postings[term])
+        posting_offsets.append(len(posting_data))
+    sections.append(("postings.offsets", posting_offsets))
+    sections.append(("postings.data", posting_data))
+
+    body = bytearray()
+    layout = {}
+    for name, content in sections:
+        raw = content.tobytes() if isinstance(content, array) else content
+        layout[name] = [len(body), len(raw), content.typecode if isinstance(content, array) else "B"]
+        body += raw
+        _pad(body)
+
+    header = {"count": len(rows), "built_at": time.time(), "terms": len(vocabulary), "sections": layout}
+    header_bytes = bytearray(json.dumps(header).encode("utf-8"))
+    _pad(header_bytes)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        f.write(body)
+    os.replace(tmp_path, path)
+    logger.info("Corpus d'offres écrit: %d offres, %d mots, %.1f Mo", len(rows), len(vocabulary), (len(body) + len(header_bytes)) / 1e6)
+    return header
+
+
+class StringColumn:
+    """Table de chaînes lue dans le mmap: décodage à la demande, recherche sur les octets."""
+
+    def __init__(self, mm: mmap.mmap, offsets: memoryview, start: int):
+        self._mm = mm
+        self.offsets = offsets
+        self.start = start  # Position des données dans le fichier
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def get(self, row: int) -> str:
+        return self._mm[self.start + self.offsets[row]:self.start + self.offsets[row + 1] - 1].decode("utf-8")
+
+    def rows_containing(self, needle: str) -> set:
+        """
+        Lignes dont le texte contient `needle`: un mmap.find() sur les données
+        contiguës, sans décoder ni parcourir les offres une à une. Le séparateur
+        NUL empêche une correspondance de chevaucher deux offres.
+        """
+        pattern = needle.encode("utf-8")
+        rows = set()
+        if not pattern:
+            return rows
+        end = self.start + self.offsets[-1]
+        position = self._mm.find(pattern, self.start, end)
+        while position != -1:
+            row = bisect.bisect_right(self.offsets, position - self.start) - 1
+            rows.add(row)
+            # Offre suivante: une seule occurrence suffit par offre
+            position = self._mm.find(pattern, self.start + self.offsets[row + 1], end)
+        return rows
+
+
+class OfferStore:
+    """
+    Corpus d'offres ouvert en lecture seule par mmap.
+
+    Les colonnes sont des memoryview sur le fichier: rien n'est copié dans le
+    tas Python, et les pages lues sont partagées entre les workers par le
+    cache du noyau. Une offre n'est reconstituée en dict que par offer().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: format de corpus inconnu")
+        (header_length,) = struct.unpack_from("<Q", self._mm, len(MAGIC))
+        body_start = len(MAGIC) + 8 + header_length
+        self.header = json.loads(self._mm[len(MAGIC) + 8:body_start].rstrip(b"\0"))
+        self._views = []
+        self._sections = {
+            name: (body_start + offset, length, typecode)
+            for name, (offset, length, typecode) in self.header["sections"].items()
+        }
+
+        self.niveau = self._array("niveau")
+        self.contrat_type = self._array("contrat_type")
+        self.salaire_periode = self._array("salaire_periode")
+        self.salaire_min = self._array("salaire_min")
+        self.salaire_max = self._array("salaire_max")
+        self.columns = {name: self._column(name) for name in DISPLAY_COLUMNS + MATCH_COLUMNS}
+        self.terms = self._column("terms")
+        self.posting_offsets = self._array("postings.offsets")
+        self.postings = self._array("postings.data")
+
+    def _array(self, name: str) -> memoryview:
+        start, length, typecode = self._sections[name]
+        view = memoryview(self._mm)[start:start + length].cast(typecode)
+        self._views.append(view)
+        return view
+
+    def _column(self, name: str) -> StringColumn:
+        return StringColumn(self._mm, self._array(f"{name}.offsets"), self._sections[f"{name}.data"][0])
+
+    def __len__(self):
+        return self.header["count"]
+
+    def rows_with_term(self, term: str) -> memoryview:
+        """Offres dont l'intitulé ou les tags contiennent le mot (liste de postings, sans copie)."""
+        position = bisect.bisect_left(_ColumnKeys(self.terms), term)
+        if position >= len(self.terms) or self.terms.get(position) != term:
+            return self.postings[0:0]
+        return self.postings[self.posting_offsets[position]:self.posting_offsets[position + 1]]
+
+    def search(self, keyword: str, limit: int = 20) -> list:
+        """Offres contenant tous les mots du mot-clé (intersection des postings)."""
+        words = rome.tokenize(keyword)
+        if not words:
+            return []
+        rows = None
+        for word in words:
+            found = set(self.rows_with_term(word))
+            rows = found if rows is None else rows & found
+            if not rows:
+                return []
+        return [self.offer(row) for row in sorted(rows)[:limit]]
+
+    def offer(self, row: int) -> dict:
+        """Reconstitue l'offre normalisée d'une ligne."""
+        get = {name: column.get(row) for name, column in self.columns.items() if name in DISPLAY_COLUMNS}
+        salaire_min, salaire_max = self.salaire_min[row], self.salaire_max[row]
+        return {
+            "id": get["id"],
+            "intitule": get["intitule"],
+            "entreprise": {"nom": get["entreprise"]},
+            "lieuTravail": {"libelle": get["lieu"]},
+            "description": get["description"],
+            "url": get["url"],
+            "salaire": get["salaire"] or None,
+            "contrat": get["contrat"],
+            "niveau": LEVELS[self.niveau[row]],
+            "tags": get["tags"].split("|") if get["tags"] else [],
+            "salaire_min": None if math.isnan(salaire_min) else salaire_min,
+            "salaire_max": None if math.isnan(salaire_max) else salaire_max,
+            "salaire_periode": PERIODS[self.salaire_periode[row]],
+            "contrat_type": CONTRACTS[self.contrat_type[row]] or "autre",
+            "departement": get["departement"] or None,
+        }
+
+    def close(self):
+        for view in getattr(self, "_views", []):
+            view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # Une vue est encore tenue par un appelant: le mmap sera libéré avec elle
+            logger.warning("Corpus %s: fermeture différée (vues encore utilisées)", self.path)
+        self._file.close()
+
+
+class _ColumnKeys:
+    """Vue séquence d'une StringColumn pour bisect (décode seulement les lignes sondées)."""
+
+    def __init__(self, column: StringColumn):
+        self._column = column
+
+    def __len__(self):
+        return len(self._column)
+
+    def __getitem__(self, row: int) -> str:
+        return self._column.get(row)
+
+
+def _validate(store: OfferStore) -> bool:
+    # Lecture d'une offre et d'un posting: un fichier tronqué échoue ici, pas en pleine requête
+    if len(store):
+        store.offer(len(store) - 1)
+    return len(store.posting_offsets) == len(store.terms) + 1
+
+
+# Le fichier est remplacé atomiquement (os.replace) par `offer_store.py build`, dans un autre
+# processus: une nouvelle génération le rouvre, l'ancien mmap est fermé quand plus personne ne le lit
+_index = indexes.register(
+    "offer_store", lambda previous: OfferStore(config.OFFER_STORE_PATH),
+    validate=_validate,
+    close=lambda store: store.close(),
+    signature=lambda: indexes.file_signature(config.OFFER_STORE_PATH)
+)
+
+
+def get_store():
+    """Génération courante du corpus local (OFFER_STORE_PATH) ; None s'il n'est pas configuré ou illisible."""
+    return _index.current() if config.OFFER_STORE_PATH else None
+
+
+def acquire():
+    """Tient la génération courante du corpus jusqu'à la sortie du bloc (None sans corpus)."""
+    return _index.acquire() if config.OFFER_STORE_PATH else nullcontext(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construit le corpus d'offres en colonnes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Depuis des fichiers .json/.csv au format des flux partenaires")
+    build.add_argument("inputs", nargs="+", help="Fichiers ou répertoires de flux")
+    build.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    import services
+    import sources
+
+    offers = {}
+    for path in args.inputs:
+        directory = path if os.path.isdir(path) else None
+        feed = sources.FileFeedSource(0, directory, services.normalize_france_travail_job)
+        if directory:
+            loaded = feed.catalogue()
+        else:
+            loaded = (feed._load_csv if path.endswith(".csv") else feed._load_json)(path)
+        offers.update((offer.get("id"), offer) for offer in loaded)
+    header = write_store(list(offers.values()), args.output)
+    print(f"{header['count']} offres, {header['terms']} mots -> {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import config
+import debug_auth
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Profileur par échantillonnage: un thread relève périodiquement la pile de
+    tous les autres threads du processus (sys._current_frames) et compte les
+    piles identiques.
+
+    Le résultat est exporté au format "collapsed" (une pile par ligne, frames
+    séparées par ';', suivie du nombre d'échantillons), lu par flamegraph.pl,
+    speedscope ou inferno.
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = interval if interval is not None else config.PROFILE_INTERVAL_MS / 1000
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.time() - self.started_at
+        return self
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def summary(self, top: int = 20) -> dict:
+        """Fonctions les plus présentes en haut de pile (temps propre)."""
+        own_time = Counter()
+        for stack, count in self.stacks.items():
+            own_time[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "samples": self.samples,
+            "duration": round(self.duration, 3),
+            "top_functions": own_time.most_common(top),
+        }
+
+
+class ProfileStore:
+    """Derniers profils capturés, en mémoire du worker."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile_id: str, sampler: StackSampler, meta: dict):
+        with self._lock:
+            self._profiles[profile_id] = {"sampler": sampler, "meta": meta}
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> list:
+        with self._lock:
+            return [
+                {"id": profile_id, **entry["meta"], **entry["sampler"].summary(top=3)}
+                for profile_id, entry in reversed(self._profiles.items())
+            ]
+
+
+profiles = ProfileStore(config.PROFILE_MAX_STORED)
+_active = threading.BoundedSemaphore(config.PROFILE_MAX_CONCURRENT)
+
+
+@contextmanager
+def slot():
+    """
+    Place de profilage du worker (PROFILE_MAX_CONCURRENT au plus, profils de
+    requêtes et profils du worker confondus), prise sans attendre.
+
+    Returns:
+        True si la place est obtenue (rendue à la sortie du bloc), False sinon
+    """
+    acquired = _active.acquire(blocking=False)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _active.release()
+
+
+def should_profile(headers) -> bool:
+    """Profilage demandé par en-tête (authentifié) ou tiré au sort selon PROFILE_SAMPLE_RATE."""
+    if headers.get("x-profile") == "1":
+        return debug_auth.is_valid_token(headers.get("x-debug-token"))
+    return config.PROFILE_SAMPLE_RATE > 0 and random.random() < config.PROFILE_SAMPLE_RATE
+
+
+class ProfilingMiddleware:
+    """
+    Capture un profil pendant la durée d'une requête sélectionnée.
+
+    Tous les threads sont échantillonnés (boucle d'événements et pool de
+    threads): les requêtes concurrentes apparaissent aussi dans le profil.
+    L'identifiant du profil est renvoyé dans l'en-tête X-Profile-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        if not should_profile(headers):
+            await self.app(scope, receive, send)
+            return
+
+        with slot() as acquired:
+            if not acquired:
+                await self.app(scope, receive, send)
+                return
+            await self._profile(scope, receive, send)
+
+    async def _profile(self, scope, receive, send):
+        profile_id = uuid.uuid4().hex
+        sampler = StackSampler().start()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            sampler.stop()
+            profiles.add(profile_id, sampler, {"method": scope["method"], "path": scope["path"], "started_at": sampler.started_at})
+            logger.info("Profil %s capturé pour %s %s (%d échantillons)", profile_id, scope["method"], scope["path"], sampler.samples)
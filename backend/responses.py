@@ -0,0 +1,127 @@
+import gzip
+from fastapi import HTTPException
+import config
+
+try:
+    import brotli
+except ImportError:  # brotli est optionnel: repli sur gzip
+    brotli = None
+
+# Champs exposés d'une offre (format JobOffer)
+OFFER_FIELDS = (
+    "id", "intitule", "entreprise", "lieuTravail", "description", "url", "salaire", "contrat", "matching_score",
+    "salaire_min", "salaire_max", "salaire_periode", "contrat_type", "departement", "stale"
+)
+
+
+def parse_fields(fields: str):
+    """
+    Valide le paramètre fields= (liste séparée par des virgules).
+
+    Returns:
+        Tuple des champs demandés (dans l'ordre de OFFER_FIELDS), ou None si absent
+
+    Raises:
+        HTTPException 400 si un champ est inconnu
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(OFFER_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Champs inconnus: {', '.join(sorted(unknown))}. Disponibles: {', '.join(OFFER_FIELDS)}"
+        )
+    return tuple(f for f in OFFER_FIELDS if f in requested)
+
+
+def project_offer(offer: dict, fields=None, compact: bool = False) -> dict:
+    """
+    Réduit une offre aux champs demandés.
+
+    En mode compact, entreprise et lieuTravail sont aplatis en chaînes,
+    la description est raccourcie et les valeurs vides sont omises.
+    """
+    projected = {}
+    for field in fields or OFFER_FIELDS:
+        value = offer.get(field)
+        if compact:
+            if field == "entreprise":
+                value = (value or {}).get("nom")
+            elif field == "lieuTravail":
+                value = (value or {}).get("libelle")
+            elif field == "description" and value and len(value) > config.COMPACT_DESCRIPTION_CHARS:
+                value = value[:config.COMPACT_DESCRIPTION_CHARS - 1].rstrip() + "…"
+            if value is None or value == "":
+                continue
+        projected[field] = value
+    return projected
+
+
+class CompressionMiddleware:
+    """
+    Compresse les réponses (brotli si disponible et accepté, sinon gzip)
+    au-delà de config.COMPRESSION_MIN_BYTES.
+
+    Seules les réponses envoyées en un seul bloc (JSON) sont compressées ;
+    les réponses en streaming passent telles quelles.
+    """
+
+    def __init__(self, app, minimum_size: int = None):
+        self.app = app
+        self.minimum_size = minimum_size if minimum_size is not None else config.COMPRESSION_MIN_BYTES
+
+    def _choose_encoding(self, scope):
+        accept = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1").lower()
+        if brotli is not None and "br" in accept:
+            return "br"
+        if "gzip" in accept:
+            return "gzip"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def compressing_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = [(k, v) for k, v in start["headers"] if k.lower() != b"content-length"]
+            already_encoded = any(k.lower() == b"content-encoding" for k, _ in headers)
+
+            if message.get("more_body", False) or already_encoded or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            if encoding == "br":
+                body = brotli.compress(body, quality=config.BROTLI_QUALITY)
+            else:
+                body = gzip.compress(body, compresslevel=config.GZIP_LEVEL)
+
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(body)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
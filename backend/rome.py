@@ -0,0 +1,173 @@
+import json
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+import config
+import indexes
+
+logger = logging.getLogger(__name__)
+
+# Mots vides ignorés dans les intitulés ("Chargé de ...", "Développeur (H/F)")
+STOPWORDS = {"de", "du", "des", "d", "la", "le", "les", "l", "en", "et", "a", "au", "aux", "h", "f", "hf", "un", "une", "pour"}
+
+# En dessous de cette taille, un mot doit correspondre exactement (sigles: dsi, sea, vtc)
+FUZZY_MIN_LENGTH = 4
+FUZZY_MIN_SIMILARITY = 0.5
+
+# Codes secondaires retenus seulement s'ils sont proches du meilleur ('Commercial': D1402 et D1403)
+SECONDARY_CODE_MARGIN = 0.25
+
+
+def normalize_text(text: str) -> str:
+    """Minuscules, sans accents ni ponctuation: 'Développeur Front-End' -> 'developpeur front end'."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", " ", text.replace("œ", "oe")).strip()
+
+
+def tokenize(text: str) -> tuple:
+    return tuple(word for word in normalize_text(text).split() if word not in STOPWORDS)
+
+
+def _trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RomeReferential:
+    """
+    Référentiel ROME indexé pour retrouver localement le code métier d'un intitulé libre.
+
+    Chaque fiche (code, libellé, appellations, synonymes) fournit des termes ;
+    un index inversé mot -> termes donne les candidats, et un index de trigrammes
+    rattache les mots inconnus (fautes, féminins: 'developpeuse') au mot du
+    vocabulaire le plus proche.
+    """
+
+    def __init__(self, fiches: list):
+        # Cache propre à l'instance: une génération remplacée est libérée avec ses entrées
+        self.lookup = lru_cache(maxsize=1024)(self._lookup)
+        self.fiches = {fiche["code"]: fiche["libelle"] for fiche in fiches}
+        self._terms = []  # (code, mots du terme)
+        self._index = defaultdict(set)  # mot -> indices de termes
+        self._trigram_index = defaultdict(set)  # trigramme -> mots du vocabulaire
+
+        for fiche in fiches:
+            for label in [fiche["libelle"], *fiche.get("appellations", []), *fiche.get("synonymes", [])]:
+                words = tokenize(label)
+                if not words:
+                    continue
+                term_id = len(self._terms)
+                self._terms.append((fiche["code"], words))
+                for word in words:
+                    self._index[word].add(term_id)
+
+        for word in self._index:
+            if len(word) >= FUZZY_MIN_LENGTH:
+                for trigram in _trigrams(word):
+                    self._trigram_index[trigram].add(word)
+
+    def __len__(self):
+        return len(self.fiches)
+
+    def _resolve_word(self, word: str) -> tuple:
+        """(mot du vocabulaire, poids) pour un mot de la requête, ou (None, 0)."""
+        if word in self._index:
+            return word, 1.0
+        if len(word) < FUZZY_MIN_LENGTH:
+            return None, 0.0
+
+        grams = _trigrams(word)
+        candidates = set()
+        for trigram in grams:
+            candidates |= self._trigram_index.get(trigram, set())
+
+        best, best_similarity = None, 0.0
+        for candidate in candidates:
+            candidate_grams = _trigrams(candidate)
+            similarity = len(grams & candidate_grams) / len(grams | candidate_grams)
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        if best_similarity < FUZZY_MIN_SIMILARITY:
+            return None, 0.0
+        return best, best_similarity
+
+    def _lookup(self, query: str, limit: int = None, min_score: float = None) -> tuple:
+        """
+        Codes ROME correspondant à un intitulé de métier.
+
+        Le score d'un terme pondère surtout la part du terme retrouvée dans la
+        requête (0.7) et un peu la part de la requête expliquée (0.3): les
+        compétences ajoutées par le LLM ('Développeur Python Django') ne font
+        pas chuter le score, mais le terme le plus complet l'emporte.
+
+        Args:
+            query: Intitulé libre (typiquement metier_recherche)
+            limit: Nombre maximal de codes (défaut: ROME_MAX_CODES)
+            min_score: Score minimal entre 0 et 1 (défaut: ROME_MIN_SCORE)
+
+        Returns:
+            Tuple de (code, libellé, score) par score décroissant
+        """
+        limit = limit if limit is not None else config.ROME_MAX_CODES
+        min_score = min_score if min_score is not None else config.ROME_MIN_SCORE
+
+        words = tokenize(query)
+        if not words:
+            return ()
+
+        # mot du vocabulaire -> poids de la correspondance
+        resolved = {}
+        for word in words:
+            match, weight = self._resolve_word(word)
+            if match and weight > resolved.get(match, 0.0):
+                resolved[match] = weight
+
+        candidate_terms = set()
+        for word in resolved:
+            candidate_terms |= self._index[word]
+
+        best_by_code = {}
+        for term_id in candidate_terms:
+            code, term_words = self._terms[term_id]
+            matched = sum(resolved.get(word, 0.0) for word in term_words)
+            score = 0.7 * matched / len(term_words) + 0.3 * matched / len(words)
+            if score > best_by_code.get(code, 0.0):
+                best_by_code[code] = score
+
+        ranked = sorted(best_by_code.items(), key=lambda item: item[1], reverse=True)
+        if not ranked:
+            return ()
+        floor = max(min_score, ranked[0][1] - SECONDARY_CODE_MARGIN)
+        return tuple(
+            (code, self.fiches[code], round(score, 3))
+            for code, score in ranked[:limit] if score >= floor
+        )
+
+    def codes_for(self, query: str) -> list:
+        return [code for code, _, _ in self.lookup(query)]
+
+
+def load_referential(path: str = None) -> RomeReferential:
+    """Charge le référentiel JSON ({"fiches": [...]}) fourni avec l'application ou ROME_REFERENTIAL_PATH."""
+    path = path or config.ROME_REFERENTIAL_PATH
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    referential = RomeReferential(data["fiches"])
+    logger.info("Référentiel ROME chargé: %d fiches, %d mots indexés", len(referential), len(referential._index))
+    return referential
+
+
+# Rechargé sans redémarrage quand le fichier change (indexes.start_watcher)
+_index = indexes.register(
+    "rome", lambda previous: load_referential(),
+    validate=lambda referential: len(referential) > 0,
+    signature=lambda: indexes.file_signature(config.ROME_REFERENTIAL_PATH)
+)
+
+
+def get_referential():
+    """Génération courante du référentiel, chargée au premier usage ; None s'il est illisible (recherche par mots-clés seule)."""
+    return _index.current()
@@ -1,22 +1,99 @@
 import requests
 import base64
+import heapq
 import json
 import logging
+import re
 import config
 import time
+import fitz  # PyMuPDF
+import llm_router
+import bulkheads
+import breakers
+import sources
+import rome
+import alerts
+import facets
+import suggest
+import offer_store
+import indexes
+import degradation
+from array import array
+from logging_setup import VERBOSE
+from cache import cache, make_key, MISSING
+from deadline import Deadline, UNLIMITED
+from memprof import stage
+from tracing import span, annotate
+
+try:
+    import orjson
+except ImportError:  # orjson est optionnel: repli sur json
+    orjson = None
 
-# Configuration du logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-def get_ft_token():
-    """Récupère le jeton d'accès OAuth2."""
+# Niveau d'une offre d'après son libellé d'expérience (premier motif trouvé)
+EXPERIENCE_PATTERNS = (
+    ('junior', re.compile('débutant|moins de 1 an|sans expérience')),
+    ('intermediaire', re.compile('1 an|2 ans|3 ans')),
+    ('senior', re.compile('5 ans|10 ans|expérimenté|senior')),
+)
+
+# Mots de l'offre qui valident le niveau du candidat quand celui de l'offre diffère
+NIVEAU_KEYWORDS = {
+    'junior': ['junior', 'débutant', 'stage', 'alternance', 'apprenti'],
+    'intermediaire': ['confirmé', '2 ans', '3 ans', 'intermédiaire'],
+    'senior': ['senior', 'expert', 'lead', '5 ans', '10 ans', 'expérimenté']
+}
+
+# Session partagée: connexions TCP/TLS réutilisées d'un appel France Travail à l'autre
+http_session = requests.Session()
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=config.HTTP_POOL_SIZE))
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=config.HTTP_POOL_SIZE))
+
+def upstream_ok(response) -> bool:
+    """Réponse saine pour le disjoncteur: seules les erreurs serveur et la limitation de débit comptent."""
+    return response.status_code < 500 and response.status_code != 429
+
+
+def call_france_travail(breaker, bulkhead, send, cap: float, deadline: Deadline):
+    """
+    Appel France Travail dans sa cloison, à travers son disjoncteur.
+
+    Le disjoncteur ne juge que l'appel HTTP: l'attente dans la cloison, une
+    cloison pleine et un timeout raccourci par le budget de la requête sont
+    des conditions locales, sans verdict sur l'amont.
+
+    Args:
+        send: send(timeout) -> réponse HTTP; le timeout est calculé au démarrage,
+            après l'attente éventuelle dans la cloison
+        cap: Timeout habituel de l'appel (FT_AUTH_TIMEOUT, FT_SEARCH_TIMEOUT)
+
+    Raises:
+        breakers.CircuitOpen si le disjoncteur est ouvert
+        bulkheads.BulkheadFull si la cloison est saturée
+        TimeoutError si le budget s'épuise dans la file de la cloison
+    """
+    def attempt():
+        timeout = deadline.timeout(cap)
+        local_timeouts = (requests.exceptions.Timeout,) if timeout < cap else ()
+        return breaker.call(send, timeout, succeeded=upstream_ok, ignore=local_timeouts)
+
+    # Disjoncteur ouvert: échec immédiat, sans occuper la file de la cloison
+    breaker.fail_fast()
+    return bulkhead.call(attempt, deadline=deadline)
+
+
+def get_ft_token(deadline: Deadline = UNLIMITED):
+    """Récupère le jeton d'accès OAuth2 (timeout borné par le budget de la requête)."""
     if not config.FT_ID or not config.FT_SECRET:
         return None
 
+    # Jeton partagé entre workers jusqu'à peu avant son expiration
+    cached_token = cache.get("ft_token", config.FT_ID)
+    if cached_token is not MISSING:
+        return cached_token
+
     user_pass = f"{config.FT_ID.strip()}:{config.FT_SECRET.strip()}"
     auth_b64 = base64.b64encode(user_pass.encode()).decode()
 
@@ -26,24 +103,49 @@ def get_ft_token():
     }
     data = {"grant_type": "client_credentials", "scope": "api_offresdemploiv2 o2dsoffre"}
 
+    if not deadline.has(config.DEADLINE_MIN_UPSTREAM_SECONDS):
+        logger.warning("Budget insuffisant pour l'auth France Travail (%.1fs restantes)", deadline.remaining())
+        return None
+
     try:
-        r = requests.post(config.AUTH_URL, data=data, headers=headers)
+        with span("ft_auth") as auth_span:
+            r = call_france_travail(
+                breakers.FT_AUTH, bulkheads.FT_AUTH,
+                lambda timeout: http_session.post(config.AUTH_URL, data=data, headers=headers, timeout=timeout),
+                config.FT_AUTH_TIMEOUT, deadline
+            )
+            auth_span.set("http.status_code", r.status_code)
         if r.status_code == 200:
             logger.info("Token France Travail obtenu avec succès")
-            return r.json().get("access_token")
+            payload = r.json()
+            token = payload.get("access_token")
+            if token:
+                cache.set("ft_token", config.FT_ID, token, ttl=payload.get("expires_in", 1500) - 60)
+            return token
         else:
-            logger.warning(f"Échec auth France Travail: {r.status_code}")
+            logger.warning("Échec auth France Travail: %s", r.status_code)
             return None
+    except (breakers.CircuitOpen, bulkheads.BulkheadFull) as e:
+        logger.warning("Auth France Travail non tentée: %s", e)
+        return None
     except Exception as e:
-        logger.error(f"Erreur auth France Travail: {e}")
+        logger.error("Erreur auth France Travail: %s", e)
         return None
 
-def fetch_jobs_with_matching(profile: dict):
+def fetch_jobs_with_matching(profile: dict, deadline: Deadline = UNLIMITED):
     """
     Récupère les offres d'emploi avec un matching intelligent basé sur le profil.
     
+    Les stratégies de repli ne sont tentées que s'il reste assez de budget. La
+    stratégie qui a donné des résultats pour un métier est mémorisée (namespace
+    search_strategy) et tentée en premier pour les profils suivants, sauf la
+    recherche générique et sauf si une stratégie précédente a échoué au lieu
+    d'être vide (une panne ne fixe pas la mémoire) ; les recherches vides sont
+    elles-mêmes en cache (NEGATIVE_CACHE_TTL).
+    
     Args:
         profile: Dictionnaire contenant metier_recherche, competences_cles, niveau_experience
+        deadline: Budget de temps restant de la requête
     
     Returns:
         Liste d'offres triées par score de matching
@@ -52,52 +154,101 @@ def fetch_jobs_with_matching(profile: dict):
     competences = profile.get('competences_cles', [])
     niveau = profile.get('niveau_experience', 'junior')
     
-    # Essayer l'API France Travail avec plusieurs stratégies de recherche
-    token = get_ft_token()
+    strategies = search_strategies(metier, competences)
+    
+    # Stratégie gagnante déjà observée pour ce métier: elle est tentée en premier
+    memory_key = make_key(rome.normalize_text(metier), [rome.normalize_text(c) for c in competences[:1]])
+    known = cache.get("search_strategy", memory_key)
+    if known is not MISSING:
+        strategies.sort(key=lambda strategy: strategy[0] != known["strategy"])
+    
     offres = []
+    confirmed = True
+    for attempt, (number, keyword, rome_codes) in enumerate(strategies):
+        # Les stratégies de repli ne sont tentées que s'il reste assez de budget
+        if attempt > 0 and not deadline.has(config.DEADLINE_MIN_SEARCH_SECONDS):
+            logger.warning("Budget épuisé (%.1fs restantes): stratégies de repli abandonnées", deadline.remaining())
+            break
+        if rome_codes:
+            logger.info("Métier '%s' -> codes ROME %s", keyword, list(rome_codes), extra={"strategy": number})
+        elif attempt > 0:
+            logger.info("Retry recherche avec '%s'", keyword, extra={"strategy": number})
+        with span("search_strategy", strategy=number, keyword=keyword, rome_codes=list(rome_codes) or None) as strategy_span, \
+                degradation.track() as failures:
+            offres = search_offers(keyword, deadline=deadline, rome_codes=rome_codes)
+            strategy_span.set("offers", len(offres))
+        if failures:
+            confirmed = False  # Source en échec: un résultat vide ne prouve rien
+        if offres:
+            # Mémorisée seulement si les stratégies précédentes étaient vraiment vides; jamais la recherche générique
+            if confirmed and number != GENERIC_STRATEGY and (known is MISSING or known["strategy"] != number):
+                cache.set("search_strategy", memory_key, {"strategy": number})
+            break
     
-    if token:
-        # Stratégie 1: Recherche avec le métier complet
-        offres = fetch_france_travail_jobs(token, metier)
-        
-        # Stratégie 2: Si pas de résultats, essayer avec le premier mot significatif
-        if not offres and len(metier.split()) > 1:
-            premier_mot = [m for m in metier.split() if len(m) > 3]
-            if premier_mot:
-                logger.info(f"Retry recherche avec mot-clé: '{premier_mot[0]}'")
-                offres = fetch_france_travail_jobs(token, premier_mot[0])
-        
-        # Stratégie 3: Essayer avec les compétences clés
-        if not offres and competences:
-            keyword = competences[0] if competences else 'emploi'
-            logger.info(f"Retry recherche avec compétence: '{keyword}'")
-            offres = fetch_france_travail_jobs(token, keyword)
-        
-        # Stratégie 4: Recherche générique
-        if not offres:
-            logger.info("Retry recherche générique: 'emploi'")
-            offres = fetch_france_travail_jobs(token, 'emploi')
+    # Score sur la forme de scoring des offres; seules les 5 meilleures sont normalisées
+    with stage("scoring"):
+        with span("scoring", offers=len(offres)):
+            scored = [(calculate_matching_score(job, metier, competences, niveau), job) for job in offres]
+        # Corpus local: génération tenue pendant le scoring (un rafraîchissement ne la libère qu'après)
+        with offer_store.acquire() as store:
+            if store is not None and len(store):
+                # Scoré colonne par colonne, seules ses 5 meilleures offres sont reconstituées
+                with span("scoring", source="store", offers=len(store)):
+                    scores = score_offer_store(store, metier, competences, niveau)
+                scored.extend((scores[row], store.offer(row)) for row in heapq.nlargest(5, range(len(scores)), key=scores.__getitem__))
+        if not scored:
+            logger.warning("Aucune offre trouvée après toutes les stratégies")
+            return []
+        # Le corpus local peut reprendre des offres déjà trouvées: au plus 5 doublons à écarter
+        best = heapq.nlargest(10, scored, key=lambda item: item[0])
+        top_jobs = []
+        seen = set()
+        with span("normalize", stage="complete_offer"):
+            for score, job in best:
+                if job['id'] in seen:
+                    continue
+                seen.add(job['id'])
+                top_jobs.append({**complete_offer(job), 'matching_score': score})
+                if len(top_jobs) == 5:
+                    break
     
-    if not offres:
-        logger.warning("Aucune offre France Travail trouvée après toutes les stratégies")
-        return []
+    logger.info("Top 5 jobs pour '%s': scores = %s", metier, [j['matching_score'] for j in top_jobs], extra=VERBOSE)
     
-    # Calculer le score de matching pour chaque offre
-    scored_jobs = []
-    for job in offres:
-        score = calculate_matching_score(job, metier, competences, niveau)
-        job['matching_score'] = score
-        scored_jobs.append(job)
+    return top_jobs
+
+# Recherche générique ('emploi'): renvoie toujours des offres, jamais mémorisée comme stratégie gagnante
+GENERIC_STRATEGY = 4
+
+def search_strategies(metier: str, competences: list) -> list:
+    """
+    Stratégies de recherche candidates pour un profil, dans l'ordre par défaut.
+    
+    Returns:
+        Liste de (numéro de stratégie, mot-clé, codes ROME)
+    """
+    strategies = []
     
-    # Trier par score décroissant
-    scored_jobs.sort(key=lambda x: x['matching_score'], reverse=True)
+    # Stratégie 0: codes ROME du métier, résolus localement (une seule requête précise)
+    referential = rome.get_referential()
+    rome_codes = referential.codes_for(metier) if referential else []
+    if rome_codes:
+        strategies.append((0, metier, tuple(rome_codes)))
     
-    # Retourner les 5 meilleures offres
-    top_jobs = scored_jobs[:5]
+    # Stratégie 1: Recherche avec le métier complet
+    strategies.append((1, metier, ()))
     
-    logger.info(f"Top 5 jobs pour '{metier}': scores = {[j['matching_score'] for j in top_jobs]}")
+    # Stratégie 2: Premier mot significatif du métier
+    premier_mot = [m for m in metier.split() if len(m) > 3]
+    if len(metier.split()) > 1 and premier_mot:
+        strategies.append((2, premier_mot[0], ()))
     
-    return top_jobs
+    # Stratégie 3: Première compétence clé
+    if competences:
+        strategies.append((3, competences[0], ()))
+    
+    # Stratégie 4: Recherche générique
+    strategies.append((GENERIC_STRATEGY, 'emploi', ()))
+    return strategies
 
 def calculate_matching_score(job: dict, metier: str, competences: list, niveau: str) -> int:
     """
@@ -140,58 +291,125 @@ def calculate_matching_score(job: dict, metier: str, competences: list, niveau:
     # 3. Score niveau d'expérience (20 points max)
     job_niveau = job.get('niveau', 'tous')
     
-    niveau_keywords = {
-        'junior': ['junior', 'débutant', 'stage', 'alternance', 'apprenti'],
-        'intermediaire': ['confirmé', '2 ans', '3 ans', 'intermédiaire'],
-        'senior': ['senior', 'expert', 'lead', '5 ans', '10 ans', 'expérimenté']
-    }
-    
     if job_niveau == 'tous' or job_niveau == niveau:
         score += 15
-    elif niveau in niveau_keywords:
-        for keyword in niveau_keywords[niveau]:
+    elif niveau in NIVEAU_KEYWORDS:
+        for keyword in NIVEAU_KEYWORDS[niveau]:
             if keyword in job_text:
                 score += 20
                 break
     
     return score
 
-def fetch_real_jobs(token, keyword, profile=None):
+def score_offer_store(store, metier: str, competences: list, niveau: str) -> array:
+    """
+    calculate_matching_score sur tout le corpus local, colonne par colonne.
+    
+    Chaque mot du métier, chaque compétence et chaque mot-clé de niveau est
+    cherché une fois dans la colonne texte contiguë du mmap (offer_store.StringColumn);
+    les offres ne sont jamais reconstituées. Les scores sont identiques à
+    ceux de calculate_matching_score sur les offres normalisées.
+    
+    Returns:
+        Scores par ligne du corpus (array 'i')
+    """
+    size = len(store)
+    columns = store.columns
+    metier_scores = array('i', bytes(4 * size))
+    for word in metier.lower().split():
+        if len(word) > 2:  # Ignorer les mots trop courts
+            in_title = columns['title_lc'].rows_containing(word)
+            for row in in_title:
+                metier_scores[row] += 20
+            for row in columns['desc_lc'].rows_containing(word) - in_title:
+                metier_scores[row] += 10
+    
+    competences_scores = array('i', bytes(4 * size))
+    for comp in competences:
+        for row in columns['text_lc'].rows_containing(comp.lower()):
+            competences_scores[row] += 8
+    
+    # Niveau: 15 points si l'offre est ouverte à tous ou au même niveau, sinon 20 si un mot-clé du niveau apparaît
+    same_level = {offer_store.LEVELS.index('tous')}
+    if niveau in offer_store.LEVELS:
+        same_level.add(offer_store.LEVELS.index(niveau))
+    keyword_rows = set()
+    for keyword in NIVEAU_KEYWORDS.get(niveau, []):
+        keyword_rows |= columns['text_lc'].rows_containing(keyword)
+    
+    levels = store.niveau
+    return array('i', (
+        min(metier_scores[row], 40) + min(competences_scores[row], 40)
+        + (15 if levels[row] in same_level else 20 if row in keyword_rows else 0)
+        for row in range(size)
+    ))
+
+def fetch_real_jobs(token, keyword, profile=None, deadline: Deadline = UNLIMITED):
     """
-    Récupère les offres d'emploi depuis l'API France Travail.
+    Récupère les offres d'emploi depuis les sources configurées.
     Si un profil est fourni, utilise le matching intelligent.
+    Le token n'est plus utilisé: la source France Travail obtient le sien (mis en cache).
     """
     if profile:
-        return fetch_jobs_with_matching(profile)
+        return fetch_jobs_with_matching(profile, deadline)
     
     search_term = keyword.strip() if keyword else "emploi"
     
-    # Obtenir le token si non fourni
-    if not token:
-        token = get_ft_token()
-    
-    # Essayer l'API France Travail
-    if token:
-        offres = fetch_france_travail_jobs(token, search_term)
-        if offres:
-            return offres
+    # Toutes les sources configurées (France Travail, flux partenaires...) en parallèle
+    offres = search_offers(search_term, deadline=deadline)
+    if offres:
+        with span("normalize", stage="complete_offer", offers=len(offres)):
+            return [complete_offer(offre) for offre in offres]
     
-    # Pas de résultats France Travail
-    logger.warning("API France Travail indisponible ou aucun résultat")
+    # Pas de résultats
+    logger.warning("Sources d'offres indisponibles ou aucun résultat")
     return []
 
-def fetch_france_travail_jobs(token: str, keyword: str, max_results: int = 20):
+def parse_json(body: bytes):
+    """Décode une réponse JSON (orjson s'il est installé)."""
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+def fetch_france_travail_jobs(token: str, keyword: str, max_results: int = 20, deadline: Deadline = UNLIMITED, rome_codes: tuple = (),
+                              token_refreshed: bool = False):
     """
     Récupère les offres d'emploi depuis l'API France Travail v2.
     
+    Quand l'API ne peut pas répondre (disjoncteur ouvert, erreur, timeout,
+    pas de jeton ni de budget), les derniers résultats valides de la même
+    recherche sont servis depuis le namespace persistant ft_stale, chaque
+    offre marquée 'stale'.
+    
     Args:
-        token: Token OAuth2 d'accès
+        token: Token OAuth2 d'accès (None si l'auth a échoué: cache ou résultats périmés seulement)
         keyword: Mot-clé de recherche
         max_results: Nombre maximum de résultats (défaut: 20)
+        deadline: Budget restant; trop court, seul le cache est consulté
+        rome_codes: Codes ROME du métier; s'ils sont fournis, la recherche se fait
+            par codeROME et non par mots-clés
+        token_refreshed: Jeton déjà renouvelé après un 401 (une seule nouvelle tentative)
     
     Returns:
-        Liste d'offres d'emploi au format normalisé
+        Liste d'offres au format de scoring (complete_offer pour les afficher)
     """
+    if rome_codes:
+        cache_key = make_key("rome", sorted(rome_codes), max_results)
+    else:
+        cache_key = make_key(keyword.lower(), max_results)
+    cached_offres = cache.get("ft_search", cache_key)
+    if cached_offres is not MISSING:
+        logger.info("Recherche France Travail: '%s' (cache)", keyword)
+        annotate(outcome="cache")
+        return cached_offres
+    
+    if not config.FT_ID or not config.FT_SECRET:
+        return []  # France Travail non configuré: pas un repli
+    if not token:
+        return stale_offers(cache_key, keyword)
+    
+    if not deadline.has(config.DEADLINE_MIN_UPSTREAM_SECONDS):
+        logger.warning("Budget insuffisant pour rechercher '%s' (%.1fs restantes)", keyword, deadline.remaining())
+        return stale_offers(cache_key, keyword)
+    
     try:
         # URL de l'API France Travail v2
         api_url = f"{config.SEARCH_URL}/v2/offres/search"
@@ -204,73 +422,115 @@ def fetch_france_travail_jobs(token: str, keyword: str, max_results: int = 20):
         
         # Paramètres de recherche
         params = {
-            'motsCles': keyword,
             'range': f'0-{max_results - 1}'  # Format: start-end (0-indexed)
         }
+        if rome_codes:
+            params['codeROME'] = ','.join(rome_codes)
+        else:
+            params['motsCles'] = keyword
+        
+        logger.info("Recherche France Travail: '%s'", params.get('codeROME') or keyword)
         
-        logger.info(f"Recherche France Travail: '{keyword}'")
+        with span("ft_search", keyword=keyword, rome_codes=list(rome_codes) or None) as search_span:
+            response = call_france_travail(
+                breakers.FT_SEARCH, bulkheads.FT_SEARCH,
+                lambda timeout: http_session.get(api_url, headers=headers, params=params, timeout=timeout),
+                config.FT_SEARCH_TIMEOUT, deadline
+            )
+            search_span.set("http.status_code", response.status_code)
         
-        response = requests.get(api_url, headers=headers, params=params, timeout=15)
+        if response.status_code == 401 and not token_refreshed:
+            # Jeton révoqué ou renouvelé avant son expiration: le cache partagé le resservirait à tous les workers
+            logger.warning("Jeton France Travail refusé (401): renouvellement")
+            cache.delete("ft_token", config.FT_ID)
+            fresh_token = get_ft_token(deadline)
+            if fresh_token:
+                return fetch_france_travail_jobs(fresh_token, keyword, max_results, deadline, rome_codes, token_refreshed=True)
+            return stale_offers(cache_key, keyword)
+        
+        if response.status_code == 204:
+            # Aucune offre: mis en cache peu de temps pour ne pas refaire l'aller-retour à chaque profil identique
+            logger.info("Aucune offre France Travail pour '%s'", params.get('codeROME') or keyword)
+            cache.set("ft_search", cache_key, [], ttl=config.NEGATIVE_CACHE_TTL)
+            return []
         
         if response.status_code == 200:
-            data = response.json()
+            data = parse_json(response.content)
             resultats = data.get('resultats', [])
             
-            logger.info(f"{len(resultats)} offres France Travail trouvées")
+            logger.info("%d offres France Travail trouvées", len(resultats))
             
-            # Normaliser les résultats au format attendu par l'application
-            offres = []
-            for offre_ft in resultats:
-                offre = normalize_france_travail_job(offre_ft)
-                offres.append(offre)
+            # Champs de scoring seulement: la normalisation complète attend la sélection
+            with span("normalize", stage="scoring_fields", offers=len(resultats)):
+                offres = [extract_scoring_fields(offre_ft) for offre_ft in resultats]
             
+            cache.set("ft_search", cache_key, offres, ttl=None if offres else config.NEGATIVE_CACHE_TTL)
+            if offres:
+                cache.set("ft_stale", cache_key, offres)
+            alert_dispatcher.submit(offres)
+            observe_titles(offres)
             return offres
         
         elif response.status_code == 206:
             # Réponse partielle (moins de résultats que demandé)
-            data = response.json()
+            data = parse_json(response.content)
             resultats = data.get('resultats', [])
-            logger.info(f"{len(resultats)} offres France Travail (résultats partiels)")
+            logger.info("%d offres France Travail (résultats partiels)", len(resultats))
             
-            offres = []
-            for offre_ft in resultats:
-                offre = normalize_france_travail_job(offre_ft)
-                offres.append(offre)
+            with span("normalize", stage="scoring_fields", offers=len(resultats)):
+                offres = [extract_scoring_fields(offre_ft) for offre_ft in resultats]
             
+            cache.set("ft_search", cache_key, offres)
+            if offres:
+                cache.set("ft_stale", cache_key, offres)
+            alert_dispatcher.submit(offres)
+            observe_titles(offres)
             return offres
         
         else:
-            logger.warning(f"Erreur API France Travail: {response.status_code} - {response.text[:200]}")
-            return []
+            logger.warning("Erreur API France Travail: %s - %s", response.status_code, response.text[:200])
+            return stale_offers(cache_key, keyword)
             
-    except requests.exceptions.Timeout:
+    except (requests.exceptions.Timeout, TimeoutError):
         logger.warning("Timeout API France Travail")
-        return []
+        return stale_offers(cache_key, keyword)
+    except (breakers.CircuitOpen, bulkheads.BulkheadFull) as e:
+        logger.warning("Recherche France Travail non tentée pour '%s': %s", keyword, e)
+        return stale_offers(cache_key, keyword)
     except requests.exceptions.RequestException as e:
-        logger.error(f"Erreur requête France Travail: {e}")
-        return []
+        logger.error("Erreur requête France Travail: %s", e)
+        return stale_offers(cache_key, keyword)
     except Exception as e:
-        logger.error(f"Erreur inattendue France Travail: {e}")
+        logger.error("Erreur inattendue France Travail: %s", e)
+        return stale_offers(cache_key, keyword)
+
+
+def stale_offers(cache_key: str, keyword: str) -> list:
+    """Derniers résultats valides d'une recherche, marqués 'stale' ([] si elle n'a jamais abouti)."""
+    degradation.mark("france_travail")
+    offres = cache.get("ft_stale", cache_key)
+    if offres is MISSING:
         return []
+    logger.info("Recherche France Travail: '%s' (%d offres périmées)", keyword, len(offres))
+    annotate(outcome="stale")
+    for offre in offres:
+        offre["stale"] = True
+    return offres
 
-def normalize_france_travail_job(offre_ft: dict) -> dict:
+def extract_scoring_fields(offre_ft: dict) -> dict:
     """
-    Normalise une offre France Travail au format interne de l'application.
+    Forme de scoring d'une offre France Travail: seuls les champs lus par
+    calculate_matching_score sont calculés (intitulé, description tronquée,
+    niveau), avec les champs structurés des facettes (salaire chiffré, type
+    de contrat, département). Les champs d'affichage bruts sont gardés sous
+    '_ft' et mis en forme par complete_offer, pour les seules offres retournées.
     
     Args:
         offre_ft: Offre au format API France Travail
     
     Returns:
-        Offre au format normalisé pour l'application
+        Offre au format de scoring
     """
-    # Extraire les informations de l'entreprise
-    entreprise_info = offre_ft.get('entreprise', {})
-    nom_entreprise = entreprise_info.get('nom', 'Entreprise non précisée')
-    
-    # Extraire le lieu de travail
-    lieu_travail = offre_ft.get('lieuTravail', {})
-    lieu_libelle = lieu_travail.get('libelle', 'France')
-    
     # Construire la description
     description = offre_ft.get('description', '')
     if not description:
@@ -279,57 +539,91 @@ def normalize_france_travail_job(offre_ft: dict) -> dict:
     if len(description) > 500:
         description = description[:497] + '...'
     
-    # Construire l'URL de l'offre
-    job_id = offre_ft.get('id', '')
-    url_offre = f"https://candidat.francetravail.fr/offres/recherche/detail/{job_id}"
+    # Salaire et contrat analysés une fois ici, pas à chaque filtrage
+    salaire_info = offre_ft.get('salaire', {})
+    salaire_min, salaire_max, salaire_periode = facets.parse_salary(salaire_info.get('libelle') or salaire_info.get('commentaire'))
+    lieu_travail = offre_ft.get('lieuTravail', {})
+    
+    return {
+        'id': offre_ft.get('id', ''),
+        'intitule': offre_ft.get('intitule', 'Offre d\'emploi'),
+        'description': description,
+        'niveau': classify_experience(offre_ft.get('experienceLibelle', '')),
+        'salaire_min': salaire_min,
+        'salaire_max': salaire_max,
+        'salaire_periode': salaire_periode,
+        'contrat_type': facets.contract_type(offre_ft.get('typeContrat'), offre_ft.get('typeContratLibelle'), offre_ft.get('natureContrat')),
+        'departement': facets.department(lieu_travail.get('libelle'), lieu_travail.get('codePostal')),
+        '_ft': {
+            'entreprise': offre_ft.get('entreprise', {}).get('nom', 'Entreprise non précisée'),
+            'lieu': offre_ft.get('lieuTravail', {}).get('libelle', 'France'),
+            'salaire': offre_ft.get('salaire', {}),
+            'contrat': offre_ft.get('typeContratLibelle', offre_ft.get('typeContrat', 'Non précisé')),
+            'competences': offre_ft.get('competences', [])[:5],  # Limiter à 5 compétences
+        },
+    }
+
+def classify_experience(experience: str) -> str:
+    """Niveau ('junior', 'intermediaire', 'senior' ou 'tous') d'après le libellé d'expérience exigée."""
+    experience = experience.lower()
+    for niveau, pattern in EXPERIENCE_PATTERNS:
+        if pattern.search(experience):
+            return niveau
+    return 'tous'
+
+def complete_offer(offer: dict) -> dict:
+    """
+    Complète une offre au format de scoring (extract_scoring_fields) en offre
+    normalisée. Les offres déjà normalisées (autres sources) reçoivent seulement
+    les champs structurés qui leur manquent.
+    """
+    raw = offer.get('_ft')
+    if raw is None:
+        return offer if 'contrat_type' in offer else {**offer, **facets.structured_fields(offer)}
     
     # Extraire le salaire si disponible
     salaire = None
-    salaire_info = offre_ft.get('salaire', {})
+    salaire_info = raw['salaire']
     if salaire_info:
         libelle_salaire = salaire_info.get('libelle')
         if libelle_salaire:
             salaire = libelle_salaire
         else:
             # Essayer de construire à partir de min/max
-           commentaire = salaire_info.get('commentaire')
-           if commentaire:
+            commentaire = salaire_info.get('commentaire')
+            if commentaire:
                 salaire = commentaire
     
-    # Extraire le type de contrat
-    contrat = offre_ft.get('typeContratLibelle', offre_ft.get('typeContrat', 'Non précisé'))
-    
-    # Déterminer le niveau d'expérience
-    experience = offre_ft.get('experienceLibelle', '').lower()
-    niveau = 'tous'
-    if any(word in experience for word in ['débutant', 'moins de 1 an', 'sans expérience']):
-        niveau = 'junior'
-    elif any(word in experience for word in ['1 an', '2 ans', '3 ans']):
-        niveau = 'intermediaire'
-    elif any(word in experience for word in ['5 ans', '10 ans', 'expérimenté', 'senior']):
-        niveau = 'senior'
-    
     # Extraire les compétences/tags si disponibles
     tags = []
-    competences = offre_ft.get('competences', [])
-    for comp in competences[:5]:  # Limiter à 5 compétences
+    for comp in raw['competences']:
         if isinstance(comp, dict):
             tags.append(comp.get('libelle', ''))
         elif isinstance(comp, str):
             tags.append(comp)
     
-    return {
-        'id': job_id,
-        'intitule': offre_ft.get('intitule', 'Offre d\'emploi'),
-        'entreprise': {'nom': nom_entreprise},
-        'lieuTravail': {'libelle': lieu_libelle},
-        'description': description,
-        'url': url_offre,
+    completed = {key: value for key, value in offer.items() if key != '_ft'}
+    completed.update({
+        'entreprise': {'nom': raw['entreprise']},
+        'lieuTravail': {'libelle': raw['lieu']},
+        'url': f"https://candidat.francetravail.fr/offres/recherche/detail/{offer['id']}",
         'salaire': salaire,
-        'contrat': contrat,
-        'niveau': niveau,
+        'contrat': raw['contrat'],
         'tags': tags
-    }
+    })
+    return completed
+
+def normalize_france_travail_job(offre_ft: dict) -> dict:
+    """
+    Normalise une offre France Travail au format interne de l'application.
+    
+    Args:
+        offre_ft: Offre au format API France Travail
+    
+    Returns:
+        Offre au format normalisé pour l'application
+    """
+    return complete_offer(extract_scoring_fields(offre_ft))
 
 def get_all_mock_jobs():
     """Retourne TOUTES les offres mock pour le matching"""
@@ -869,32 +1163,92 @@ def get_all_mock_jobs():
     
     return all_jobs
 
-def get_realistic_mock_jobs(keyword):
-    """Retourne des offres filtrées par mot-clé (fallback simple)"""
-    keyword_lower = keyword.lower()
-    all_jobs = get_all_mock_jobs()
+
+def extract_text_from_pdf(content: bytes, max_pages: int = None, max_chars: int = None) -> str:
+    """
+    Extrait le texte d'un PDF en s'arrêtant dès que le budget du prompt est atteint.
     
-    # Filtrer les jobs qui matchent le keyword
-    matching_jobs = []
-    for job in all_jobs:
-        job_text = f"{job['intitule']} {job['description']} {' '.join(job.get('tags', []))}".lower()
-        if keyword_lower in job_text:
-            matching_jobs.append(job)
+    Args:
+        content: Contenu binaire du PDF
+        max_pages: Nombre maximum de pages lues (défaut: config.MAX_PDF_PAGES)
+        max_chars: Nombre de caractères suffisant pour l'analyse (défaut: config.CV_PROMPT_MAX_CHARS)
     
-    if matching_jobs:
-        return matching_jobs[:5]
+    Returns:
+        Texte extrait (au plus max_chars caractères)
+    """
+    max_pages = max_pages if max_pages is not None else config.MAX_PDF_PAGES
+    max_chars = max_chars if max_chars is not None else config.CV_PROMPT_MAX_CHARS
+    
+    doc = fitz.open(stream=content, filetype="pdf")
+    try:
+        parts = []
+        collected = 0
+        for page_num in range(min(doc.page_count, max_pages)):
+            with span("pdf_page", page=page_num) as page_span:
+                page_text = doc.load_page(page_num).get_text()
+                page_span.set("chars", len(page_text))
+            parts.append(page_text)
+            collected += len(page_text)
+            # Le LLM ne lit que les max_chars premiers caractères: inutile d'aller plus loin
+            if collected >= max_chars:
+                break
+    finally:
+        doc.close()
     
-    # Si aucun match, retourner 5 jobs aléatoires
-    import random
-    return random.sample(all_jobs, min(5, len(all_jobs)))
+    return "".join(parts)[:max_chars]
+
+
+class PdfWithoutText(ValueError):
+    """CV illisible: aucun texte extractible (PDF scanné, vide). Erreur du client."""
 
 
-def analyse_cv_with_groq(text_cv):
-    """Analyse le CV via l'IA Groq."""
+def run_analysis_pipeline(content: bytes, deadline: Deadline = UNLIMITED) -> tuple:
+    """
+    Pipeline complet d'analyse: extraction du texte, analyse IA, recherche des offres.
+    
+    Args:
+        content: Contenu binaire du CV (PDF)
+        deadline: Budget de temps de la requête, partagé entre les étapes
+    
+    Returns:
+        (profil détecté, offres triées par score de matching)
+    
+    Raises:
+        PdfWithoutText si le PDF ne contient pas de texte extractible
+        bulkheads.BulkheadFull si la cloison d'extraction PDF est saturée
+        RuntimeError si l'analyse du CV échoue
+    """
+    with stage("pdf_extract"), span("pdf_extract", bytes=len(content)):
+        text_cv = bulkheads.PDF.call(extract_text_from_pdf, content, deadline=deadline)
+    
+    if not text_cv.strip():
+        raise PdfWithoutText("Le PDF ne contient pas de texte extractible")
+    
+    logger.info("Texte extrait: %d caractères", len(text_cv))
+    
+    with stage("llm_analysis"), span("llm_analysis", chars=len(text_cv)):
+        profile_data = analyse_cv_with_groq(text_cv, deadline)
+    
+    if not profile_data:
+        raise RuntimeError("Erreur lors de l'analyse du CV")
+    
+    with stage("job_search"), span("job_search"):
+        jobs_data = fetch_jobs_with_matching(profile_data, deadline)
+    
+    return profile_data, jobs_data
+
+
+def analyse_cv_with_groq(text_cv, deadline: Deadline = UNLIMITED):
+    """
+    Analyse le CV via l'IA Groq.
+    
+    L'appel LLM est borné par le budget restant moins la part réservée à la
+    recherche d'offres; sans budget suffisant, extraction basique directe.
+    """
     
     # Log le début du texte du CV pour debug
-    logger.info(f"Début de l'analyse CV ({len(text_cv)} caractères)")
-    logger.debug(f"Extrait CV: {text_cv[:500]}...")
+    logger.info("Début de l'analyse CV (%d caractères)", len(text_cv))
+    logger.debug("Extrait CV: %s...", text_cv[:500])
     
     prompt = f"""Tu es un expert en recrutement. Analyse attentivement ce CV et extrais les informations EXACTES mentionnées.
 
@@ -923,47 +1277,75 @@ RÈGLES:
 - Sois précis: "React" pas "JavaScript frameworks"
 
 CV À ANALYSER:
-{text_cv[:5000]}"""
+{text_cv[:config.CV_PROMPT_MAX_CHARS]}"""
+    
+    messages = [
+        {"role": "system", "content": "Tu es un assistant expert en analyse de CV. Tu réponds uniquement en JSON valide."},
+        {"role": "user", "content": prompt}
+    ]
+    
+    def call_model(model):
+        with span("groq_request", model=model) as request_span:
+            chat = config.client_groq.chat.completions.create(
+                model=model,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.1,  # Basse température pour des résultats plus précis
+                timeout=min(llm_budget, config.LLM_TIMEOUT)
+            )
+            usage = getattr(chat, "usage", None)
+            if usage is not None:
+                request_span.set("llm.total_tokens", usage.total_tokens)
+        return json.loads(chat.choices[0].message.content)
+    
+    # Un même CV (déjà analysé par n'importe quel worker) ne coûte pas un second appel LLM
+    cache_key = make_key(text_cv[:config.CV_PROMPT_MAX_CHARS])
+    cached_result = cache.get("cv_analysis", cache_key)
+    if cached_result is not MISSING:
+        logger.info("Analyse CV servie depuis le cache")
+        annotate(outcome="cache")
+        return cached_result
+    
+    llm_budget = deadline.remaining() - config.DEADLINE_SEARCH_RESERVE_SECONDS
+    if llm_budget < config.DEADLINE_MIN_LLM_SECONDS:
+        logger.warning("Budget insuffisant pour l'analyse IA (%.1fs restantes): extraction basique", deadline.remaining())
+        annotate(outcome="basic_extraction")
+        return extract_basic_profile(text_cv)
     
     try:
-        chat = config.client_groq.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role": "system", "content": "Tu es un assistant expert en analyse de CV. Tu réponds uniquement en JSON valide."},
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.1  # Basse température pour des résultats plus précis
+        # Le routeur choisit le modèle (taille du CV, latence récente) et couvre les lenteurs
+        result, model = llm_router.router.run(
+            call_model, llm_router.estimate_tokens(text_cv[:config.CV_PROMPT_MAX_CHARS]), timeout=min(llm_budget, config.LLM_TIMEOUT)
+        )
+        # Un seul record structuré; le détail des listes est échantillonné
+        logger.info(
+            "Analyse CV terminée: métier '%s', niveau %s (modèle %s)",
+            result.get('metier_recherche', 'N/A'), result.get('niveau_experience', 'N/A'), model
+        )
+        logger.info(
+            "Détail analyse CV", extra={**VERBOSE,
+            "competences": list(result.get('competences_cles', [])),
+            "langages": list(result.get('langages', [])),
+            "domaines": list(result.get('domaines', []))}
         )
         
-        result = json.loads(chat.choices[0].message.content)
-        
-        # Log détaillé du résultat
-        logger.info(f"=== ANALYSE CV TERMINÉE ===")
-        logger.info(f"Métier détecté: {result.get('metier_recherche', 'N/A')}")
-        logger.info(f"Compétences: {result.get('competences_cles', [])}")
-        logger.info(f"Langages: {result.get('langages', [])}")
-        logger.info(f"Niveau: {result.get('niveau_experience', 'N/A')}")
-        logger.info(f"Domaines: {result.get('domaines', [])}")
-        
-        # Fusionner langages et outils dans competences_cles pour le matching
-        all_skills = result.get('competences_cles', [])
-        all_skills.extend(result.get('langages', []))
-        all_skills.extend(result.get('outils', []))
+        # Fusionner langages et outils dans competences_cles pour le matching (nouvelle liste)
+        all_skills = [*result.get('competences_cles', []), *result.get('langages', []), *result.get('outils', [])]
         result['competences_cles'] = list(set(all_skills))  # Dédupliquer
         
+        cache.set("cv_analysis", cache_key, result)
         return result
         
     except Exception as e:
-        logger.error(f"Erreur Groq: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Erreur Groq: %s", e, exc_info=True)
+        annotate(outcome="basic_extraction", error=f"{type(e).__name__}: {e}")
         
         # Fallback: essayer d'extraire des mots-clés basiques du CV
         return extract_basic_profile(text_cv)
 
 def extract_basic_profile(text_cv):
     """Extraction basique si Groq échoue."""
+    degradation.mark("llm")
     text_lower = text_cv.lower()
     
     # Détecter des technologies courantes
@@ -998,7 +1380,7 @@ def extract_basic_profile(text_cv):
     elif 'fullstack' in text_lower or 'full-stack' in text_lower:
         metier = "Développeur Full Stack"
     
-    logger.info(f"FALLBACK - Métier: {metier}, Compétences: {found_skills}")
+    logger.info("FALLBACK - Métier: %s, Compétences: %s", metier, found_skills)
     
     return {
         "metier_recherche": metier,
@@ -1008,3 +1390,54 @@ def extract_basic_profile(text_cv):
         "domaines": ["web"]
     }
 
+def _build_offer_aggregator():
+    """Agrégateur des sources listées dans OFFER_SOURCES."""
+    factories = {
+        "france_travail": lambda deadline: sources.FranceTravailSource(deadline, get_ft_token, fetch_france_travail_jobs),
+        "mock": lambda deadline: sources.MockCatalogueSource(deadline, get_all_mock_jobs),
+        "feeds": lambda deadline: sources.FileFeedSource(deadline, config.OFFER_FEEDS_DIR, normalize_france_travail_job),
+        "store": lambda deadline: sources.OfferStoreSource(deadline, offer_store.acquire),
+    }
+    return sources.OfferAggregator(sources.build_sources(factories, config.OFFER_SOURCES))
+
+offer_aggregator = _build_offer_aggregator()
+
+def search_offers(keyword: str, max_results: int = 20, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+    """
+    Recherche un mot-clé sur toutes les sources, chacune bornée par son échéance
+    et par le budget restant de la requête. France Travail cherche par codes ROME
+    quand ils sont fournis.
+    
+    Returns:
+        Offres normalisées fusionnées (champ 'source' indiquant leur origine)
+    """
+    return offer_aggregator.search_sync(keyword, max_results, deadline, rome_codes)
+
+# Alertes: les offres reçues de France Travail (ou d'un collecteur) sont confrontées aux profils sauvegardés
+alert_store = alerts.AlertStore(config.ALERTS_DB_PATH)
+percolator = alerts.ProfilePercolator(alert_store, calculate_matching_score, complete_offer)
+alert_dispatcher = alerts.AlertDispatcher(percolator)
+
+# Autocomplétion: ROME, catalogue et flux locaux, plus les intitulés reçus de France Travail
+def _build_suggest_index(previous):
+    offers = {job['id']: job for job in get_all_mock_jobs()}
+    for source in offer_aggregator.sources:
+        offers.update((job.get('id'), job) for job in source.catalogue())
+    # Les intitulés observés par la génération précédente sont repris
+    return suggest.build_index(list(offers.values()), observed=previous.observed if previous else None)
+
+_suggest_index = indexes.register(
+    "suggest", _build_suggest_index,
+    validate=lambda index: len(index) > 0,
+    signature=lambda: (indexes.file_signature(config.ROME_REFERENTIAL_PATH), indexes.directory_signature(config.OFFER_FEEDS_DIR))
+)
+
+def get_suggest_index() -> suggest.SuggestIndex:
+    """Génération courante de l'index d'autocomplétion, construite au premier usage (ou au préchauffage)."""
+    return _suggest_index.current()
+
+def observe_titles(offres: list):
+    """Compte les intitulés reçus dans l'index d'autocomplétion, s'il est déjà construit."""
+    index = _suggest_index.peek()
+    if index is not None and offres:
+        index.observe(offres)
@@ -0,0 +1,280 @@
+import asyncio
+import contextvars
+import csv
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+import config
+import degradation
+from deadline import Deadline, UNLIMITED
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Pool dédié aux appels bloquants des sources: contrairement au pool par défaut de
+# la boucle, asyncio.run() n'attend pas la fin des appels abandonnés à l'échéance
+_executor = ThreadPoolExecutor(max_workers=config.SOURCE_THREADS, thread_name_prefix="source")
+
+
+async def run_blocking(fn, *args):
+    """Exécute fn(*args) dans le pool des sources, en conservant le contexte (request_id)."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(contextvars.copy_context().run, fn, *args))
+
+
+def matches_keyword(job: dict, keyword: str) -> bool:
+    """Le mot-clé apparaît dans l'intitulé, la description ou les tags de l'offre."""
+    job_text = f"{job.get('intitule', '')} {job.get('description', '')} {' '.join(job.get('tags', []))}".lower()
+    return keyword.lower() in job_text
+
+
+class OfferSource(ABC):
+    """
+    Interface commune des sources d'offres.
+
+    search() retourne des offres au format normalisé de l'application
+    (celui de normalize_france_travail_job) ou, pour France Travail, au
+    format de scoring que complete_offer normalise. deadline est le temps maximal
+    accordé à la source par l'agrégateur, en secondes; search() reçoit en plus
+    le budget restant de la requête, à transmettre aux appels réseau, et les
+    codes ROME du métier quand ils sont connus (les sources qui ne les gèrent
+    pas cherchent sur le mot-clé).
+    """
+
+    name = "source"
+
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+
+    @abstractmethod
+    async def search(self, keyword: str, max_results: int, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        ...
+
+    def warm_up(self):
+        """Charge ce qui peut l'être avant la première requête (appel bloquant, au démarrage)."""
+
+    def catalogue(self) -> list:
+        """Offres connues localement, sans appel réseau (vide pour les API distantes)."""
+        return []
+
+
+class FranceTravailSource(OfferSource):
+    """API France Travail v2 (appels bloquants exécutés dans un thread)."""
+
+    name = "france_travail"
+
+    def __init__(self, deadline: float, get_token, fetch_jobs):
+        super().__init__(deadline)
+        self._get_token = get_token
+        self._fetch_jobs = fetch_jobs
+
+    async def search(self, keyword: str, max_results: int, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        token = await run_blocking(self._get_token, deadline)
+        # Sans jeton, la recherche sert encore le cache ou les derniers résultats valides
+        return await run_blocking(self._fetch_jobs, token, keyword, max_results, deadline, rome_codes)
+
+
+class MockCatalogueSource(OfferSource):
+    """Catalogue local d'offres (démonstration, développement hors ligne)."""
+
+    name = "mock"
+
+    def __init__(self, deadline: float, get_jobs):
+        super().__init__(deadline)
+        self._get_jobs = get_jobs
+
+    async def search(self, keyword: str, max_results: int, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        return [job for job in self._get_jobs() if matches_keyword(job, keyword)][:max_results]
+
+    def catalogue(self) -> list:
+        return self._get_jobs()
+
+
+def _row_id(path: str, row: dict) -> str:
+    """Identifiant stable d'une ligne CSV sans colonne id (mêmes fichier et contenu, même id)."""
+    content = "\x1f".join(str(row.get(column) or "") for column in ("intitule", "entreprise", "lieu", "description", "url"))
+    digest = hashlib.sha1(f"{os.path.basename(path)}\x1f{content}".encode("utf-8")).hexdigest()[:16]
+    return f"feed_{digest}"
+
+
+class FileFeedSource(OfferSource):
+    """
+    Flux de partenaires déposés dans un répertoire: fichiers .json (liste
+    d'offres au format API France Travail) et .csv (colonnes id, intitule,
+    entreprise, lieu, description, url, salaire, contrat, niveau, tags
+    séparés par des '|'; sans id, il est dérivé du contenu de la ligne).
+    Les fichiers sont relus quand ils changent.
+    """
+
+    name = "feeds"
+
+    def __init__(self, deadline: float, directory: str, normalize):
+        super().__init__(deadline)
+        self.directory = directory
+        self._normalize = normalize
+        self._files = {}  # chemin -> (mtime, offres)
+        self._lock = threading.Lock()
+
+    def _load_json(self, path: str) -> list:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        records = data.get("resultats", []) if isinstance(data, dict) else data
+        return [self._normalize(record) for record in records if isinstance(record, dict)]
+
+    def _load_csv(self, path: str) -> list:
+        offres = []
+        with open(path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                offre = self._normalize({
+                    "id": row.get("id") or _row_id(path, row),
+                    "intitule": row.get("intitule") or "Offre d'emploi",
+                    "entreprise": {"nom": row.get("entreprise") or "Entreprise non précisée"},
+                    "lieuTravail": {"libelle": row.get("lieu") or "France"},
+                    "description": row.get("description", ""),
+                    "salaire": {"libelle": row.get("salaire")} if row.get("salaire") else {},
+                    "typeContratLibelle": row.get("contrat") or "Non précisé",
+                    "competences": [tag for tag in (row.get("tags") or "").split("|") if tag],
+                })
+                if row.get("url"):
+                    offre["url"] = row["url"]
+                if row.get("niveau"):
+                    offre["niveau"] = row["niveau"]
+                offres.append(offre)
+        return offres
+
+    def _load_all(self) -> list:
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        offres = []
+        with self._lock:
+            for filename in sorted(os.listdir(self.directory)):
+                path = os.path.join(self.directory, filename)
+                loader = {".json": self._load_json, ".csv": self._load_csv}.get(os.path.splitext(filename)[1].lower())
+                if loader is None:
+                    continue
+                mtime = os.path.getmtime(path)
+                cached = self._files.get(path)
+                if cached is None or cached[0] != mtime:
+                    try:
+                        cached = (mtime, loader(path))
+                        logger.info("Flux %s chargé: %d offres", filename, len(cached[1]))
+                    except Exception as e:
+                        logger.warning("Flux %s illisible: %s", filename, e)
+                        cached = (mtime, [])
+                    self._files[path] = cached
+                offres.extend(cached[1])
+        return offres
+
+    def warm_up(self):
+        self._load_all()
+
+    def catalogue(self) -> list:
+        return self._load_all()
+
+    async def search(self, keyword: str, max_results: int, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        offres = await run_blocking(self._load_all)
+        return [job for job in offres if matches_keyword(job, keyword)][:max_results]
+
+
+class OfferStoreSource(OfferSource):
+    """Corpus local en colonnes (OFFER_STORE_PATH): recherche par intersection des postings."""
+
+    name = "store"
+
+    def __init__(self, deadline: float, acquire_store):
+        super().__init__(deadline)
+        self._acquire_store = acquire_store  # Contexte qui tient la génération courante du corpus
+
+    def _search(self, keyword: str, max_results: int) -> list:
+        with self._acquire_store() as store:
+            return store.search(keyword, max_results) if store is not None else []
+
+    async def search(self, keyword: str, max_results: int, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        return await run_blocking(self._search, keyword, max_results)
+
+    def warm_up(self):
+        with self._acquire_store():
+            pass
+
+
+class OfferAggregator:
+    """
+    Interroge toutes les sources en parallèle, chacune avec sa propre échéance,
+    et fusionne les réponses arrivées à temps (dédoublonnées par id) en un seul
+    flux normalisé. Une source lente ou en erreur est ignorée: la latence est
+    bornée par la plus longue échéance, pas par la source la plus lente.
+    """
+
+    def __init__(self, sources: list):
+        self.sources = sources
+
+    async def _query(self, source: OfferSource, keyword: str, max_results: int, deadline: Deadline, rome_codes: tuple):
+        start = time.monotonic()
+        timeout = deadline.timeout(source.deadline)
+        if timeout <= 0:
+            logger.warning("Source %s ignorée pour '%s': budget de la requête épuisé", source.name, keyword)
+            degradation.mark(source.name)
+            return []
+        with span("source", source=source.name, keyword=keyword) as source_span:
+            try:
+                offres = await asyncio.wait_for(source.search(keyword, max_results, deadline, rome_codes), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Source %s: échéance de %.1fs dépassée pour '%s'", source.name, timeout, keyword)
+                source_span.set("outcome", "timeout")
+                degradation.mark(source.name)
+                return []
+            except Exception as e:
+                logger.error("Source %s en erreur pour '%s': %s", source.name, keyword, e)
+                source_span.set("outcome", "error")
+                degradation.mark(source.name)
+                return []
+            source_span.set("offers", len(offres))
+        logger.info("Source %s: %d offres en %.0f ms", source.name, len(offres), (time.monotonic() - start) * 1000)
+        return [{**offre, "source": source.name} for offre in offres]
+
+    async def search(self, keyword: str, max_results: int = 20, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        """
+        Args:
+            keyword: Mot-clé de recherche
+            max_results: Nombre maximum d'offres par source
+            deadline: Budget restant de la requête, plafond de toutes les échéances
+            rome_codes: Codes ROME du métier, pour les sources qui les gèrent
+        """
+        results = await asyncio.gather(*(
+            self._query(source, keyword, max_results, deadline, tuple(rome_codes))
+            for source in self.sources
+        ))
+
+        merged = []
+        seen = set()
+        for offres in results:
+            for offre in offres:
+                offer_id = offre.get("id")
+                if offer_id:  # Sans identifiant, rien ne prouve un doublon: l'offre est gardée
+                    if offer_id in seen:
+                        continue
+                    seen.add(offer_id)
+                merged.append(offre)
+        return merged
+
+    def search_sync(self, keyword: str, max_results: int = 20, deadline: Deadline = UNLIMITED, rome_codes: tuple = ()) -> list:
+        """Version bloquante, pour les appelants synchrones (pool de threads, workers de jobs)."""
+        return asyncio.run(self.search(keyword, max_results, deadline, rome_codes))
+
+
+def build_sources(factories: dict, names: list) -> list:
+    """Instancie les sources listées dans OFFER_SOURCES (les noms inconnus sont signalés)."""
+    sources = []
+    for name in names:
+        factory = factories.get(name)
+        if factory is None:
+            logger.warning("Source d'offres inconnue ignorée: %s", name)
+            continue
+        sources.append(factory(config.SOURCE_DEADLINES.get(name, config.SOURCE_DEFAULT_DEADLINE)))
+    return sources
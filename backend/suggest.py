@@ -0,0 +1,197 @@
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+import config
+import rome
+
+logger = logging.getLogger(__name__)
+
+# Mentions retirées des intitulés affichés ('Développeur Python (H/F)')
+_GENDER_MARK = re.compile(r"\s*[\(\[]?\b[HF]\s*/\s*[HF]\b[\)\]]?", re.IGNORECASE)
+
+METIER = "metier"
+COMPETENCE = "competence"
+
+
+def clean_label(label: str) -> str:
+    return " ".join(_GENDER_MARK.sub("", label or "").split())
+
+
+def offer_competences(offer: dict) -> list:
+    """Compétences d'une offre normalisée (tags) ou au format de scoring France Travail (_ft)."""
+    if "tags" in offer:
+        return offer["tags"]
+    competences = (offer.get("_ft") or {}).get("competences", [])
+    return [c.get("libelle", "") if isinstance(c, dict) else c for c in competences]
+
+
+class SuggestIndex:
+    """
+    Autocomplétion des intitulés de métier et des compétences.
+
+    Trie de préfixes sur les libellés sans accents (rome.normalize_text),
+    indexés depuis le début et depuis chaque mot ('python' propose
+    'Développeur Python'). Chaque nœud garde ses SUGGEST_TOP_K meilleurs
+    libellés par fréquence: une requête est une descente de len(q) nœuds,
+    sans parcours du sous-arbre. Les nœuds s'arrêtent à SUGGEST_MAX_PREFIX
+    caractères; au-delà, le top-k du dernier nœud est filtré.
+
+    Les lecteurs ne prennent pas de verrou: les listes de top-k sont
+    remplacées d'un bloc, jamais modifiées en place.
+
+    Les libellés observés dans les recherches n'entrent dans le trie qu'à
+    partir de SUGGEST_MIN_OBSERVED occurrences; leur compteur est borné à
+    SUGGEST_MAX_OBSERVED libellés (les moins fréquents sont oubliés), et
+    au plus autant de libellés observés sont indexés par génération.
+    """
+
+    def __init__(self, top_k: int = None, max_prefix: int = None, min_observed: int = None, max_observed: int = None):
+        self.top_k = top_k or config.SUGGEST_TOP_K
+        self.max_prefix = max_prefix or config.SUGGEST_MAX_PREFIX
+        self.min_observed = min_observed or config.SUGGEST_MIN_OBSERVED
+        self.max_observed = max_observed or config.SUGGEST_MAX_OBSERVED
+        self._observed_indexed = 0  # Libellés entrés dans le trie par observation
+        self._root = {}  # caractère -> nœud; clé None: top-k [(poids, id)]
+        self._labels = []  # id -> [libellé affiché, type, forme normalisée, poids]
+        self._ids = {}  # (forme normalisée, type) -> id
+        self.observed = Counter()  # (libellé, type) reçus au fil des recherches, repris à la reconstruction
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._labels)
+
+    def _update_node(self, node: dict, label_id: int, weight: float):
+        top = node.get(None, [])
+        entries = [(w, i) for w, i in top if i != label_id]
+        entries.append((weight, label_id))
+        entries.sort(key=lambda entry: (-entry[0], self._labels[entry[1]][0]))
+        node[None] = entries[:self.top_k]
+
+    def add(self, label: str, kind: str = METIER, weight: float = 1.0, observed: bool = False):
+        """
+        Ajoute un libellé, ou augmente sa fréquence s'il est déjà connu.
+
+        Args:
+            observed: Libellé issu d'une recherche: un nouveau libellé n'est
+                pas indexé au-delà de max_observed libellés observés
+        """
+        label = clean_label(label)
+        folded = rome.normalize_text(label)
+        if not folded:
+            return
+        with self._lock:
+            label_id = self._ids.get((folded, kind))
+            if label_id is None:
+                if observed:
+                    if self._observed_indexed >= self.max_observed:
+                        return
+                    self._observed_indexed += 1
+                label_id = len(self._labels)
+                self._labels.append([label, kind, folded, 0.0])
+                self._ids[(folded, kind)] = label_id
+            entry = self._labels[label_id]
+            entry[3] += weight
+            total = entry[3]
+
+            # Depuis le début du libellé et depuis chaque mot suivant
+            starts = [0] + [m.start() + 1 for m in re.finditer(" ", folded)]
+            for start in starts:
+                node = self._root
+                for char in folded[start:start + self.max_prefix]:
+                    node = node.setdefault(char, {})
+                    self._update_node(node, label_id, total)
+
+    def suggest(self, query: str, limit: int = 10, kind: str = None) -> list:
+        """
+        Suggestions pour un début de saisie, par fréquence décroissante.
+
+        Args:
+            query: Saisie de l'utilisateur (accents et casse indifférents)
+            limit: Nombre maximal de suggestions (au plus SUGGEST_TOP_K)
+            kind: 'metier' ou 'competence' pour ne garder qu'un type
+
+        Returns:
+            Liste de {"label", "type", "count"}
+        """
+        folded = rome.normalize_text(query)
+        if not folded:
+            return []
+        node = self._root
+        for char in folded[:self.max_prefix]:
+            node = node.get(char)
+            if node is None:
+                return []
+
+        results = []
+        for weight, label_id in node.get(None, ()):
+            label, label_kind, label_folded, _ = self._labels[label_id]
+            if kind and label_kind != kind:
+                continue
+            if len(folded) > self.max_prefix and not any(
+                label_folded[start:].startswith(folded)
+                for start in [0] + [m.start() + 1 for m in re.finditer(" ", label_folded)]
+            ):
+                continue
+            results.append({"label": label, "type": label_kind, "count": round(weight)})
+            if len(results) >= limit:
+                break
+        return results
+
+    def _observe_label(self, label: str, kind: str):
+        if not label:
+            return
+        key = (label, kind)
+        with self._lock:
+            self.observed[key] += 1
+            count = self.observed[key]
+            if len(self.observed) > self.max_observed:
+                # Vocabulaire observé borné: seuls les libellés les plus fréquents restent comptés
+                self.observed = Counter(dict(self.observed.most_common(self.max_observed // 2)))
+        if count == self.min_observed:
+            self.add(label, kind, count, observed=True)
+        elif count > self.min_observed:
+            self.add(label, kind, observed=True)
+
+    def observe(self, offers: list):
+        """Compte les intitulés et compétences d'offres reçues (index enrichi au fil des recherches)."""
+        for offer in offers:
+            self._observe_label(offer.get("intitule", ""), METIER)
+            for competence in offer_competences(offer):
+                self._observe_label(competence, COMPETENCE)
+
+
+def build_index(offers: list, referential_path: str = None, observed: Counter = None) -> SuggestIndex:
+    """
+    Construit l'index depuis les fiches ROME (libellés et appellations),
+    des offres locales (intitulés et tags) et les libellés déjà observés
+    par une génération précédente.
+    """
+    start = time.monotonic()
+    index = SuggestIndex()
+
+    try:
+        with open(referential_path or config.ROME_REFERENTIAL_PATH, encoding="utf-8") as f:
+            fiches = json.load(f)["fiches"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.error("Référentiel ROME absent de l'autocomplétion: %s", e)
+        fiches = []
+    for fiche in fiches:
+        for label in [fiche["libelle"], *fiche.get("appellations", [])]:
+            index.add(label, METIER)
+
+    for offer in offers:
+        index.add(offer.get("intitule", ""), METIER)
+        for tag in offer.get("tags", []):
+            index.add(tag, COMPETENCE)
+    # Libellés observés repris de la génération précédente (déjà bornés), indexés au-delà du seuil
+    carried = list((observed or {}).items())  # Copie: la génération précédente continue d'observer
+    for (label, kind), count in heapq.nlargest(index.max_observed, carried, key=lambda item: item[1]):
+        index.observed[(label, kind)] += count
+        if count >= index.min_observed:
+            index.add(label, kind, count, observed=True)
+    logger.info("Index d'autocomplétion: %d libellés en %.0f ms", len(index), (time.monotonic() - start) * 1000)
+    return index
@@ -0,0 +1,340 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+import config
+from logging_setup import request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Trace de la requête en cours et span courant, propagés aux threads via contextvars
+_trace_var = contextvars.ContextVar("trace", default=None)
+_span_var = contextvars.ContextVar("trace_span", default=None)
+
+_HEX_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Codes de statut OTLP
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """Une étape chronométrée d'une trace; les attributs s'ajoutent jusqu'à sa fin (set())."""
+
+    __slots__ = ("span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent_id: str, attributes: dict):
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+
+class _NoopSpan:
+    """Span retourné hors d'une requête tracée: set() ne fait rien."""
+
+    def set(self, key: str, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Trace:
+    """Spans d'une requête, partagés par tous les threads qui la servent."""
+
+    def __init__(self, request_id: str, sampled: bool):
+        self.trace_id = request_id if _HEX_ID.match(request_id) else uuid.uuid4().hex
+        self.request_id = request_id
+        self.sampled = sampled
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Span enfant du span courant, sans effet hors d'une requête tracée.
+
+    Le span suit la requête dans le pool de threads, les cloisons et les
+    sources (contexte copié à chaque passage de thread). Une exception le
+    marque en erreur et se propage.
+    """
+    trace = _trace_var.get()
+    if trace is None:
+        yield _NOOP
+        return
+    parent = _span_var.get()
+    current = Span(name, parent.span_id if parent is not None else None, {k: v for k, v in attributes.items() if v is not None})
+    trace.add(current)
+    token = _span_var.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_var.reset(token)
+        current.end_ns = time.time_ns()
+
+
+def annotate(**attributes):
+    """Ajoute des attributs au span courant (issue d'une étape: cache, repli...)."""
+    current = _span_var.get()
+    if current is not None:
+        for key, value in attributes.items():
+            current.set(key, value)
+
+
+def _attribute_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_attribute_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(trace: Trace) -> dict:
+    """
+    Trace au format OTLP/JSON (ExportTraceServiceRequest), lisible par un
+    collecteur OpenTelemetry, Jaeger ou Tempo. Les spans encore ouverts à la
+    fin de la requête (appel abandonné à l'échéance) sont clos à cet instant
+    et marqués 'span.unfinished'.
+    """
+    with trace._lock:
+        spans = list(trace.spans)
+    end = max((s.end_ns for s in spans if s.end_ns is not None), default=time.time_ns())
+    exported = []
+    for s in spans:
+        attributes = dict(s.attributes)
+        if s.end_ns is None:
+            attributes["span.unfinished"] = True
+        entry = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 2 if s.parent_id is None else 1,  # SERVER pour la racine, INTERNAL sinon
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns if s.end_ns is not None else end),
+            "attributes": [{"key": k, "value": _attribute_value(v)} for k, v in attributes.items()],
+            "status": {"code": STATUS_ERROR, "message": s.error} if s.error else {"code": STATUS_OK},
+        }
+        if s.parent_id is not None:
+            entry["parentSpanId"] = s.parent_id
+        exported.append(entry)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": config.TRACE_SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": "easyjobfind.tracing"}, "spans": exported}],
+        }]
+    }
+
+
+def _plain_value(value: dict):
+    kind, raw = next(iter(value.items()))
+    if kind == "intValue":
+        return int(raw)
+    if kind == "arrayValue":
+        return [_plain_value(v) for v in raw.get("values", [])]
+    return raw
+
+
+def waterfall(otlp: dict) -> list:
+    """
+    Spans d'une trace OTLP en cascade (chaque span suivi de ses enfants, par
+    ordre de début): décalage et durée en ms, profondeur, attributs à plat.
+    """
+    spans = [s for rs in otlp["resourceSpans"] for ss in rs["scopeSpans"] for s in ss["spans"]]
+    if not spans:
+        return []
+    origin = min(int(s["startTimeUnixNano"]) for s in spans)
+    ids = {s["spanId"] for s in spans}
+    children = {}
+    for s in sorted(spans, key=lambda s: int(s["startTimeUnixNano"])):
+        parent = s.get("parentSpanId") if s.get("parentSpanId") in ids else None
+        children.setdefault(parent, []).append(s)
+
+    rows = []
+    stack = [(s, 0) for s in reversed(children.get(None, []))]
+    while stack:
+        s, depth = stack.pop()
+        start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+        rows.append({
+            "name": s["name"],
+            "depth": depth,
+            "offset_ms": round((start - origin) / 1e6, 1),
+            "duration_ms": round((end - start) / 1e6, 1),
+            "attributes": {a["key"]: _plain_value(a["value"]) for a in s["attributes"]},
+            "error": s["status"].get("message"),
+        })
+        stack.extend((child, depth + 1) for child in reversed(children.get(s["spanId"], [])))
+    return rows
+
+
+class TraceExporter:
+    """
+    Écrit les traces retenues dans TRACE_EXPORT_PATH, une requête OTLP/JSON
+    par ligne, depuis un thread dédié (la requête ne paie pas l'écriture).
+    Le fichier est partagé par les workers et tourne au-delà de TRACE_MAX_BYTES
+    (l'ancien devient .1). Les dernières traces restent aussi en mémoire.
+    """
+
+    def __init__(self, path: str, max_bytes: int, max_stored: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_stored = max_stored
+        self.exported = 0
+        self.dropped = 0
+        self._recent = OrderedDict()  # request_id -> trace OTLP
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=1000)
+        self._thread = None
+
+    def export(self, trace: Trace):
+        otlp = to_otlp(trace)
+        with self._lock:
+            self._recent[trace.request_id] = otlp
+            self._recent.move_to_end(trace.request_id)
+            while len(self._recent) > self.max_stored:
+                self._recent.popitem(last=False)
+            if self._thread is None and self.path:
+                self._thread = threading.Thread(target=self._run, name="traces", daemon=True)
+                self._thread.start()
+        if not self.path:
+            return
+        try:
+            self._queue.put_nowait(otlp)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            otlp = self._queue.get()
+            try:
+                self._write(json.dumps(otlp, ensure_ascii=False, separators=(",", ":")) + "\n")
+                self.exported += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.warning("Export de trace impossible (%s): %s", self.path, e)
+
+    def _write(self, line: str):
+        try:
+            if os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+        except OSError:
+            pass
+        # Une seule écriture en mode ajout: les lignes des workers ne s'entremêlent pas
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def find(self, request_id: str):
+        """Trace d'une requête: en mémoire si elle a été servie par ce worker, sinon dans le fichier d'export."""
+        with self._lock:
+            otlp = self._recent.get(request_id)
+        if otlp is not None or not self.path:
+            return otlp
+        needle = json.dumps(request_id)
+        for path in (self.path, self.path + ".1"):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    lines = [line for line in f if needle in line]
+            except OSError:
+                continue
+            for line in reversed(lines):
+                otlp = json.loads(line)
+                if _request_id(otlp) == request_id:
+                    return otlp
+        return None
+
+    def snapshot(self) -> dict:
+        return {"path": self.path, "exported": self.exported, "dropped": self.dropped, "in_memory": len(self._recent)}
+
+
+def _request_id(otlp: dict):
+    for rs in otlp["resourceSpans"]:
+        for ss in rs["scopeSpans"]:
+            for s in ss["spans"]:
+                if "parentSpanId" not in s:
+                    return next((a["value"]["stringValue"] for a in s["attributes"] if a["key"] == "request_id"), None)
+    return None
+
+
+exporter = TraceExporter(config.TRACE_EXPORT_PATH, config.TRACE_MAX_BYTES, config.TRACE_MAX_STORED)
+
+
+def should_sample(headers) -> bool:
+    """Trace demandée par en-tête (authentifié) ou tirée au sort selon TRACE_SAMPLE_RATE."""
+    if headers.get(b"x-trace") == b"1":
+        import debug_auth  # Importé ici: debug_auth dépend de FastAPI, services (et l'app Streamlit) non
+        return debug_auth.is_valid_token(headers.get(b"x-debug-token", b"").decode("latin-1"))
+    return config.TRACE_SAMPLE_RATE > 0 and random.random() < config.TRACE_SAMPLE_RATE
+
+
+class TracingMiddleware:
+    """
+    Trace chaque requête (span racine + étapes instrumentées). Seules sont
+    exportées les requêtes échantillonnées (TRACE_SAMPLE_RATE, en-tête
+    X-Trace) et celles plus lentes que TRACE_SLOW_SECONDS, décidées à la fin:
+    une requête de 40 s est toujours retrouvable par son X-Request-ID.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not config.TRACE_ENABLED or scope["type"] != "http" or scope["path"].startswith("/debug"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        trace = Trace(request_id_var.get(), should_sample(headers))
+        trace_token = _trace_var.set(trace)
+        status = {}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            with span(f"{scope['method']} {scope['path']}", request_id=trace.request_id) as root:
+                try:
+                    await self.app(scope, receive, send_with_status)
+                finally:
+                    route = getattr(scope.get("route"), "path", None)
+                    if route:
+                        root.name = f"{scope['method']} {route}"
+                    root.set("http.method", scope["method"])
+                    root.set("http.route", route or scope["path"])
+                    root.set("http.status_code", status.get("code", 500))
+        finally:
+            _trace_var.reset(trace_token)
+            duration = (root.end_ns - root.start_ns) / 1e9
+            if trace.sampled or duration >= config.TRACE_SLOW_SECONDS:
+                root.set("trace.reason", "sampled" if trace.sampled else "slow")
+                exporter.export(trace)
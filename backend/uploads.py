@@ -0,0 +1,73 @@
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+import config
+
+# Taille des blocs lus depuis l'upload
+CHUNK_SIZE = 64 * 1024
+
+
+def _too_large_detail(max_bytes: int) -> str:
+    return f"Le fichier dépasse la taille maximale autorisée ({max_bytes / (1024 * 1024):.1f} Mo)"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Middleware ASGI qui rejette en 413 les uploads trop volumineux.
+
+    Le Content-Length est vérifié avant toute lecture du corps ; pour les
+    envois sans Content-Length (chunked), le flux est compté au fil de l'eau
+    et interrompu dès que la limite est franchie.
+    """
+
+    def __init__(self, app, max_bytes: int = None, paths: tuple = ("/analyze",)):
+        self.app = app
+        self.max_bytes = max_bytes if max_bytes is not None else config.MAX_UPLOAD_BYTES
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": _too_large_detail(self.max_bytes)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=_too_large_detail(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload_limited(file: UploadFile, max_bytes: int = None) -> bytes:
+    """
+    Lit un fichier uploadé par blocs en s'arrêtant dès que la limite est dépassée.
+
+    Raises:
+        HTTPException 413 si le fichier dépasse max_bytes
+    """
+    max_bytes = max_bytes if max_bytes is not None else config.MAX_UPLOAD_BYTES
+
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=_too_large_detail(max_bytes))
+
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise HTTPException(status_code=413, detail=_too_large_detail(max_bytes))
+
+    return bytes(buffer)
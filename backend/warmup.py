@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import config
+import offer_store
+import rome
+import services
+from deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupState:
+    """Avancement du préchauffage du worker, exposé par /ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.started_at = None
+        self.duration = None
+        self.steps = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, status: str, elapsed: float, error: str = None):
+        with self._lock:
+            self.steps[name] = {"status": status, "ms": round(elapsed * 1000, 1), **({"error": error} if error else {})}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"ready": self.ready, "duration": self.duration, "steps": dict(self.steps)}
+
+
+state = WarmupState()
+_started = False
+_start_lock = threading.Lock()
+
+
+def _warm_pdf():
+    # Premier appel PyMuPDF: chargement de la bibliothèque native et des polices
+    import fitz
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 50), "EasyJobFind")
+    services.extract_text_from_pdf(doc.tobytes())
+
+
+def _warm_ft_token():
+    if not config.FT_ID or not config.FT_SECRET:
+        return "skipped"
+    # Ouvre aussi la connexion TLS vers le serveur d'authentification (pool de http_session)
+    if not services.get_ft_token(Deadline(config.FT_AUTH_TIMEOUT)):
+        raise RuntimeError("token France Travail non obtenu")
+
+
+def _warm_ft_search_connection():
+    if "france_travail" not in config.OFFER_SOURCES:
+        return "skipped"
+    # Poignée de main TLS vers l'API de recherche; la réponse elle-même est ignorée
+    services.http_session.head(config.SEARCH_URL, timeout=config.WARMUP_STEP_TIMEOUT)
+
+
+def _warm_groq():
+    if config.client_groq is None:
+        return "skipped"
+    # Requête légère (liste des modèles) qui ouvre le pool de connexions du client Groq
+    config.client_groq.models.list(timeout=config.WARMUP_STEP_TIMEOUT)
+
+
+def _warm_offer_sources():
+    for source in services.offer_aggregator.sources:
+        source.warm_up()
+
+
+def _warm_rome():
+    if rome.get_referential() is None:
+        raise RuntimeError("référentiel ROME illisible")
+
+
+def _warm_offer_store():
+    if not config.OFFER_STORE_PATH:
+        return "skipped"
+    if offer_store.get_store() is None:
+        raise RuntimeError("corpus d'offres illisible")
+
+
+def _warm_suggest():
+    services.get_suggest_index()
+
+
+STEPS = {
+    "pdf": _warm_pdf,
+    "rome": _warm_rome,
+    "suggest": _warm_suggest,
+    "offer_store": _warm_offer_store,
+    "offer_sources": _warm_offer_sources,
+    "ft_token": _warm_ft_token,
+    "ft_search_connection": _warm_ft_search_connection,
+    "groq": _warm_groq,
+}
+
+
+def _run_step(name: str, step):
+    start = time.monotonic()
+    try:
+        status = step() or "ok"
+        state.record(name, status, time.monotonic() - start)
+    except Exception as e:
+        # Une étape en échec ne bloque pas le worker: le premier appel réel la refera
+        logger.warning("Préchauffage %s en échec: %s", name, e)
+        state.record(name, "error", time.monotonic() - start, str(e))
+
+
+def run_warmup(steps: dict = None):
+    """
+    Exécute les étapes de préchauffage en parallèle puis marque le worker prêt.
+
+    Le worker devient prêt même si des étapes échouent ou dépassent
+    WARMUP_TIMEOUT: /ready signale un worker qui a fini de chauffer, pas un
+    worker dont toutes les dépendances répondent.
+    """
+    steps = steps if steps is not None else STEPS
+    state.started_at = time.time()
+    start = time.monotonic()
+
+    executor = ThreadPoolExecutor(max_workers=len(steps) or 1, thread_name_prefix="warmup")
+    futures = {executor.submit(_run_step, name, step): name for name, step in steps.items()}
+    _, not_done = wait(futures, timeout=config.WARMUP_TIMEOUT)
+    for future in not_done:
+        state.record(futures[future], "timeout", time.monotonic() - start)
+    executor.shutdown(wait=False)
+
+    state.duration = round(time.monotonic() - start, 3)
+    state.ready = True
+    logger.info("Worker prêt après %.2fs de préchauffage", state.duration, extra={"warmup": state.snapshot()["steps"]})
+
+
+def start():
+    """Lance le préchauffage dans un thread (au démarrage de l'application). Idempotent."""
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    if not config.WARMUP_ENABLED:
+        state.ready = True
+        return
+    threading.Thread(target=run_warmup, name="warmup", daemon=True).start()